@@ -0,0 +1,27 @@
+"""
+Benchmarks against the stand-in vboxwebsrv from tests.stub
+
+Run from the repository root, e.g. python -m benchmarks.wsdl_cache
+"""
+
+import statistics
+from time import perf_counter
+
+
+def measure(func, repeat=5, number=1):
+    """Returns median seconds per call of func over repeat runs"""
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((perf_counter() - start) / number)
+    return statistics.median(timings)
+
+
+def report(title, rows):
+    """Prints rows of (label, value) under title"""
+    print(title)
+    width = max(len(label) for label, _ in rows)
+    for label, value in rows:
+        print("  {}  {}".format(label.ljust(width), value))
@@ -0,0 +1,45 @@
+"""
+Bytes transferred and latency of full, thumbnail and region captures
+"""
+
+from remotevbox.registry import ServiceRegistry
+from remotevbox.vbox import IVirtualBox
+from tests.stub import State, serve
+
+from benchmarks import measure, report
+
+
+def main():
+    state = State(state="Running")
+    state.width, state.height = 1920, 1080
+    server, state, url = serve(state)
+    vbox = IVirtualBox(url, registry=ServiceRegistry())
+    machine = vbox.get_machine("vm1")
+    machine.lock()
+
+    rows = []
+    for label, capture in [
+        ("full PNG", lambda: machine.take_screenshot_to_bytes()),
+        ("thumbnail PNG 160x120", lambda: machine.take_thumbnail()),
+        ("full raw BGRA", lambda: machine.take_screenshot_raw()),
+        ("region 200x100", lambda: machine.take_screenshot_region(0, 0, 200, 100)),
+    ]:
+        capture()
+        sent = state.sent
+        seconds = measure(capture)
+        rows.append(
+            (
+                label,
+                "{:7.1f} ms, {:9.0f} bytes".format(
+                    seconds * 1000, (state.sent - sent) / 5.0
+                ),
+            )
+        )
+    report("{}x{} screen".format(state.width, state.height), rows)
+    machine.unlock()
+    vbox.manager.stop_keepalive()
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Per-call latency of hot operations through zeep and through the fast path
+"""
+
+from remotevbox.registry import ServiceRegistry
+from remotevbox.vbox import IVirtualBox
+from tests.stub import State, serve
+
+from benchmarks import measure, report
+
+
+def main(number=500):
+    server, state, url = serve(State(state="Running"))
+    rows = []
+    for fast_path in (False, True):
+        vbox = IVirtualBox(url, registry=ServiceRegistry(), fast_path=fast_path)
+        machine = vbox.get_machine("vm1")
+        machine.lock()
+        keyboard = machine._get_keyboard()
+        service = vbox.service
+        label = "fast path" if fast_path else "zeep"
+        for operation, call in [
+            ("IMachine_getState", lambda: service.IMachine_getState(machine.mid)),
+            (
+                "IKeyboard_putScancodes",
+                lambda: service.IKeyboard_putScancodes(keyboard, [0x1E, 0x9E]),
+            ),
+        ]:
+            seconds = measure(call, number=number)
+            rows.append(
+                ("{}, {}".format(operation, label), "{:6.0f} us".format(seconds * 1e6))
+            )
+        machine.unlock()
+        vbox.manager.stop_keepalive()
+    report("median per call over {} calls".format(number), sorted(rows))
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Latency and allocations of many IMachine handles
+
+Client and stand-in server share one interpreter, every call is delayed
+by latency seconds on the server to stand for the network round trip.
+Without it lookups are bound by zeep on the client and threads can't
+overlap them.
+"""
+
+import sys
+import tracemalloc
+from time import perf_counter
+
+from remotevbox.machine import IMachine
+from remotevbox.registry import ServiceRegistry
+from remotevbox.vbox import IVirtualBox
+from tests.stub import State, serve
+
+from benchmarks import report
+
+
+def main(count=1000, workers=16, latency=0.005):
+    names = ["vm%d" % i for i in range(count)]
+    server, state, url = serve(State(machines=names))
+    vbox = IVirtualBox(url, registry=ServiceRegistry())
+    state.delay = latency
+
+    calls = sum(state.calls.values())
+    start = perf_counter()
+    for name in names:
+        vbox.get_machine(name)
+    sequential = perf_counter() - start
+    sequential_calls = sum(state.calls.values()) - calls
+
+    calls = sum(state.calls.values())
+    start = perf_counter()
+    machines = vbox.get_machines(names, workers=workers)
+    bulk = perf_counter() - start
+    bulk_calls = sum(state.calls.values()) - calls
+
+    # Construction only, mids are known
+    mids = [machine.mid for machine in machines]
+    del machines
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    handles = [
+        IMachine(vbox.service, vbox.manager, mid, vbox.version, name=name)
+        for mid, name in zip(mids, names)
+    ]
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    report(
+        "{} machine handles, {:.0f} ms latency".format(count, latency * 1000),
+        [
+            (
+                "get_machine in a loop",
+                "{:7.0f} ms, {} SOAP calls".format(sequential * 1000, sequential_calls),
+            ),
+            (
+                "get_machines, {} workers".format(workers),
+                "{:7.0f} ms, {} SOAP calls".format(bulk * 1000, bulk_calls),
+            ),
+            (
+                "construction",
+                "{:7.0f} B per handle".format(allocated / float(len(handles))),
+            ),
+        ],
+    )
+    vbox.manager.stop_keepalive()
+    server.stop()
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]] + [float(arg) for arg in sys.argv[3:]])
@@ -0,0 +1,72 @@
+"""
+Peak memory of a raw screenshot through zeep and through streaming
+
+The stand-in server runs in a subprocess so only the client allocations
+are traced. tracemalloc sees Python objects, lxml trees built by zeep are
+not included, so the zeep figure is a lower bound.
+"""
+
+import subprocess
+import sys
+import tracemalloc
+from time import perf_counter
+
+from remotevbox.registry import ServiceRegistry
+from remotevbox.vbox import IVirtualBox
+
+from benchmarks import report
+
+
+def main(width=1920, height=1080):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "tests.stub", str(width), str(height)],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    try:
+        url = server.stdout.readline().strip()
+        vbox = IVirtualBox(url, registry=ServiceRegistry())
+        machine = vbox.get_machine("vm1")
+        machine.lock()
+        buffer = bytearray(width * height * 4)
+
+        rows = []
+        for label, capture in [
+            ("zeep", lambda: machine.take_screenshot_raw()),
+            ("streaming", lambda: machine.take_screenshot_raw(streaming=True)),
+            (
+                "streaming, reused buffer",
+                lambda: machine.take_screenshot_raw(buffer=buffer),
+            ),
+        ]:
+            capture()
+            tracemalloc.start()
+            start = perf_counter()
+            frame = capture()
+            elapsed = perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            del frame
+            rows.append(
+                (
+                    label,
+                    "{:7.1f} ms, peak {:6.1f} MB".format(
+                        elapsed * 1000, peak / 2.0**20
+                    ),
+                )
+            )
+        report(
+            "{}x{} BGRA, {:.1f} MB frame".format(
+                width, height, width * height * 4 / 2.0**20
+            ),
+            rows,
+        )
+        machine.unlock()
+        vbox.manager.stop_keepalive()
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
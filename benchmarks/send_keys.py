@@ -0,0 +1,49 @@
+"""
+send_keys() against send_character_string() for a typed command line
+"""
+
+import sys
+from time import perf_counter
+
+from remotevbox.registry import ServiceRegistry
+from remotevbox.vbox import IVirtualBox
+from tests.stub import State, serve
+
+from benchmarks import report
+
+TEXT = "cd /var/log && grep -i 'error' syslog | sort | uniq -c > ~/Errors.txt "
+
+
+def main(length=200):
+    server, state, url = serve(State(state="Running"))
+    vbox = IVirtualBox(url, registry=ServiceRegistry())
+    machine = vbox.get_machine("vm1")
+    machine.lock()
+    text = (TEXT * (length // len(TEXT) + 1))[:length]
+
+    rows = []
+    for label, send in [
+        # No key press delay, only the round trips are measured
+        ("send_character_string", lambda: machine.send_character_string(text, 0)),
+        ("send_keys", lambda: machine.send_keys(text)),
+    ]:
+        calls = sum(state.calls.values())
+        start = perf_counter()
+        send()
+        elapsed = perf_counter() - start
+        rows.append(
+            (
+                label,
+                "{:7.1f} ms, {} SOAP calls".format(
+                    elapsed * 1000, sum(state.calls.values()) - calls
+                ),
+            )
+        )
+    report("typing {} characters".format(length), rows)
+    machine.unlock()
+    vbox.manager.stop_keepalive()
+    server.stop()
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
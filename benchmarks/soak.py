@@ -0,0 +1,68 @@
+"""
+Managed object references over a long running session
+
+Keyboard and mouse events are sent to a running machine, which is powered
+off and launched again every cycle events. Every replace events the
+IMachine object is dropped for garbage collection and a new one is got,
+references are released with release_on_gc. Objects held on the server
+must stay bounded, the run fails if their count exceeds limit.
+"""
+
+import sys
+from time import perf_counter
+
+from remotevbox.registry import ServiceRegistry
+from remotevbox.vbox import IVirtualBox
+from tests.stub import State, serve
+
+from benchmarks import report
+
+
+def main(events=100000, cycle=500, replace=2000, limit=10):
+    server, state, url = serve(State(state="Running"))
+    vbox = IVirtualBox(url, registry=ServiceRegistry(), release_on_gc=True)
+    machine = vbox.get_machine("vm1")
+    machine.lock()
+
+    peak = 0
+    start = perf_counter()
+    for event in range(1, events + 1):
+        if event % 2:
+            machine.put_scancodes([0x1E, 0x9E])
+        else:
+            machine.put_mouse_event(1, -1)
+
+        if event % replace == 0:
+            # Left for garbage collection with its session locked
+            machine = vbox.get_machine("vm1")
+            machine.lock()
+        elif event % cycle == 0:
+            machine.poweroff()
+            machine.launch()
+
+        peak = max(peak, len(state.refs))
+    elapsed = perf_counter() - start
+
+    stats = vbox.ref_stats()
+    report(
+        "{} events, power cycle every {}, new IMachine every {}".format(
+            events, cycle, replace
+        ),
+        [
+            ("elapsed", "{:7.1f} s".format(elapsed)),
+            (
+                "server objects",
+                "{:7d} peak, {} at the end".format(peak, len(state.refs)),
+            ),
+            ("released", "{:7d}".format(stats["released"])),
+            ("live", "{:7d} at the end".format(stats["live"])),
+        ],
+    )
+    vbox.manager.stop_keepalive()
+    server.stop()
+
+    assert peak <= limit, "{} objects held on the server, over {}".format(peak, limit)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
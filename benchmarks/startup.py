@@ -0,0 +1,102 @@
+"""
+Import time, connect time and resident memory of a fresh process
+
+Every figure comes from a new interpreter, so nothing is warm. Eager
+binding is what zeep's ServiceProxy does for every operation of the WSDL,
+the lazy proxy binds only operations that are called.
+"""
+
+import json
+import statistics
+import subprocess
+import sys
+
+from tests.stub import VBOX_OPERATIONS, serve
+
+from benchmarks import report
+
+CHILD = """
+import json, resource, sys
+from time import perf_counter
+
+start = perf_counter()
+import remotevbox
+result = {"import": perf_counter() - start}
+
+start = perf_counter()
+import remotevbox.api
+result["import_api"] = perf_counter() - start
+result["rss_import"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+start = perf_counter()
+vbox = remotevbox.connect(sys.argv[1], "user", "password")
+vbox.get_version()
+result["connect"] = perf_counter() - start
+result["rss_connect"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+if sys.argv[2] == "eager":
+    from zeep.proxy import ServiceProxy
+    from remotevbox.vbox import VBOX_SOAP_BINDING
+
+    start = perf_counter()
+    ServiceProxy(
+        vbox.client, vbox.client.wsdl.bindings[VBOX_SOAP_BINDING], address=sys.argv[1]
+    )
+    result["bind"] = perf_counter() - start
+    result["rss_bind"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+vbox.manager.stop_keepalive()
+print(json.dumps(result))
+"""
+
+
+def child(url, mode):
+    output = subprocess.check_output([sys.executable, "-c", CHILD, url, mode])
+    return json.loads(output.decode())
+
+
+def main(repeat=5):
+    server, state, url = serve(extra_operations=VBOX_OPERATIONS)
+    lazy = [child(url, "lazy") for _ in range(repeat)]
+    eager = [child(url, "eager") for _ in range(repeat)]
+
+    def median(results, key):
+        return statistics.median(result[key] for result in results)
+
+    report(
+        "fresh process, {} operations in WSDL, median of {}".format(
+            VBOX_OPERATIONS, repeat
+        ),
+        [
+            ("import remotevbox", "{:7.1f} ms".format(median(lazy, "import") * 1000)),
+            (
+                "import remotevbox.api",
+                "{:7.1f} ms".format(median(lazy, "import_api") * 1000),
+            ),
+            (
+                "connect, lazy binding",
+                "{:7.1f} ms".format(median(lazy, "connect") * 1000),
+            ),
+            (
+                "binding every operation",
+                "{:7.1f} ms more".format(median(eager, "bind") * 1000),
+            ),
+            (
+                "RSS after import",
+                "{:7.1f} MB".format(median(lazy, "rss_import") / 1024.0),
+            ),
+            (
+                "RSS after connect, lazy",
+                "{:7.1f} MB".format(median(lazy, "rss_connect") / 1024.0),
+            ),
+            (
+                "RSS after connect, eager",
+                "{:7.1f} MB".format(median(eager, "rss_bind") / 1024.0),
+            ),
+        ],
+    )
+    server.stop()
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,66 @@
+"""
+SOAP calls per second with different transport configurations
+
+Threads share one IVirtualBox and call IMachine_getState, connection
+counters come from IVirtualBox.transport_stats().
+"""
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from remotevbox.registry import ServiceRegistry
+from remotevbox.transport import TransportConfig
+from remotevbox.vbox import IVirtualBox
+from tests.stub import serve
+
+from benchmarks import report
+
+CONFIGS = [
+    ("default pool of 10", TransportConfig()),
+    ("pool sized to threads", None),
+    ("pool sized to threads, blocking", None),
+    ("no keep-alive", TransportConfig(keep_alive=False)),
+    ("Nagle enabled", TransportConfig(tcp_nodelay=False)),
+]
+
+
+def run(url, config, threads, calls):
+    vbox = IVirtualBox(url, transport=config, registry=ServiceRegistry())
+    mid = vbox.find_machine("vm1")
+    before = vbox.transport_stats()
+
+    def work(_):
+        for _ in range(calls):
+            vbox.service.IMachine_getState(mid)
+
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        list(ex.map(work, range(threads)))
+    elapsed = perf_counter() - start
+
+    stats = vbox.transport_stats()
+    connections = stats["connections"] - before["connections"]
+    return threads * calls / elapsed, connections
+
+
+def main(threads=32, calls=50):
+    server, state, url = serve()
+    CONFIGS[1] = (CONFIGS[1][0], TransportConfig(pool_maxsize=threads))
+    CONFIGS[2] = (
+        CONFIGS[2][0],
+        TransportConfig(pool_maxsize=threads, pool_block=True),
+    )
+
+    rows = []
+    for label, config in CONFIGS:
+        rate, connections = run(url, config, threads, calls)
+        rows.append(
+            (label, "{:6.0f} calls/s, {} connections".format(rate, connections))
+        )
+    report("{} threads x {} IMachine_getState calls".format(threads, calls), rows)
+    server.stop()
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
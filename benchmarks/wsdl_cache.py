@@ -0,0 +1,54 @@
+"""
+Cold and warm connect() latency with the on-disk WSDL cache
+"""
+
+import tempfile
+
+from remotevbox.api import connect
+from benchmarks import measure, report
+from remotevbox.cache import WSDLCache
+from remotevbox.registry import ServiceRegistry
+from tests.stub import VBOX_OPERATIONS, serve
+
+
+def main():
+    server, state, url = serve(extra_operations=VBOX_OPERATIONS)
+    path = tempfile.mkdtemp()
+
+    def cold():
+        # Fresh registry and cache, the WSDL is downloaded and parsed
+        connect(url, registry=ServiceRegistry(), cache=WSDLCache(tempfile.mkdtemp()))
+
+    def warm():
+        # Fresh registry, documents come from the populated cache
+        connect(url, registry=ServiceRegistry(), cache=WSDLCache(path))
+
+    def shared():
+        connect(url, registry=registry)
+
+    registry = ServiceRegistry()
+    warm()
+    shared()
+
+    rows = []
+    for label, func in [
+        ("cold, no cache", cold),
+        ("warm, disk cache", warm),
+        ("warm, shared registry", shared),
+    ]:
+        gets = state.calls["GET"]
+        seconds = measure(func)
+        rows.append(
+            (
+                label,
+                "{:7.1f} ms, {} WSDL downloads".format(
+                    seconds * 1000, (state.calls["GET"] - gets) // 5
+                ),
+            )
+        )
+    report("connect() with {} operations in WSDL".format(VBOX_OPERATIONS), rows)
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -15,4 +15,13 @@ Usage:
     >>> vbox.disconnect()
 """
 
-from .api import connect
+
+def connect(*args, **kwargs):
+    """Connects and returns IVirtualBox object
+
+    See :func:`remotevbox.api.connect` for arguments. zeep and the rest of
+    the package are imported on the first call, so importing remotevbox
+    stays cheap for processes that don't connect."""
+    from .api import connect
+
+    return connect(*args, **kwargs)
@@ -0,0 +1,660 @@
+"""
+asyncio bindings
+
+Mirrors IVirtualBox, IMachine, IProgress and INetworkAdapter with coroutine
+methods on top of zeep's httpx based AsyncTransport. Loading the service
+definition is still synchronous, every operation afterwards is awaitable.
+
+Usage:
+    >>> import remotevbox.aio
+    >>> vbox = await remotevbox.aio.connect("http://127.0.0.1:18083", "vbox", "pass")
+    >>> machine = await vbox.get_machine("Windows10")
+    >>> await machine.launch()
+    >>> await vbox.disconnect()
+"""
+
+import asyncio
+import functools
+from base64 import b64decode
+
+try:
+    import httpx
+except ImportError:
+    raise ImportError("remotevbox.aio requires httpx: pip install remotevbox[aio]")
+
+import zeep
+import zeep.exceptions
+from zeep.proxy import AsyncServiceProxy
+from zeep.transports import AsyncTransport
+
+from .exceptions import (
+    FindMachineError,
+    ListMachinesError,
+    MachineDisableNetTraceError,
+    MachineDiscardError,
+    MachineEnableNetTraceError,
+    MachineExtraDataError,
+    MachineLaunchError,
+    MachineLockError,
+    MachinePauseError,
+    MachinePowerdownError,
+    MachineSaveError,
+    MachineSetTraceFileError,
+    MachineSnaphotError,
+    MachineSnapshotError,
+    MachineSnapshotNX,
+    MachineUnlockError,
+    ProgressTimeout,
+    WebServiceConnectionError,
+    WrongCredentialsError,
+    WrongLockState,
+    WrongMachineState,
+)
+from .machine import KEYBOARD_PAGE, SHIFT_USB_HID_CODE, version_older
+from .us_layout import MAPPING
+from .vbox import VBOX_SOAP_BINDING
+
+
+async def connect(
+    location, user="", password="", cache=None, max_connections=100, timeout=None
+):
+    """Connects and returns IVirtualBox object
+
+    :param max_connections: upper bound of concurrent HTTP connections, calls
+                            over it wait for a free connection
+    :param timeout: seconds to wait for each operation, None is forever
+    """
+    # Service definition is loaded synchronously, keep it off the event loop
+    vbox = await asyncio.get_event_loop().run_in_executor(
+        None,
+        functools.partial(
+            IVirtualBox,
+            location,
+            cache=cache,
+            max_connections=max_connections,
+            timeout=timeout,
+        ),
+    )
+    await vbox.logon(user, password)
+    return vbox
+
+
+class IVirtualBox(object):
+    def __init__(self, location, cache=None, max_connections=100, timeout=None):
+        if not location.endswith("/"):
+            location = location + "/"
+
+        self.location = location
+        self.client = self.get_client(
+            location + "?wsdl", cache, max_connections, timeout
+        )
+        self.service = AsyncServiceProxy(
+            self.client,
+            self.client.wsdl.bindings[VBOX_SOAP_BINDING],
+            address=self.location,
+        )
+        self.manager = None
+        self.handle = None
+        self.version = None
+
+    def get_client(self, location, cache, max_connections, timeout):
+        transport = AsyncTransport(
+            client=httpx.AsyncClient(
+                timeout=timeout,
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                ),
+            ),
+            cache=cache,
+        )
+        try:
+            return zeep.AsyncClient(
+                location,
+                transport=transport,
+                settings=zeep.Settings(xml_huge_tree=True),
+            )
+
+        except httpx.TransportError:
+            raise WebServiceConnectionError(
+                "Location: {} is not available".format(location)
+            )
+
+    async def logon(self, user, password):
+        self.manager = IWebsessionManager(self.service)
+        await self.manager.logon(user, password)
+        self.handle = self.manager.handle
+        self.version = await self.get_version()
+
+    def get_session_manager(self):
+        return self.manager
+
+    async def list_machines(self):
+        """Lists all machines available"""
+        machines = []
+        for machine in await self.service.IVirtualBox_getMachines(self.handle):
+            try:
+                machines.append(await self.service.IMachine_getName(machine))
+            except zeep.exceptions.Fault as err:
+                if "The object functionality is limited" not in str(err):
+                    raise ListMachinesError(err)
+
+        return machines
+
+    async def get_machine(self, name):
+        """Returns IMachine"""
+        mid = await self.find_machine(name)
+        machine = IMachine(self.service, self.manager, mid, vbox_version=self.version)
+        machine.session = await self.manager.get_session(mid)
+        return machine
+
+    async def find_machine(self, name):
+        """Returns virtual machine identificator by it's name"""
+        try:
+            return await self.service.IVirtualBox_findMachine(self.handle, name)
+
+        except zeep.exceptions.Fault as e:
+            raise FindMachineError(e)
+
+    async def get_version(self):
+        """Returns string with a VirtualBox version"""
+        return await self.service.IVirtualBox_getVersion(self.handle)
+
+    async def disconnect(self):
+        """Disconnects and closes HTTP connections"""
+        await self.manager.logoff()
+        await self.client.transport.aclose()
+
+
+class IWebsessionManager(object):
+    """IWebsessionManager retrieves handle and current session"""
+
+    def __init__(self, service):
+        self.service = service
+        self.handle = None
+        self.session = None
+
+    async def logon(self, user, password):
+        try:
+            self.handle = await self.service.IWebsessionManager_logon(user, password)
+        except zeep.exceptions.Fault:
+            raise WrongCredentialsError("Wrong credentials supplied")
+
+        if self.handle:
+            self.session = await self.get_session(self.handle)
+
+    async def get_session(self, handle):
+        """Retrieves current SessionObject"""
+        return await self.service.IWebsessionManager_getSessionObject(handle)
+
+    async def logoff(self):
+        """Logs off and destroy all managed object references"""
+        await self.service.IWebsessionManager_logoff(self.handle)
+
+
+class IMachine(object):
+    """IMachine constructs object with service, manager and id
+
+    Use IVirtualBox.get_machine() to get one with a session"""
+
+    """Virtual machine states"""
+    ABORTED = "Aborted"
+    PAUSED = "Paused"
+    POWEROFF = "PoweredOff"
+    RUNNING = "Running"
+    SAVED = "Saved"
+    STUCK = "Stuck"
+
+    """Session states"""
+    LOCKED = "Locked"
+    UNLOCKED = "Unlocked"
+
+    """Launch modes"""
+    HEADLESS = "headless"
+    GUI = "gui"
+
+    def __init__(self, service, manager, mid, vbox_version="6.1.0"):
+        self.mid = mid
+        self.service = service
+        self.manager = manager
+        self.session = None
+        self.mutable_id = None
+        self.vbox_version = vbox_version
+
+    async def launch(self, mode="headless"):
+        """Launches stopped or powered off machine"""
+        if await self._get_state() == self.RUNNING:
+            return
+
+        try:
+            if version_older(self.vbox_version, "6.1.0"):
+                progress = await self.service.IMachine_launchVMProcess(
+                    self.mid, self.session, mode, ""
+                )
+            else:
+                progress = await self.service.IMachine_launchVMProcess(
+                    self.mid, self.session, mode
+                )
+            await IProgress(progress, self.service).wait()
+        except zeep.exceptions.Fault as err:
+            raise MachineLaunchError("Launch operation failed: {}".format(err.message))
+
+    async def lock(self, mode="Shared"):
+        """Locks current machine, Shared or Write"""
+        try:
+            await self.service.IMachine_lockMachine(self.mid, self.session, mode)
+            self.mutable_id = await self.service.ISession_getMachine(self.session)
+        except zeep.exceptions.Fault as err:
+            raise MachineLockError("Lock operation failed: {}".format(err.message))
+
+    async def unlock(self):
+        """Unlocks current machine"""
+        try:
+            await self.service.ISession_unlockMachine(self.session)
+        except zeep.exceptions.Fault as err:
+            raise MachineUnlockError("Unlock operation failed: {}".format(err.message))
+
+    async def get_os(self):
+        """Get Guest operating system type (user-defined value)"""
+        return await self.service.IMachine_getOSTypeId(self.mid)
+
+    async def restore(self, snapshot_name=None):
+        if await self.state() == self.RUNNING:
+            raise WrongMachineState("Can't restore a running machine")
+
+        if snapshot_name is None:
+            isnapshot = await self.service.IMachine_getCurrentSnapshot(self.mid)
+            if isnapshot is None:
+                raise MachineSnapshotNX("Machine doesn't have a current snapshot")
+
+        else:
+            isnapshot = await self._get_snapshot(snapshot_name)
+
+        await self.lock()
+        progress = await self.service.IMachine_restoreSnapshot(
+            self.mutable_id, isnapshot
+        )
+        await IProgress(progress, self.service).wait()
+        await self.unlock()
+
+    async def discard(self, remove_state_file=True):
+        """Discard Saved state to PoweredOff"""
+        await self.lock()
+        try:
+            await self.service.IMachine_discardSavedState(
+                self.mutable_id, remove_state_file
+            )
+            await self.unlock()
+        except zeep.exceptions.Fault as err:
+            raise MachineDiscardError("Can't discard state: {}".format(err.message))
+
+    async def enable_net_trace(self, filename, slot=0):
+        """Trace network adapter specified by a slot to a pcap file"""
+        if await self._get_state() not in [self.POWEROFF, self.SAVED]:
+            raise WrongMachineState("Machine is not PoweredOff or Saved")
+
+        await self.lock()
+        adapter = await INetworkAdapter.create(self.service, self.mutable_id, slot)
+        await adapter.enable_trace(filename)
+        await self.service.IMachine_saveSettings(self.mutable_id)
+        await self.unlock()
+
+    async def disable_net_trace(self, slot=0):
+        if await self._get_state() != self.POWEROFF:
+            raise WrongMachineState("Machine state is not PoweredOff")
+
+        await self.lock()
+        adapter = await INetworkAdapter.create(self.service, self.mutable_id, slot)
+        await adapter.disable_trace()
+        await self.service.IMachine_saveSettings(self.mutable_id)
+        await self.unlock()
+
+    async def _get_snapshot(self, name):
+        """Return ISnapshot object by it's name"""
+        try:
+            return await self.service.IMachine_findSnapshot(self.mid, name)
+        except zeep.exceptions.Fault as err:
+            if "Could not find a snapshost" in err.message:
+                raise MachineSnapshotNX("Can't find snapshot {}".format(name))
+
+            raise MachineSnapshotError(err)
+
+    async def _get_session_state(self):
+        return await self.service.ISession_getState(self.session)
+
+    async def _get_machine_session_state(self):
+        return await self.service.IMachine_getSessionState(self.mid)
+
+    async def _get_state(self):
+        return await self.service.IMachine_getState(self.mid)
+
+    async def _get_console(self):
+        if await self._get_session_state() == self.LOCKED:
+            return await self.service.ISession_getConsole(self.session)
+
+        raise WrongLockState("Session is not locked")
+
+    async def save(self):
+        """Save state of running machine"""
+        if await self._get_session_state() == self.UNLOCKED:
+            await self.lock()
+
+        try:
+            self.mutable_id = await self.service.ISession_getMachine(self.session)
+            progress = await self.service.IMachine_saveState(self.mutable_id)
+            await IProgress(progress, self.service).wait()
+        except zeep.exceptions.Fault as err:
+            raise MachineSaveError("Save operation failed: {}".format(err.message))
+
+        if await self._get_machine_session_state() == self.LOCKED:
+            await self.unlock()
+
+    async def state(self):
+        """Returns machine current state"""
+        return await self._get_state()
+
+    async def save_and_discard(self):
+        """Save virtual machine and discard the current state after"""
+        state = await self._get_state()
+        if state == self.POWEROFF:
+            raise WrongMachineState("Already powered off")
+
+        if state == self.RUNNING:
+            await self.save()
+
+        if await self._get_state() == self.SAVED:
+            await self.discard()
+
+    async def poweroff(self):
+        """Power down virtual machine"""
+        state = await self.state()
+        if state not in [self.RUNNING, self.PAUSED, self.STUCK]:
+            raise WrongMachineState(
+                "Can't power down machine in {} state".format(state)
+            )
+
+        if await self._get_session_state() == self.UNLOCKED:
+            await self.lock()
+
+        try:
+            iconsole = await self._get_console()
+            progress = await self.service.IConsole_powerDown(iconsole)
+            await IProgress(progress, self.service).wait()
+        except zeep.exceptions.Fault as err:
+            raise MachinePowerdownError(
+                "Power down operation failed: {}".format(err.message)
+            )
+
+        if (
+            await self._get_machine_session_state() == self.LOCKED
+            and await self._get_session_state() == self.LOCKED
+        ):
+            await self.unlock()
+
+    async def pause(self):
+        """Set machine to pause state"""
+        try:
+            await self.service.IConsole_pause(await self._get_console())
+        except zeep.exceptions.Fault as err:
+            raise MachinePauseError("Pause operation failed: {}".format(err.message))
+
+    async def extradata(self, key=None):
+        """Get a specific value or all extradata on this machine"""
+        try:
+            if not key:
+                keys = await self.service.IMachine_getExtraDataKeys(self.mid)
+                values = await asyncio.gather(*[self.extradata(k) for k in keys])
+                return dict(zip(keys, values))
+
+            return await self.service.IMachine_getExtraData(self.mid, key)
+        except zeep.exceptions.Fault as err:
+            raise MachineExtraDataError(
+                "Extradata operation failed: {}".format(err.message)
+            )
+
+    async def set_extradata(self, key, value):
+        """Sets extradata key to value on current machine"""
+        if await self._get_session_state() == self.UNLOCKED:
+            await self.lock()
+
+        try:
+            m2 = await self.service.ISession_getMachine(self.session)
+            await self.service.IMachine_setExtraData(m2, key, value)
+        except zeep.exceptions.Fault as err:
+            raise MachineExtraDataError(
+                "Extradata operation failed: {}".format(err.message)
+            )
+
+        if await self._get_machine_session_state() == self.LOCKED:
+            await self.unlock()
+
+    async def take_snapshot(self, target_name, target_description=""):
+        """Takes a snapshot of the current machine, returns once it is taken"""
+        if await self._get_session_state() == self.UNLOCKED:
+            await self.lock()
+
+        try:
+            m2 = await self.service.ISession_getMachine(self.session)
+            result = await self.service.IMachine_takeSnapshot(
+                m2, target_name, target_description, False
+            )
+            # The session must stay locked until the snapshot is taken
+            progress = IProgress(getattr(result, "returnval", result), self.service)
+            status = await progress.wait()
+        except zeep.exceptions.Fault as err:
+            raise MachineSnaphotError("Unable to take snapshot: {}".format(err.message))
+
+        if await self._get_machine_session_state() == self.LOCKED:
+            await self.unlock()
+        if status != "Success":
+            raise MachineSnaphotError("Unable to take snapshot")
+        return result
+
+    async def get_screen_resolution(self, screen_number=0):
+        iconsole = await self._get_console()
+        display = await self.service.IConsole_getDisplay(iconsole)
+        return await self.service.IDisplay_getScreenResolution(display, screen_number)
+
+    async def take_screenshot_to_bytes(self, screen_number=0, image_format="PNG"):
+        """Return the screenshot as an image, PNG by default"""
+        iconsole = await self._get_console()
+        display = await self.service.IConsole_getDisplay(iconsole)
+        resolution = await self.service.IDisplay_getScreenResolution(
+            display, screen_number
+        )
+        image_data = await self.service.IDisplay_takeScreenShotToArray(
+            display,
+            screen_number,
+            resolution["width"],
+            resolution["height"],
+            image_format,
+        )
+        return b64decode(image_data)
+
+    async def _get_keyboard(self):
+        return await self.service.IConsole_getKeyboard(await self._get_console())
+
+    async def _get_mouse(self):
+        return await self.service.IConsole_getMouse(await self._get_console())
+
+    async def send_ctrl_alt_del(self):
+        """Send Ctrl + Alt + Del to the machine."""
+        await self.service.IKeyboard_putCAD(await self._get_keyboard())
+
+    async def put_scancodes(self, scancodes):
+        """Send a list of keyboard scancodes to the machine."""
+        await self.service.IKeyboard_putScancodes(await self._get_keyboard(), scancodes)
+
+    async def put_usagecode(self, code, page, release=False):
+        """Send a USB HID usage code."""
+        await self.service.IKeyboard_putUsageCode(
+            await self._get_keyboard(), code, page, release
+        )
+
+    async def release_keys(self):
+        """Release every key currently considered pressed."""
+        await self.service.IKeyboard_releaseKeys(await self._get_keyboard())
+
+    async def put_mouse_event(
+        self,
+        dx,
+        dy,
+        dz=0,
+        dw=0,
+        left_pressed=False,
+        right_pressed=False,
+        middle_pressed=False,
+    ):
+        """Send a mouse event using relative coordinates."""
+        button_state = (
+            (0x01 * left_pressed) + (0x02 * right_pressed) + (0x03 * middle_pressed)
+        )
+        await self.service.IMouse_putMouseEvent(
+            await self._get_mouse(), dx, dy, dz, dw, button_state
+        )
+
+    async def put_mouse_event_absolute(
+        self,
+        x,
+        y,
+        dz=0,
+        dw=0,
+        left_pressed=False,
+        right_pressed=False,
+        middle_pressed=False,
+    ):
+        """Send a mouse event using absolute coordinates."""
+        button_state = (
+            (0x01 * left_pressed) + (0x02 * right_pressed) + (0x03 * middle_pressed)
+        )
+        await self.service.IMouse_putMouseEventAbsolute(
+            await self._get_mouse(), x, y, dz, dw, button_state
+        )
+
+    async def absolute_mouse_pointer_supported(self):
+        """Return whether the guest OS supports absolute pointer positioning."""
+        return await self.service.IMouse_getAbsoluteSupported(await self._get_mouse())
+
+    async def send_single_key(self, key, duration=0.01, keymap="US"):
+        """Helper to send a character using USB HID."""
+        if keymap != "US":
+            raise NotImplementedError("Only US layout is supported for now")
+        if key not in MAPPING:
+            raise ValueError("Unknown key:" + key)
+        code, use_shift = MAPPING[key]
+        if use_shift:
+            await self.put_usagecode(SHIFT_USB_HID_CODE, KEYBOARD_PAGE)
+        await self.put_usagecode(code, KEYBOARD_PAGE)
+        await asyncio.sleep(duration)
+        await self.put_usagecode(code, KEYBOARD_PAGE, release=True)
+        if use_shift:
+            await self.put_usagecode(SHIFT_USB_HID_CODE, KEYBOARD_PAGE, release=True)
+
+    async def send_key_combination(self, keys, duration=0.01, keymap="US"):
+        """Helper to send a key combination using USB HID."""
+        if keymap != "US":
+            raise NotImplementedError("Only US layout is supported for now")
+        for key in keys:
+            if key not in MAPPING:
+                raise ValueError("Unknown key:" + key)
+            code, use_shift = MAPPING[key]
+            if use_shift:
+                raise ValueError(
+                    "Cannot use shift in this context, check your combination"
+                )
+            await self.put_usagecode(code, KEYBOARD_PAGE)
+        await asyncio.sleep(duration)
+        for key in keys:
+            code, _ = MAPPING[key]
+            await self.put_usagecode(code, KEYBOARD_PAGE, release=True)
+
+    async def send_character_string(self, keys, duration=0.01, keymap="US"):
+        """Helper to send a string using the USB HID keyboard."""
+        for c in keys:
+            await self.send_single_key(c, duration=duration, keymap=keymap)
+
+
+class IProgress(object):
+    """IProgress awaits completion without holding a connection
+
+    Completion is polled every interval seconds instead of a server side
+    IProgress_waitForCompletion call"""
+
+    def __init__(self, progress_id, service, interval=0.1):
+        self.pid = progress_id
+        self.service = service
+        self.interval = interval
+
+    async def wait(self, miliseconds=-1):
+        """Wait for infinite time by default"""
+        loop = asyncio.get_event_loop()
+        deadline = None if miliseconds < 0 else loop.time() + miliseconds / 1000.0
+        try:
+            while not await self.completed():
+                if deadline is not None and loop.time() >= deadline:
+                    raise ProgressTimeout(
+                        "Progress has not completed in {} ms".format(miliseconds)
+                    )
+                await asyncio.sleep(self.interval)
+        except zeep.exceptions.Fault as err:
+            raise ProgressTimeout("Progress wait failed: {}".format(err.message))
+
+        return await self.status()
+
+    async def completed(self):
+        return await self.service.IProgress_getCompleted(self.pid)
+
+    async def percent(self):
+        return await self.service.IProgress_getPercent(self.pid)
+
+    async def status(self):
+        """Check status of the progress"""
+        status = await self.service.IProgress_getResultCode(self.pid)
+        if status != 0:
+            return "Fail"
+
+        return "Success"
+
+
+class INetworkAdapter(object):
+    """INetworkAdapter works with selected machine's network adapter
+
+    Use INetworkAdapter.create() to get one with the adapter resolved"""
+
+    def __init__(self, service, machine_id, slot=0):
+        self.machine = machine_id
+        self.service = service
+        self.slot = slot
+        self.adapter = None
+
+    @classmethod
+    async def create(cls, service, machine_id, slot=0):
+        adapter = cls(service, machine_id, slot)
+        adapter.adapter = await service.IMachine_getNetworkAdapter(machine_id, slot)
+        return adapter
+
+    async def trace_enabled(self):
+        return await self.service.INetworkAdapter_getTraceEnabled(self.adapter)
+
+    async def enable_trace(self, filename):
+        try:
+            await self.service.INetworkAdapter_setTraceEnabled(self.adapter, True)
+        except zeep.exceptions.Fault as err:
+            raise MachineEnableNetTraceError(
+                "Failed to enable net trace: {}".format(err.message)
+            )
+
+        try:
+            await self.service.INetworkAdapter_setTraceFile(self.adapter, filename)
+        except zeep.exceptions.Fault as err:
+            raise MachineSetTraceFileError(
+                "Failed to set pcap trace file: {}".format(err.message)
+            )
+
+    async def disable_trace(self):
+        try:
+            await self.service.INetworkAdapter_setTraceEnabled(self.adapter, False)
+        except zeep.exceptions.Fault as err:
+            raise MachineDisableNetTraceError(
+                "Failed to disable net trace: {}".format(err.message)
+            )
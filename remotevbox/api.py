@@ -5,6 +5,40 @@ Main API module
 from .vbox import IVirtualBox
 
 
-def connect(location, user="", password=""):
-    """Connects and returns IVirtualBox object"""
-    return IVirtualBox(location, user, password)
+def connect(
+    location,
+    user="",
+    password="",
+    cache=None,
+    registry=None,
+    transport=None,
+    fast_path=False,
+    release_on_gc=False,
+    keepalive=None,
+):
+    """Connects and returns IVirtualBox object
+
+    Pass a :class:`WSDLCache <remotevbox.cache.WSDLCache>` as cache to keep
+    the service definition on disk between connects.
+    Client and service proxy are shared per location through registry,
+    process-wide :data:`default_registry <remotevbox.registry.default_registry>`
+    by default.
+    HTTP pooling, keep-alive and timeouts are set with a
+    :class:`TransportConfig <remotevbox.transport.TransportConfig>` as transport.
+    Set fast_path to send hot operations like IMachine_getState with
+    pre-rendered envelopes instead of zeep, see :mod:`remotevbox.fastpath`.
+    Set release_on_gc to release managed object references held by
+    machines when they are garbage collected, see :mod:`remotevbox.refs`.
+    Set keepalive to seconds between websession pings, an expired
+    websession is logged on again and machines are looked up again"""
+    return IVirtualBox(
+        location,
+        user,
+        password,
+        cache=cache,
+        registry=registry,
+        transport=transport,
+        fast_path=fast_path,
+        release_on_gc=release_on_gc,
+        keepalive=keepalive,
+    )
@@ -0,0 +1,112 @@
+"""
+On-disk cache for vboxwebsrv WSDL and XSD documents
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from urllib.parse import urlparse
+
+import zeep.cache
+
+VERSION_FILE = "VERSION"
+
+
+def default_cache_path():
+    """Returns default cache directory, respects XDG_CACHE_HOME"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "remotevbox", "wsdl")
+
+
+def _digest(value):
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()
+
+
+class WSDLCache(zeep.cache.Base):
+    """WSDLCache stores service definition documents per endpoint
+
+    Documents live in a directory per endpoint (scheme, host and port) along
+    with the VirtualBox version they were fetched from. Call validate() once
+    the version is known: a version mismatch drops the endpoint entries.
+
+    :param path: cache directory, ~/.cache/remotevbox/wsdl by default
+    :param timeout: seconds after which an entry expires, never by default
+    """
+
+    def __init__(self, path=None, timeout=None):
+        self.path = path or default_cache_path()
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+
+    def _endpoint_dir(self, url):
+        parsed = urlparse(url)
+        return os.path.join(
+            self.path, _digest("{}://{}".format(parsed.scheme, parsed.netloc))
+        )
+
+    def _entry_path(self, url):
+        return os.path.join(self._endpoint_dir(url), _digest(url))
+
+    def get(self, url):
+        """Returns cached document content or None"""
+        entry = self._entry_path(url)
+        try:
+            if self.timeout is not None:
+                if time.time() - os.path.getmtime(entry) > self.timeout:
+                    self.misses += 1
+                    return None
+
+            with open(entry, "rb") as fp:
+                content = fp.read()
+        except OSError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return content
+
+    def add(self, url, content):
+        """Atomically stores document content"""
+        directory = self._endpoint_dir(url)
+        os.makedirs(directory, exist_ok=True)
+
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(content)
+        os.replace(tmp, self._entry_path(url))
+
+    def version(self, location):
+        """Returns VirtualBox version the endpoint entries belong to"""
+        try:
+            with open(os.path.join(self._endpoint_dir(location), VERSION_FILE)) as fp:
+                return fp.read().strip() or None
+        except OSError:
+            return None
+
+    def validate(self, location, version):
+        """Binds endpoint entries to a VirtualBox version
+
+        Returns False if entries were fetched from another version and have
+        been dropped, so the caller should fetch the definition again.
+        """
+        cached = self.version(location)
+        valid = cached is None or cached == version
+        if not valid:
+            self.invalidate(location)
+
+        directory = self._endpoint_dir(location)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, VERSION_FILE), "w") as fp:
+            fp.write(version)
+
+        return valid
+
+    def invalidate(self, location=None):
+        """Drops entries of the endpoint or the whole cache"""
+        directory = self._endpoint_dir(location) if location else self.path
+        shutil.rmtree(directory, ignore_errors=True)
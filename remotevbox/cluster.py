@@ -0,0 +1,397 @@
+"""
+Client for a group of VirtualBox hosts
+
+Machine inventories of all hosts are aggregated, machines are routed to
+the host they live on and clones are placed on the least loaded host.
+Hosts failing or answering too slowly are taken out of rotation by a
+circuit breaker and probed again after a while.
+"""
+
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+
+import requests.exceptions
+import zeep.exceptions
+
+from .exceptions import (
+    FindMachineError,
+    HostUnavailableError,
+    NoHostAvailableError,
+    WebServiceConnectionError,
+)
+from .machine import IMachine
+from .vbox import IVirtualBox
+
+# record is MachineRecord of the machine on host location
+ClusterMachine = namedtuple("ClusterMachine", ["host", "record"])
+
+# running is the number of running machines, cpus and memory come from IHost
+HostLoad = namedtuple(
+    "HostLoad", ["host", "cpus", "memory_size", "memory_available", "running"]
+)
+
+# Errors meaning the host itself is unhealthy rather than a request is wrong
+HOST_ERRORS = (
+    WebServiceConnectionError,
+    requests.exceptions.RequestException,
+    zeep.exceptions.TransportError,
+)
+
+
+class CircuitBreaker(object):
+    """CircuitBreaker takes a host out of rotation after repeated failures
+
+    After failure_threshold consecutive failures the breaker opens and
+    rejects calls for reset_timeout seconds, then lets a single probe
+    call through (half-open). A successful probe closes it again.
+    Calls slower than latency_threshold seconds count as failures.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0, latency_threshold=None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.latency_threshold = latency_threshold
+        self.failures = 0
+        self.opened = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened is None:
+            return self.CLOSED
+        if monotonic() - self.opened >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        """Returns whether a call may be made now"""
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, latency):
+        """Records a finished call, slow calls are failures"""
+        if self.latency_threshold is not None and latency > self.latency_threshold:
+            self.failure()
+        else:
+            self.success()
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened = None
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened = monotonic()
+            self._probing = False
+
+    def release(self):
+        """Ends a call which neither succeeded nor failed the host"""
+        with self._lock:
+            self._probing = False
+
+
+class Host(object):
+    """Host is a single vboxwebsrv endpoint guarded by a circuit breaker
+
+    Connection is made on the first call and made again after the host
+    failed.
+    """
+
+    def __init__(self, location, user="", password="", breaker=None, **options):
+        self.location = location
+        self.user = user
+        self.password = password
+        self.options = options
+        self.breaker = breaker or CircuitBreaker()
+        self.vbox = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        with self._lock:
+            if self.vbox is None:
+                self.vbox = IVirtualBox(
+                    self.location, self.user, self.password, **self.options
+                )
+            return self.vbox
+
+    def available(self):
+        """Returns whether the host is in rotation"""
+        return self.breaker.state != CircuitBreaker.OPEN
+
+    def call(self, func):
+        """Returns func(IVirtualBox) called on this host
+
+        Raises
+        ------
+        HostUnavailableError
+            If the host is out of rotation or failed to respond
+        """
+        if not self.breaker.allow():
+            raise HostUnavailableError(
+                "Host {} is out of rotation".format(self.location)
+            )
+
+        start = monotonic()
+        vbox = None
+        try:
+            vbox = self._connect()
+            result = func(vbox)
+        except HOST_ERRORS as err:
+            self.breaker.failure()
+            if vbox is not None:
+                self.disconnect(vbox)
+            raise HostUnavailableError("Host {} failed: {}".format(self.location, err))
+        except Exception:
+            self.breaker.release()
+            raise
+
+        self.breaker.record(monotonic() - start)
+        return result
+
+    def disconnect(self, vbox=None):
+        """Logs off, if vbox is given only while it is still the connection
+
+        Another thread may have connected again after vbox failed"""
+        with self._lock:
+            if self.vbox is None or vbox not in (None, self.vbox):
+                return
+            vbox, self.vbox = self.vbox, None
+
+        try:
+            vbox.disconnect()
+        except Exception:
+            pass
+
+
+def load_score(load):
+    """Returns load score of a host, lower is less loaded
+
+    Sum of used memory fraction and running machines per processor"""
+    used_memory = 1.0 - float(load.memory_available) / max(load.memory_size, 1)
+    return used_memory + float(load.running) / max(load.cpus, 1)
+
+
+class Cluster(object):
+    """Cluster spreads work over a group of VirtualBox hosts
+
+    :param locations: vboxwebsrv locations, the same credentials are used
+        for all of them
+    :param workers: maximum number of hosts queried at once
+    :param failure_threshold: consecutive failures to take a host out of
+        rotation
+    :param reset_timeout: seconds before a failed host is probed again
+    :param latency_threshold: seconds after which a call counts as failed
+    :param options: passed to IVirtualBox of every host, e.g. transport
+    """
+
+    def __init__(
+        self,
+        locations,
+        user="",
+        password="",
+        workers=8,
+        failure_threshold=3,
+        reset_timeout=30.0,
+        latency_threshold=None,
+        **options
+    ):
+        self.hosts = [
+            Host(
+                location,
+                user,
+                password,
+                breaker=CircuitBreaker(
+                    failure_threshold, reset_timeout, latency_threshold
+                ),
+                **options
+            )
+            for location in locations
+        ]
+        self.workers = workers
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def available_hosts(self):
+        return [host for host in self.hosts if host.available()]
+
+    def _get_host(self, location):
+        for host in self.hosts:
+            if host.location == location:
+                return host
+        raise ValueError("Unknown host: {}".format(location))
+
+    def _map(self, func, hosts=None):
+        """Calls func(IVirtualBox) on hosts in parallel
+
+        Returns list of (host, result) of hosts which responded, a host
+        raising any other error is left out as well"""
+        hosts = self.available_hosts() if hosts is None else hosts
+        if not hosts:
+            raise NoHostAvailableError("All hosts are out of rotation")
+
+        def call(host):
+            try:
+                return host, host.call(func)
+            except Exception:
+                # One host must not fail the aggregate
+                return host, None
+
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(self.workers, len(hosts)))
+        ) as ex:
+            return [
+                (host, result)
+                for host, result in ex.map(call, hosts)
+                if result is not None
+            ]
+
+    def inventory(self):
+        """Returns list of ClusterMachine of all responding hosts"""
+        machines = []
+        for host, records in self._map(lambda vbox: vbox.inventory()):
+            for record in records:
+                machines.append(ClusterMachine(host.location, record))
+                self._route(record.name, host)
+
+        return machines
+
+    def _route(self, name, host):
+        with self._lock:
+            self._routes[name] = host
+
+    def locate(self, name):
+        """Returns location of the host having the machine
+
+        Raises
+        ------
+        FindMachineError
+            If no responding host has the machine
+        """
+        with self._lock:
+            host = self._routes.get(name)
+        if host is not None and host.available():
+            return host.location
+
+        hosts = self._hosts_having(name)
+        self._route(name, hosts[0])
+        return hosts[0].location
+
+    def _hosts_having(self, name):
+        """Returns responding hosts having the machine"""
+
+        def find(vbox):
+            try:
+                return vbox.find_machine(name)
+            except FindMachineError:
+                return False
+
+        hosts = [host for host, found in self._map(find) if found]
+        if not hosts:
+            raise FindMachineError(
+                "Machine {} is not found on any available host".format(name)
+            )
+
+        return hosts
+
+    def get_machine(self, name):
+        """Returns IMachine from the host it lives on"""
+        location = self.locate(name)
+        try:
+            return self._get_host(location).call(lambda vbox: vbox.get_machine(name))
+        except FindMachineError:
+            # Machine has moved or was unregistered since it was routed
+            with self._lock:
+                self._routes.pop(name, None)
+            return self._get_host(self.locate(name)).call(
+                lambda vbox: vbox.get_machine(name)
+            )
+
+    def loads(self, hosts=None):
+        """Returns HostLoad of every responding host"""
+
+        def load(vbox):
+            running = vbox.machine_states().count(IMachine.RUNNING)
+            return vbox.host_info(), running
+
+        return [
+            HostLoad(
+                host.location,
+                info.cpus,
+                info.memory_size,
+                info.memory_available,
+                running,
+            )
+            for host, (info, running) in self._map(load, hosts)
+        ]
+
+    def pick_host(self, hosts=None):
+        """Returns location of the least loaded responding host"""
+        loads = self.loads(hosts)
+        if not loads:
+            raise NoHostAvailableError("No host responded with its load")
+
+        return min(loads, key=load_score).host
+
+    def linked_clone(
+        self,
+        source_name,
+        target_name,
+        snapshot_name,
+        mode="MachineState",
+        options=["Link"],
+    ):
+        """Creates a linked clone on the least loaded host having the source
+
+        Clones can only be made on the host of the source machine, so
+        every host is expected to have its own copy of it.
+
+        Returns
+        -------
+        str
+            location of the host the clone was placed on
+        """
+
+        hosts = self._hosts_having(source_name)
+        location = self.pick_host(hosts)
+        self._get_host(location).call(
+            lambda vbox: vbox.get_machine(source_name).linked_clone(
+                target_name, snapshot_name, mode, options
+            )
+        )
+        self._route(target_name, self._get_host(location))
+        return location
+
+    def stats(self):
+        """Returns circuit breaker state and failures count by host"""
+        return {
+            host.location: {
+                "state": host.breaker.state,
+                "failures": host.breaker.failures,
+            }
+            for host in self.hosts
+        }
+
+    def disconnect(self):
+        for host in self.hosts:
+            host.disconnect()
@@ -0,0 +1,229 @@
+"""
+IEventSource passive listener binding
+"""
+
+import threading
+from collections import namedtuple
+
+import zeep.exceptions
+
+from .exceptions import EventSourceError
+
+Event = namedtuple("Event", ["type", "machine_id", "state", "snapshot_id"])
+
+"""Event types"""
+MACHINE_STATE_CHANGED = "OnMachineStateChanged"
+SESSION_STATE_CHANGED = "OnSessionStateChanged"
+SNAPSHOT_TAKEN = "OnSnapshotTaken"
+SNAPSHOT_DELETED = "OnSnapshotDeleted"
+SNAPSHOT_CHANGED = "OnSnapshotChanged"
+MACHINE_DATA_CHANGED = "OnMachineDataChanged"
+MACHINE_REGISTERED = "OnMachineRegistered"
+GUEST_PROPERTY_CHANGED = "OnGuestPropertyChanged"
+
+DEFAULT_EVENT_TYPES = [
+    MACHINE_STATE_CHANGED,
+    SESSION_STATE_CHANGED,
+    SNAPSHOT_TAKEN,
+    SNAPSHOT_DELETED,
+    SNAPSHOT_CHANGED,
+]
+
+SNAPSHOT_EVENT_TYPES = (SNAPSHOT_TAKEN, SNAPSHOT_DELETED, SNAPSHOT_CHANGED)
+
+"""Event types implementing IMachineEvent"""
+MACHINE_EVENT_TYPES = (
+    MACHINE_STATE_CHANGED,
+    MACHINE_DATA_CHANGED,
+    MACHINE_REGISTERED,
+    SESSION_STATE_CHANGED,
+    GUEST_PROPERTY_CHANGED,
+) + SNAPSHOT_EVENT_TYPES
+
+
+class StateCache(object):
+    """StateCache keeps last known machine and session states by machine id"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._states = {}
+        self._session_states = {}
+        self.closed = False
+
+    def get(self, machine_id):
+        with self._cond:
+            return self._states.get(machine_id)
+
+    def get_session_state(self, machine_id):
+        with self._cond:
+            return self._session_states.get(machine_id)
+
+    def seed(self, machine_id, state):
+        """Sets state unless an event has already delivered a newer one"""
+        with self._cond:
+            self._states.setdefault(machine_id, state)
+
+    def wait_for_all(self, machine_ids, targets, timeout=None):
+        """Blocks until every machine state is one of targets
+
+        Returns states list, early on timeout or when the cache is closed"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self.closed
+                or all(self._states.get(m) in targets for m in machine_ids),
+                timeout,
+            )
+            return [self._states.get(m) for m in machine_ids]
+
+    def update(self, event):
+        with self._cond:
+            if event.type == MACHINE_STATE_CHANGED:
+                self._states[event.machine_id] = event.state
+            elif event.type == SESSION_STATE_CHANGED:
+                self._session_states[event.machine_id] = event.state
+            self._cond.notify_all()
+
+    def close(self):
+        """Drops states and wakes up waiters, events stopped flowing"""
+        with self._cond:
+            self.closed = True
+            self._states.clear()
+            self._session_states.clear()
+            self._cond.notify_all()
+
+
+class EventListener(object):
+    """EventListener registers passive listener on IVirtualBox event source
+
+    Events are either consumed with stream() or dispatched to subscribed
+    callbacks by a background thread started with start(). The thread also
+    keeps states cache fresh.
+
+    :param timeout: long-poll timeout of a single getEvent call in ms
+    """
+
+    def __init__(self, service, handle, types=None, timeout=1000):
+        self.service = service
+        self.timeout = timeout
+        self.types = types or DEFAULT_EVENT_TYPES
+        self.states = StateCache()
+        self.error = None
+        self.callback_error = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        try:
+            self.source = self.service.IVirtualBox_getEventSource(handle)
+            self.listener = self.service.IEventSource_createListener(self.source)
+            self.service.IEventSource_registerListener(
+                self.source, self.listener, self.types, False
+            )
+        except zeep.exceptions.Fault as err:
+            raise EventSourceError(
+                "Failed to register listener: {}".format(err.message)
+            )
+
+    def poll(self, timeout=None):
+        """Waits for a single event, returns Event or None on timeout"""
+        if timeout is None:
+            timeout = self.timeout
+
+        try:
+            ievent = self.service.IEventSource_getEvent(
+                self.source, self.listener, timeout
+            )
+            if ievent is None:
+                return None
+
+            event = self._parse(ievent)
+            self.service.IEventSource_eventProcessed(self.source, self.listener, ievent)
+            self.service.IManagedObjectRef_release(ievent)
+        except zeep.exceptions.Fault as err:
+            raise EventSourceError("Failed to get event: {}".format(err.message))
+
+        return event
+
+    def _parse(self, ievent):
+        event_type = self.service.IEvent_getType(ievent)
+        machine_id = state = snapshot_id = None
+
+        if event_type in MACHINE_EVENT_TYPES:
+            machine_id = self.service.IMachineEvent_getMachineId(ievent)
+
+        if event_type == MACHINE_STATE_CHANGED:
+            state = self.service.IMachineStateChangedEvent_getState(ievent)
+        elif event_type == SESSION_STATE_CHANGED:
+            state = self.service.ISessionStateChangedEvent_getState(ievent)
+        elif event_type in SNAPSHOT_EVENT_TYPES:
+            snapshot_id = self.service.ISnapshotEvent_getSnapshotId(ievent)
+
+        return Event(event_type, machine_id, state, snapshot_id)
+
+    def stream(self):
+        """Yields events until stop() is called"""
+        while not self._stopped.is_set():
+            event = self.poll()
+            if event is not None:
+                self.states.update(event)
+                yield event
+
+    def subscribe(self, callback):
+        """Calls callback(event) for every event dispatched by start()
+
+        An exception raised by callback is kept in callback_error"""
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def start(self):
+        """Starts dispatching events in a background thread"""
+        if self.running():
+            return
+
+        self._stopped.clear()
+        if self.states.closed:
+            self.states = StateCache()
+        self._thread = threading.Thread(target=self._run, name="remotevbox-events")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        states = self.states
+        try:
+            for event in self.stream():
+                with self._lock:
+                    callbacks = list(self._callbacks)
+                for callback in callbacks:
+                    try:
+                        callback(event)
+                    except Exception as err:
+                        # One broken subscriber must not stop dispatching
+                        self.callback_error = err
+        except Exception as err:
+            # Faults as well as transport errors, e.g. ConnectionError
+            self.error = err
+        finally:
+            # Stale states must not be served once events stop flowing,
+            # waiters wake up and fall back to polling
+            states.close()
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        """Stops dispatching and unregisters the listener"""
+        self._stopped.set()
+        self.states.close()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(self.timeout / 1000.0 + 1)
+
+        try:
+            self.service.IEventSource_unregisterListener(self.source, self.listener)
+        except zeep.exceptions.Fault:
+            pass
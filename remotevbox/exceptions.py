@@ -23,6 +23,18 @@ class WrongCredentialsError(Exception):
     """Wrong credentials supplied"""
 
 
+class EventSourceError(Exception):
+    """Failed to work with event source"""
+
+
+class HostUnavailableError(Exception):
+    """Host failed to respond or is out of rotation"""
+
+
+class NoHostAvailableError(Exception):
+    """No host is able to serve the request"""
+
+
 """
 Machine related exceptions
 """
@@ -92,6 +104,14 @@ class ProgressTimeout(Exception):
     """Progress has been timed out"""
 
 
+class ProgressCancelError(Exception):
+    """Failed to cancel progress"""
+
+
+class MachineStateTimeout(Exception):
+    """Machine has not reached a state in time"""
+
+
 class MachineEnableNetTraceError(Exception):
     """Failed to enable machine network tracing"""
 
@@ -114,3 +134,11 @@ class MachineCoredumpError(Exception):
 
 class MachineCreateError(Exception):
     """Failed to create machine"""
+
+
+class ClonePoolEmpty(Exception):
+    """No clone is ready in the pool"""
+
+
+class KeyboardQueueFull(Exception):
+    """Guest keyboard queue does not take scancodes"""
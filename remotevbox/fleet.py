@@ -0,0 +1,135 @@
+"""
+Lifecycle operations over many machines at once
+"""
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+
+# result is what the IMachine method returned, error the exception it raised
+FleetResult = namedtuple(
+    "FleetResult", ["machine", "operation", "result", "error", "elapsed"]
+)
+
+
+class FleetReport(object):
+    """FleetReport holds per machine results of a fleet operation"""
+
+    def __init__(self, operation, results, elapsed):
+        self.operation = operation
+        self.results = results
+        self.elapsed = elapsed
+
+    def succeeded(self):
+        return [result for result in self.results if result.error is None]
+
+    def failed(self):
+        return [result for result in self.results if result.error is not None]
+
+    def ok(self):
+        """Returns whether the operation succeeded on every machine"""
+        return not self.failed()
+
+    def stats(self):
+        elapsed = [result.elapsed for result in self.results]
+        return {
+            "operation": self.operation,
+            "machines": len(self.results),
+            "succeeded": len(self.succeeded()),
+            "failed": len(self.failed()),
+            "elapsed": self.elapsed,
+            "slowest": max(elapsed) if elapsed else 0.0,
+            # time all operations would have taken one after another
+            "sequential": sum(elapsed),
+        }
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+
+class Fleet(object):
+    """Fleet runs IMachine lifecycle operations over a set of machines
+
+    Every machine is handled in its own worker thread, so VirtualBox
+    progress objects of up to concurrency machines run at the same time.
+    A failure on one machine is recorded in the report and doesn't stop
+    the others.
+
+    Keep TransportConfig pool_maxsize at least at concurrency, otherwise
+    extra HTTP connections are opened and dropped on every call.
+
+    :param machines: list of IMachine
+    :param concurrency: maximum number of machines handled at once
+    """
+
+    def __init__(self, machines, concurrency=8):
+        self.machines = list(machines)
+        self.concurrency = concurrency
+
+    def run(self, operation, *args, **kwargs):
+        """Calls IMachine method named operation on every machine
+
+        operation can also be a callable taking IMachine as the first
+        argument. Returns FleetReport with results in machines order."""
+        if callable(operation):
+            name = getattr(operation, "__name__", repr(operation))
+            method = operation
+        else:
+            name = operation
+
+            def method(machine, *args, **kwargs):
+                return getattr(machine, operation)(*args, **kwargs)
+
+        return self._run(name, lambda machine, index: method(machine, *args, **kwargs))
+
+    def _run(self, name, call):
+        def run_one(machine, index):
+            start = monotonic()
+            try:
+                result = call(machine, index)
+            except Exception as err:
+                return FleetResult(machine, name, None, err, monotonic() - start)
+            return FleetResult(machine, name, result, None, monotonic() - start)
+
+        start = monotonic()
+        if not self.machines:
+            return FleetReport(name, [], 0.0)
+
+        workers = max(1, min(self.concurrency, len(self.machines)))
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(run_one, self.machines, range(len(self.machines))))
+
+        return FleetReport(name, results, monotonic() - start)
+
+    def launch(self, mode="headless"):
+        return self.run("launch", mode)
+
+    def restore(self, snapshot_name=None):
+        return self.run("restore", snapshot_name)
+
+    def save(self):
+        return self.run("save")
+
+    def poweroff(self):
+        return self.run("poweroff")
+
+    def linked_clone(
+        self,
+        snapshot_name,
+        target_name="{name}-clone",
+        mode="MachineState",
+        options=["Link"],
+    ):
+        """Creates a linked clone of every machine
+
+        target_name is formatted with name of the source machine and its
+        index in the fleet"""
+
+        def clone(machine, index):
+            name = target_name.format(name=machine.info("Name"), index=index)
+            return machine.linked_clone(name, snapshot_name, mode, options)
+
+        return self._run("linked_clone", clone)
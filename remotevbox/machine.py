@@ -1,17 +1,23 @@
 """
 This module contains two classes:
 * IMachine class represents IMachine object
-* IProgress class represents IProgress object
+* IProgress class represents IProgress object (see progress module)
 * INetworkAdapter class represents INetworkAdapter object
 """
+import threading
+import weakref
 from base64 import b64decode
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from time import mktime, sleep
+from functools import wraps
+from time import mktime, monotonic, sleep
 
 import zeep.exceptions
-from semver import VersionInfo
 
 from .exceptions import (
+    FindMachineError,
+    KeyboardQueueFull,
     MachineCloneError,
     MachineCoredumpError,
     MachineCreateError,
@@ -29,21 +35,143 @@ from .exceptions import (
     MachineSnaphotError,
     MachineSnapshotError,
     MachineSnapshotNX,
+    MachineStateTimeout,
     MachineUnlockError,
     MachineVrdeInfoError,
-    ProgressTimeout,
     WrongLockState,
     WrongMachineState,
 )
+from .progress import IProgress
+from .scancodes import compile_keys
+from .screen import Frame, ScreenshotStream, crop_base64
+from .streaming import call_base64
 from .us_layout import MAPPING
+from .websession_manager import is_invalid_object, is_stale, retry_expired
 
 # USB HID Keyboard page code
 KEYBOARD_PAGE = 7
 SHIFT_USB_HID_CODE = 0xE1
+# Scancodes sent per IKeyboard_putScancodes call by send_keys
+SCANCODE_BATCH_SIZE = 64
+# Resends to a guest keyboard queue taking nothing before giving up
+SCANCODE_RETRIES = 20
+
+# Machine states a console is available in
+CONSOLE_STATES = ("Running", "Paused", "Stuck")
+
+# IConsole getters of handles cached per lock session
+CONSOLE_HANDLES = {
+    "keyboard": "IConsole_getKeyboard",
+    "mouse": "IConsole_getMouse",
+    "display": "IConsole_getDisplay",
+}
+
+# Polling backoff bounds for state waits, seconds
+POLL_INTERVAL_MIN = 0.05
+POLL_INTERVAL_MAX = 1.0
+# Waits on the event listener states cache are split into slices of this
+# many seconds to notice a listener which died
+LISTENER_CHECK_INTERVAL = 1.0
+
+WaitResult = namedtuple("WaitResult", ["state", "elapsed", "reached"])
+
+
+def serialized(method):
+    """Runs IMachine method under the machine lifecycle lock
+
+    Lifecycle operations lock and unlock the shared session, so they must
+    not interleave. The lock is reentrant, they call each other. They are
+    repeated if the websession has expired, see retry_expired()."""
+    method = retry_expired(method)
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def version_older(version, other):
+    """Returns whether VirtualBox version is older than other
+
+    semver is imported on first use, it is not needed until a machine call
+    depends on the version"""
+    from semver import VersionInfo
+
+    return VersionInfo.parse(version).compare(other) == -1
+
+
+def _wait_targets(targets):
+    if isinstance(targets, str):
+        return (targets,)
+    return tuple(targets)
+
+
+def wait_for_states(machines, targets, timeout=None):
+    """Waits until every machine reaches one of target states
+
+    Uses the shared event listener states cache if all machines have a
+    running one, polls with adaptive backoff otherwise.
+    Returns list of WaitResult in machines order, machines that have not
+    reached a target state in time have reached set to False.
+    """
+    targets = _wait_targets(targets)
+    start = monotonic()
+    deadline = None if timeout is None else start + timeout
+    results = [None] * len(machines)
+
+    listeners = set(machine.events for machine in machines)
+    listener = listeners.pop() if len(listeners) == 1 else None
+    if listener is not None and listener.running():
+        cache = listener.states
+        for machine in machines:
+            machine.state()  # seeds the cache
+        ids = [machine.get_id() for machine in machines]
+        states = []
+        while listener.running() and not cache.closed:
+            interval = LISTENER_CHECK_INTERVAL
+            if deadline is not None:
+                interval = min(interval, deadline - monotonic())
+                if interval <= 0:
+                    break
+            states = cache.wait_for_all(ids, targets, interval)
+            if all(state in targets for state in states):
+                break
+        elapsed = monotonic() - start
+        for i, state in enumerate(states):
+            if state in targets:
+                results[i] = WaitResult(state, elapsed, True)
+        # Falls back to polling the rest if the listener has stopped
+
+    interval = POLL_INTERVAL_MIN
+    while True:
+        for i, machine in enumerate(machines):
+            if results[i] is None:
+                state = machine.state()
+                if state in targets:
+                    results[i] = WaitResult(state, monotonic() - start, True)
+
+        if all(results):
+            return results
+
+        now = monotonic()
+        if deadline is not None and now >= deadline:
+            return [
+                result or WaitResult(machine.state(), now - start, False)
+                for machine, result in zip(machines, results)
+            ]
+
+        sleep(interval if deadline is None else min(interval, deadline - now))
+        interval = min(interval * 2, POLL_INTERVAL_MAX)
 
 
 class IMachine(object):
-    """IMachine constructs object with service, manager and id"""
+    """IMachine constructs object with service, manager and id
+
+    It can be shared between threads: input, screenshot and other console
+    calls run in parallel, lifecycle operations which lock the session are
+    serialized."""
 
     """Virtual machine states"""
     ABORTED = "Aborted"
@@ -61,16 +189,210 @@ class IMachine(object):
     HEADLESS = "headless"
     GUI = "gui"
 
-    def __init__(self, service, manager, mid, vbox_version="6.1.0"):
-        self.mid = mid
+    # Thousands of handles may be kept, so no per instance __dict__
+    __slots__ = (
+        "_mid",
+        "service",
+        "manager",
+        "_session",
+        "console",
+        "os",
+        "mutable_id",
+        "vbox_version",
+        "events",
+        "uuid",
+        "name",
+        "_console_handles",
+        "_snapshots",
+        "_finalizer",
+        "_held",
+        "_held_finalizer",
+        "_generation",
+        "_lock",
+        "_state_lock",
+        "__weakref__",
+    )
+
+    def __init__(
+        self, service, manager, mid, vbox_version="6.1.0", events=None, name=None
+    ):
+        self._mid = mid
         self.service = service
         self.manager = manager
-        self.session = self.manager.get_session(self.mid)
+        self._session = None
+        self._finalizer = None
         self.console = None
         self.os = None
         self.mutable_id = None
         self.vbox_version = vbox_version
+        self.events = events
+        self.uuid = None
+        self.name = name
+        self._console_handles = {}
+        self._snapshots = {}
+        self._held = []
+        self._held_finalizer = None
+        self._generation = manager.generation
+        # Serializes lifecycle operations, see serialized()
+        self._lock = threading.RLock()
+        # Guards session lease, console and handles cache and held refs,
+        # console calls themselves run in parallel
+        self._state_lock = threading.RLock()
+
+    @property
+    def mid(self):
+        """IMachine reference, looked up again after the manager logged on"""
+        if self._generation != self.manager.generation:
+            self.rebind()
+        return self._mid
+
+    @mid.setter
+    def mid(self, mid):
+        self._mid = mid
+
+    @property
+    def session(self):
+        """ISession object, leased from the manager session pool on first use
+
+        It goes back to the pool on close() or when the machine object is
+        garbage collected"""
+        if self._generation != self.manager.generation:
+            self.rebind()
+        session = self._session
+        if session is not None:
+            return session
+
+        with self._state_lock:
+            if self._session is None:
+                self._session = self.manager.lease_session()
+                self._finalizer = weakref.finalize(
+                    self, self.manager.defer_return, self._session
+                )
+            return self._session
+
+    @session.setter
+    def session(self, session):
+        self._session = session
+
+    def _hold(self, ref):
+        """Tracks ref as held by this machine until dropped or close()"""
+        if not ref:
+            return ref
+
+        refs = self.manager.refs
+        refs.track(ref, scoped=False)
+        with self._state_lock:
+            self._held.append(ref)
+            if refs.release_on_gc and self._held_finalizer is None:
+                # The list is passed, so it is released with what it has then
+                self._held_finalizer = weakref.finalize(
+                    self, refs.defer_all, self._held
+                )
+        return ref
+
+    def _drop(self, *refs):
+        """Releases refs held by this machine"""
+        dropped = []
+        with self._state_lock:
+            for ref in refs:
+                if ref and ref in self._held:
+                    self._held.remove(ref)
+                    dropped.append(ref)
+
+        self.manager.refs.release_all(dropped)
+
+    def _set_mutable_id(self, mutable_id):
+        if mutable_id != self.mutable_id:
+            self._drop(self.mutable_id)
+            self.mutable_id = self._hold(mutable_id)
+
+    @serialized
+    def rebind(self):
+        """Looks the machine up again after the manager logged on again
+
+        Called on the first use of mid or session after a re-logon, so
+        every machine is rebound by its own caller. References of the
+        expired websession are dropped without requests. Machine is found
+        by UUID if it was read, by name otherwise. A new session is locked
+        if the machine had one and is running, so console calls keep
+        working. Nothing is done if the machine is bound to the current
+        websession already.
+
+        Raises
+        ------
+        FindMachineError
+            If the machine is gone or neither its UUID nor name is known
+        """
+        generation = self.manager.generation
+        if self._generation == generation:
+            return
 
+        key = self.uuid or self.name
+        if key is None:
+            raise FindMachineError(
+                "Unable to find machine again: neither UUID nor name is known"
+            )
+
+        # Looked up first, the machine is left as is to retry on next use
+        try:
+            mid = self.service.IVirtualBox_findMachine(self.manager.handle, key)
+        except zeep.exceptions.Fault as err:
+            raise FindMachineError(
+                "Unable to find machine again: {}".format(err.message)
+            )
+
+        with self._state_lock:
+            had_session = self._session is not None
+            if self._finalizer is not None:
+                self._finalizer.detach()
+                self._finalizer = None
+            if had_session:
+                self.manager.discard_session(self._session)
+                self._session = None
+
+            self.console = None
+            self._console_handles = {}
+            self.mutable_id = None
+            self._snapshots = {}
+            self._held[:] = []
+            self._mid = mid
+            self._generation = generation
+
+        if had_session and self._get_state() in CONSOLE_STATES:
+            try:
+                self.lock()
+            except MachineLockError:
+                # Left unlocked, console calls raise WrongLockState
+                pass
+
+    @serialized
+    def close(self):
+        """Returns session to the pool, it is unlocked if still locked
+
+        Managed object references held by the machine are released"""
+        with self._state_lock:
+            self._snapshots = {}
+            self.console = None
+            self._console_handles = {}
+            self.mutable_id = None
+            held, self._held[:] = list(self._held), []
+
+            session, self._session = self._session, None
+            if self._finalizer is not None:
+                self._finalizer.detach()
+                self._finalizer = None
+
+        self.manager.refs.release_all(held)
+        if session is not None:
+            self.manager.return_session(session)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @serialized
     def launch(self, mode="headless"):
         """Launches stopped or powered off machine
         Returns IProgress"""
@@ -78,36 +400,68 @@ class IMachine(object):
             return
 
         try:
-            if VersionInfo.parse(self.vbox_version).compare("6.1.0") == -1:
-                progress = self.service.IMachine_launchVMProcess(
-                    self.mid, self.session, mode, "",
-                )
-            else:
-                progress = self.service.IMachine_launchVMProcess(
-                    self.mid, self.session, mode,
-                )
-            iprogress = IProgress(progress, self.service)
-            iprogress.wait()
+            with self.manager.refs.scope() as refs:
+                if version_older(self.vbox_version, "6.1.0"):
+                    progress = self.service.IMachine_launchVMProcess(
+                        self.mid, self.session, mode, "",
+                    )
+                else:
+                    progress = self.service.IMachine_launchVMProcess(
+                        self.mid, self.session, mode,
+                    )
+                self._invalidate_console()
+                iprogress = IProgress(refs.track(progress), self.service)
+                iprogress.wait()
         except zeep.exceptions.Fault as err:
             raise MachineLaunchError("Launch operation failed: {}".format(err.message))
 
+    @serialized
     def lock(self, mode="Shared"):
         """Locks current machine
         Could be Shared or Write
         If changing of the machine settings is needed then set mode to Write"""
+        self._invalidate_console()
+        generation = self._generation
         try:
-            self.service.IMachine_lockMachine(self.mid, self.session, mode)
+            mid, session = self.mid, self.session
+            rebound = generation != self._generation
+            if rebound and self._get_session_state() == self.LOCKED:
+                # Looked up again and locked by rebind
+                if mode == "Shared":
+                    return
+                self.service.ISession_unlockMachine(session)
+            self.service.IMachine_lockMachine(mid, session, mode)
             self._get_mutable_id()
         except zeep.exceptions.Fault as err:
             raise MachineLockError("Lock operation failed: {}".format(err.message))
 
+    @serialized
     def unlock(self):
         """Unlocks current machine"""
+        self._invalidate_console()
+        # Mutable machine of the session is gone with the lock
+        self._set_mutable_id(None)
         try:
             self.service.ISession_unlockMachine(self.session)
         except zeep.exceptions.Fault as err:
             raise MachineUnlockError("Unlock operation failed: {}".format(err.message))
 
+    def _unlock_quietly(self):
+        """Unlocks the session if it is still locked, ignoring errors"""
+        try:
+            if self._get_session_state() == self.LOCKED:
+                self.unlock()
+        except (zeep.exceptions.Fault, MachineUnlockError):
+            pass
+
+    @retry_expired
+    def get_id(self):
+        """Returns machine UUID"""
+        if self.uuid is None:
+            self.uuid = self.service.IMachine_getId(self.mid)
+        return self.uuid
+
+    @retry_expired
     def get_os(self):
         """Get Guest operating system type (user-defined value)"""
         self.os = self.service.IMachine_getOSTypeId(self.mid)
@@ -119,40 +473,48 @@ class IMachine(object):
             iconsole = self._get_console()
 
             if iconsole:
-                imdebugger = self.service.IConsole_getDebugger(iconsole)
+                with self.manager.refs.scope() as refs:
+                    imdebugger = refs.track(self.service.IConsole_getDebugger(iconsole))
 
-                if add_time_suffix:
-                    filepath = "{}-{}".format(
-                        filepath, int(mktime(datetime.now().timetuple()))
-                    )
+                    if add_time_suffix:
+                        filepath = "{}-{}".format(
+                            filepath, int(mktime(datetime.now().timetuple()))
+                        )
 
-                self.service.IMachineDebugger_dumpGuestCore(imdebugger, filepath, "")
+                    self.service.IMachineDebugger_dumpGuestCore(
+                        imdebugger, filepath, ""
+                    )
         except zeep.exceptions.Fault as err:
             raise MachineCoredumpError(
                 "Coredump of guest's memory failed: {}".format(err.message)
             )
 
+    @serialized
     def restore(self, snapshot_name=None):
         if self.state() == self.RUNNING:
             raise WrongMachineState("Can't restore a running machine")
 
-        if snapshot_name is None:
-            isnapshot = self._current_snapshot()
-            if isnapshot is None:
-                raise MachineSnapshotNX("Machine doesn't have a current snapshot")
+        with self.manager.refs.scope() as refs:
+            if snapshot_name is None:
+                isnapshot = refs.track(self._current_snapshot())
+                if isnapshot is None:
+                    raise MachineSnapshotNX("Machine doesn't have a current snapshot")
 
-        else:
-            isnapshot = self._get_snapshot(snapshot_name)
+            else:
+                isnapshot = refs.track(self._get_snapshot(snapshot_name))
 
-        self.lock()
+            self.lock()
 
-        iprogress = IProgress(
-            self.service.IMachine_restoreSnapshot(self.mutable_id, isnapshot),
-            self.service,
-        )
-        iprogress.wait()
-        self.unlock()
+            iprogress = IProgress(
+                refs.track(
+                    self.service.IMachine_restoreSnapshot(self.mutable_id, isnapshot)
+                ),
+                self.service,
+            )
+            iprogress.wait()
+            self.unlock()
 
+    @serialized
     def discard(self, remove_state_file=True):
         """Discard Saved state to PoweredOff"""
         self.lock()
@@ -164,6 +526,7 @@ class IMachine(object):
 
             self.unlock()
 
+    @serialized
     def enable_net_trace(self, filename, slot=0):
         """Trace network adapter specified by a slot
         and dump pcap to specified filename
@@ -171,19 +534,24 @@ class IMachine(object):
 
         if self._get_state() == self.POWEROFF or self._get_state() == self.SAVED:
             self.lock()
-            adapter = INetworkAdapter(self.service, self.mutable_id, slot)
-            adapter.enable_trace(filename)
-            self.service.IMachine_saveSettings(self.mutable_id)
+            with self.manager.refs.scope() as refs:
+                adapter = INetworkAdapter(self.service, self.mutable_id, slot)
+                refs.track(adapter.adapter)
+                adapter.enable_trace(filename)
+                self.service.IMachine_saveSettings(self.mutable_id)
             self.unlock()
         else:
             raise WrongMachineState("Machine is not PoweredOff or Saved")
 
+    @serialized
     def disable_net_trace(self, slot=0):
         if self._get_state() == self.POWEROFF:
             self.lock()
-            adapter = INetworkAdapter(self.service, self.mutable_id, slot)
-            adapter.disable_trace()
-            self.service.IMachine_saveSettings(self.mutable_id)
+            with self.manager.refs.scope() as refs:
+                adapter = INetworkAdapter(self.service, self.mutable_id, slot)
+                refs.track(adapter.adapter)
+                adapter.disable_trace()
+                self.service.IMachine_saveSettings(self.mutable_id)
             self.unlock()
         else:
             raise WrongMachineState("Machine state is not PoweredOff")
@@ -218,20 +586,101 @@ class IMachine(object):
 
     def _get_state(self):
         """Get execution state of a machine"""
-        return self.service.IMachine_getState(self.mid)
+        state = self.service.IMachine_getState(self.mid)
+        if state not in CONSOLE_STATES:
+            self._invalidate_console()
+        return state
 
     def _get_console(self):
-        """Returns id with IConsole object"""
-        if self._get_session_state() == self.LOCKED:
-            return self.service.ISession_getConsole(self.session)
-
-        else:
-            raise WrongLockState("Session is not locked")
+        """Returns id with IConsole object
+
+        It is cached with keyboard, mouse and display handles until the
+        session is unlocked, machine state changes or a call faults"""
+        console = self.console
+        if console is not None:
+            return console
+
+        # Read before the state lock, it may rebind which takes the
+        # lifecycle lock, see serialized()
+        session = self.session
+        with self._state_lock:
+            if self.console is None:
+                if self.service.ISession_getState(session) != self.LOCKED:
+                    raise WrongLockState("Session is not locked")
+
+                self.console = self._hold(self.service.ISession_getConsole(session))
+
+            return self.console
+
+    def _get_console_handle(self, name):
+        handle = self._console_handles.get(name)
+        if handle is not None:
+            return handle
+
+        # Before the state lock for the same reason as in _get_console
+        console = self._get_console()
+        if not console:
+            raise WrongMachineState("Machine has no console, it is not running")
+
+        with self._state_lock:
+            handle = self._console_handles.get(name)
+            if handle is None:
+                getter = getattr(self.service, CONSOLE_HANDLES[name])
+                handle = self._hold(getter(console))
+                self._console_handles[name] = handle
+
+            return handle
+
+    def _get_keyboard(self):
+        return self._get_console_handle("keyboard")
+
+    def _get_mouse(self):
+        return self._get_console_handle("mouse")
+
+    def _get_display(self):
+        return self._get_console_handle("display")
+
+    def _invalidate_console(self, stale=None):
+        """Drops console and handles, if stale is given only if it is one
+        of them, other thread may have fetched fresh ones already"""
+        with self._state_lock:
+            console, handles = self.console, self._console_handles
+            if stale is not None and stale not in (console, *handles.values()):
+                return
+            self.console = None
+            self._console_handles = {}
+        self._drop(console, *handles.values())
+
+    def _console_call(self, getter, operation, *args):
+        """Calls operation with a handle returned by getter
+
+        Cached handles may be stale, so on an invalid object fault they are
+        dropped and the call is repeated once with fresh ones. If the
+        websession has expired the manager logs on again before the repeat.
+        Other faults are raised as is, operations like IConsole_powerDown
+        are not safe to repeat."""
+        for attempt in range(2):
+            cached = self.console is not None
+            generation = self.manager.generation
+            handle = None
+            try:
+                handle = getter()
+                return operation(handle, *args)
+            except zeep.exceptions.Fault as err:
+                self._invalidate_console(handle)
+                if attempt or not is_invalid_object(err):
+                    raise
+                # Retried on a new websession if the old one has expired
+                if is_stale(err) and self.manager.check(generation):
+                    self.rebind()
+                elif not cached:
+                    raise
 
     def _get_mutable_id(self):
         """Return mutable ISession"""
-        self.mutable_id = self.service.ISession_getMachine(self.session)
+        self._set_mutable_id(self.service.ISession_getMachine(self.session))
 
+    @serialized
     def save(self):
         """Save state of running machine"""
         if self._get_session_state() == self.UNLOCKED:
@@ -239,20 +688,196 @@ class IMachine(object):
 
         try:
             self._get_mutable_id()
-            iprogress = IProgress(
-                self.service.IMachine_saveState(self.mutable_id), self.service
-            )
-            iprogress.wait()
+            with self.manager.refs.scope() as refs:
+                iprogress = IProgress(
+                    refs.track(self.service.IMachine_saveState(self.mutable_id)),
+                    self.service,
+                )
+                iprogress.wait()
+            self._invalidate_console()
         except zeep.exceptions.Fault as err:
             raise MachineSaveError("Save operation failed: {}".format(err.message))
 
         if self._get_machine_session_state() == self.LOCKED:
             self.unlock()
 
+    def wait_for_state(self, targets, timeout=None):
+        """Waits until machine reaches one of target states
+
+        Waits on event listener states cache when one is running, polls
+        with adaptive backoff otherwise.
+
+        Parameters
+        ----------
+        targets : str or list of str
+            state or states to wait for, e.g. IMachine.POWEROFF
+        timeout : float, optional
+            seconds to wait, forever by default
+
+        Returns
+        -------
+        WaitResult
+            reached state and seconds spent waiting
+
+        Raises
+        ------
+        MachineStateTimeout
+            If none of target states has been reached in time
+        """
+        result = wait_for_states([self], targets, timeout)[0]
+        if not result.reached:
+            raise MachineStateTimeout(
+                "Machine is {} after {:.2f}s".format(result.state, result.elapsed)
+            )
+
+        return result
+
+    @retry_expired
     def state(self):
-        """Returns machine current state"""
-        return self._get_state()
+        """Returns machine current state
+
+        Served from the event listener cache when one is running"""
+        if self.events is None or not self.events.running():
+            return self._get_state()
+
+        state = self.events.states.get(self.get_id())
+        if state is None:
+            state = self._get_state()
+            self.events.states.seed(self.get_id(), state)
+
+        return state
+
+    @serialized
+    def revert_and_start(self, snapshot_name=None, mode="headless"):
+        """Powers off the machine if running, restores a snapshot and
+        launches it again.
+
+        Unlike poweroff(), restore() and launch() in a row, state is not
+        read before every step: a still locked session (e.g. left by a
+        previous launch) is reused for power down and restore, the
+        mutable machine is fetched once and snapshots resolved by name are
+        cached for following cycles.
 
+        Parameters
+        ----------
+        snapshot_name : str, optional
+            snapshot to restore, current snapshot by default
+        mode : str, optional
+            launch mode, default to headless
+
+        Returns
+        -------
+        dict
+            seconds spent in poweroff, restore and launch phases and total
+
+        Raises
+        ------
+        MachinePowerdownError
+            If running machine could not be powered down
+        MachineSnapshotError
+            If restore of the snapshot failed
+        MachineLaunchError
+            If machine failed to launch
+        """
+        timings = {}
+        start = phase = monotonic()
+
+        refs = self.manager.refs
+        mutable = None
+        try:
+            console = self.service.ISession_getConsole(self.session)
+        except zeep.exceptions.Fault:
+            # Session is not locked
+            self.lock()
+            mutable = self.mutable_id
+            console = self.service.ISession_getConsole(self.session)
+
+        if console:
+            with refs.scope():
+                refs.track(console)
+                try:
+                    progress = refs.track(self.service.IConsole_powerDown(console))
+                    # Result code is not read, restore fails if power down did
+                    self.service.IProgress_waitForCompletion(progress, -1)
+                except zeep.exceptions.Fault as err:
+                    raise MachinePowerdownError(
+                        "Power down operation failed: {}".format(err.message)
+                    )
+                finally:
+                    self._invalidate_console()
+
+        now = monotonic()
+        timings["poweroff"], phase = now - phase, now
+
+        restored = False
+        try:
+            with refs.scope():
+                if snapshot_name is None:
+                    isnapshot = refs.track(self._current_snapshot())
+                    if isnapshot is None:
+                        raise MachineSnapshotNX(
+                            "Machine doesn't have a current snapshot"
+                        )
+                else:
+                    isnapshot = self._snapshots.get(snapshot_name)
+                    if isnapshot is None:
+                        isnapshot = self._hold(self._get_snapshot(snapshot_name))
+                        self._snapshots[snapshot_name] = isnapshot
+
+                if console:
+                    # Sessions go away with the machine process, including
+                    # the one locked above, so it is locked without asking
+                    try:
+                        self.lock()
+                        mutable = self.mutable_id
+                    except MachineLockError:
+                        if self._get_session_state() != self.LOCKED:
+                            raise
+                if mutable is None:
+                    mutable = self.service.ISession_getMachine(self.session)
+                self._set_mutable_id(mutable)
+
+                progress = self.service.IMachine_restoreSnapshot(mutable, isnapshot)
+                iprogress = IProgress(refs.track(progress), self.service)
+                if iprogress.wait() != "Success":
+                    raise MachineSnapshotError("Restore operation failed")
+            restored = True
+        except zeep.exceptions.Fault as err:
+            self._drop(self._snapshots.pop(snapshot_name, None))
+            raise MachineSnapshotError(
+                "Restore operation failed: {}".format(err.message)
+            )
+        finally:
+            if restored:
+                self.unlock()
+            else:
+                # Restore error is the one to report
+                self._unlock_quietly()
+
+        now = monotonic()
+        timings["restore"], phase = now - phase, now
+
+        try:
+            with refs.scope():
+                if version_older(self.vbox_version, "6.1.0"):
+                    progress = self.service.IMachine_launchVMProcess(
+                        self.mid, self.session, mode, ""
+                    )
+                else:
+                    progress = self.service.IMachine_launchVMProcess(
+                        self.mid, self.session, mode
+                    )
+                if IProgress(refs.track(progress), self.service).wait() != "Success":
+                    raise MachineLaunchError("Launch operation failed")
+        except zeep.exceptions.Fault as err:
+            raise MachineLaunchError("Launch operation failed: {}".format(err.message))
+
+        now = monotonic()
+        timings["launch"] = now - phase
+        timings["total"] = now - start
+        return timings
+
+    @serialized
     def save_and_discard(self):
         """Save virtual machine and discard the current state after"""
         state = self._get_state()
@@ -268,6 +893,7 @@ class IMachine(object):
         if self._get_state() == self.SAVED:
             self.discard()
 
+    @serialized
     def poweroff(self):
         """Power down virtual machine"""
         if self.state() not in [self.RUNNING, self.PAUSED, self.STUCK]:
@@ -279,11 +905,17 @@ class IMachine(object):
             self.lock()
 
         try:
-            iconsole = self._get_console()
-            iprogress = IProgress(
-                self.service.IConsole_powerDown(iconsole), self.service
-            )
-            iprogress.wait()
+            with self.manager.refs.scope() as refs:
+                iprogress = IProgress(
+                    refs.track(
+                        self._console_call(
+                            self._get_console, self.service.IConsole_powerDown
+                        )
+                    ),
+                    self.service,
+                )
+                iprogress.wait()
+            self._invalidate_console()
         except zeep.exceptions.Fault as err:
             raise MachinePowerdownError(
                 "Power down operation failed: {}".format(err.message)
@@ -295,11 +927,11 @@ class IMachine(object):
         ):
             self.unlock()
 
+    @serialized
     def pause(self):
         """Set machine to pause state"""
         try:
-            console = self._get_console()
-            self.service.IConsole_pause(console)
+            self._console_call(self._get_console, self.service.IConsole_pause)
         except zeep.exceptions.Fault as err:
             raise MachinePauseError("Pause operation failed: {}".format(err.message))
 
@@ -314,6 +946,7 @@ class IMachine(object):
 
         return keys
 
+    @retry_expired
     def extradata(self, key=None):
         """Get a specific value or all extradata on this machine.
            If key = None, returns a dictionnary containing all keys and values.
@@ -334,6 +967,7 @@ class IMachine(object):
 
         return return_value
 
+    @serialized
     def set_extradata(self, key, value):
         """Sets extradata key to value on current machine.
         """
@@ -341,8 +975,8 @@ class IMachine(object):
             self.lock()
 
         try:
-            m2 = self.service.ISession_getMachine(self.session)
-            self.service.IMachine_setExtraData(m2, key, value)
+            self._get_mutable_id()
+            self.service.IMachine_setExtraData(self.mutable_id, key, value)
         except zeep.exceptions.Fault as err:
             raise MachineExtraDataError(
                 "Extradata operation failed: {}".format(err.message)
@@ -351,6 +985,7 @@ class IMachine(object):
         if self._get_machine_session_state() == self.LOCKED:
             self.unlock()
 
+    @retry_expired
     def info(self, key):
         # TODO : list of fetchable info
         progress = None
@@ -365,16 +1000,20 @@ class IMachine(object):
 
         return progress
 
+    @retry_expired
     def vrde_info(self):
         """ Returns information about VRDE server."""
         info = dict()
         try:
             # Get VRDE Server:
-            server = self.service.IMachine_getVRDEServer(self.mid)
-            properties = self.service.IVRDEServer_getVRDEProperties(server)
-            for property_name in properties:
-                value = self.service.IVRDEServer_getVRDEProperty(server, property_name)
-                info[property_name] = value
+            with self.manager.refs.scope() as refs:
+                server = refs.track(self.service.IMachine_getVRDEServer(self.mid))
+                properties = self.service.IVRDEServer_getVRDEProperties(server)
+                for property_name in properties:
+                    value = self.service.IVRDEServer_getVRDEProperty(
+                        server, property_name
+                    )
+                    info[property_name] = value
         except zeep.exceptions.Fault as err:
             raise MachineVrdeInfoError(
                 "Failed to return information about VRDE server: {}".format(err.message)
@@ -382,75 +1021,254 @@ class IMachine(object):
 
         return info
 
+    @serialized
     def take_snapshot(self, target_name, target_description=""):
-        """ Takes a snapshot of the current machine, named after target_name, with target_description as description."""
+        """ Takes a snapshot of the current machine, named after target_name, with target_description as description.
+        Returns once the snapshot is taken, the session must stay locked until then."""
         if self._get_session_state() == self.UNLOCKED:
             self.lock()
 
         try:
             # session = self.manager.get_session(self.manager.handle)
-            m2 = self.service.ISession_getMachine(self.session)
+            self._get_mutable_id()
             result = self.service.IMachine_takeSnapshot(
-                m2, target_name, target_description, False
+                self.mutable_id, target_name, target_description, False
             )
+            # Snapshot id is returned next to the progress
+            progress = IProgress(getattr(result, "returnval", result), self.service)
+            status = progress.wait()
 
         except zeep.exceptions.Fault as err:
             raise MachineSnaphotError("Unable to take snapshot: {}".format(err.message))
 
         if self._get_machine_session_state() == self.LOCKED:
             self.unlock()
+        if status != "Success":
+            raise MachineSnaphotError("Unable to take snapshot")
         return result
 
     def linked_clone(
         self, target_name, snapshot_name, mode="MachineState", options=["Link"]
     ):
         """ Creates a linked clone of a machine (needs a snapshot in order to work...) """
-        try:
-            mm = self.service.IVirtualBox_createMachine(
-                self.manager.handle, "", target_name, "", "", ""
-            )
-        except zeep.exceptions.Fault as err:
-            raise MachineCreateError("Unable to create machine: {}".format(err.message))
+        # IMachine references are not tracked, vboxwebsrv hands the same
+        # reference to every IMachine object of the machine
+        with self.manager.refs.scope() as refs:
+            try:
+                mm = self.service.IVirtualBox_createMachine(
+                    self.manager.handle, "", target_name, "", "", ""
+                )
+            except zeep.exceptions.Fault as err:
+                raise MachineCreateError(
+                    "Unable to create machine: {}".format(err.message)
+                )
 
-        try:
-            snap = self._get_snapshot(snapshot_name)
-            snap_machine_id = self.service.ISnapshot_getMachine(snap)
+            try:
+                snap = refs.track(self._get_snapshot(snapshot_name))
+                snap_machine_id = self.service.ISnapshot_getMachine(snap)
 
-            clone = self.service.IMachine_cloneTo(snap_machine_id, mm, mode, options)
+                clone = self.service.IMachine_cloneTo(
+                    snap_machine_id, mm, mode, options
+                )
 
-            iprogress = IProgress(clone, self.service)
-            iprogress.wait()
-        except zeep.exceptions.Fault as err:
-            raise MachineCloneError("Unable to clone machine: {}".format(err.message))
+                iprogress = IProgress(refs.track(clone), self.service)
+                iprogress.wait()
+            except zeep.exceptions.Fault as err:
+                raise MachineCloneError(
+                    "Unable to clone machine: {}".format(err.message)
+                )
 
-        self.manager.service.IVirtualBox_registerMachine(self.manager.handle, mm)
+            self.manager.service.IVirtualBox_registerMachine(self.manager.handle, mm)
 
     def get_screen_resolution(self, screen_number=0):
-        iconsole = self._get_console()
-        display = self.service.IConsole_getDisplay(iconsole)
-        return self.service.IDisplay_getScreenResolution(display, screen_number)
+        return self._console_call(
+            self._get_display, self.service.IDisplay_getScreenResolution, screen_number
+        )
 
     def take_screenshot_to_bytes(self, screen_number=0, image_format="PNG"):
         """Return the screenshot as an image.
         The image size is 1:1 with the screen size, by default is PNG.
         """
-        iconsole = self._get_console()
-        display = self.service.IConsole_getDisplay(iconsole)
         resolution = self.get_screen_resolution(screen_number)
-        image_data = self.service.IDisplay_takeScreenShotToArray(
-            display,
+        image_data = self._console_call(
+            self._get_display,
+            self.service.IDisplay_takeScreenShotToArray,
+            screen_number,
+            resolution["width"],
+            resolution["height"],
+            image_format,
+        )
+        return b64decode(image_data)
+
+    def take_screenshot_raw(self, screen_number=0, buffer=None, streaming=False):
+        """Return the screenshot as raw BGRA pixels.
+
+        No image compression is done on the VirtualBox host, encode frames
+        on the client side with :mod:`remotevbox.screen` helpers.
+
+        Parameters
+        ----------
+        buffer : bytearray or memoryview, optional
+            buffer of at least width * height * 4 bytes to decode pixels
+            into, reuse it between frames to avoid allocations, implies
+            streaming
+        streaming : bool, optional
+            parse the response incrementally and decode it straight into
+            the buffer, peak memory is then about the size of the frame
+
+        Returns
+        -------
+        Frame
+            screen number, width, height and zero-copy memoryview of pixels
+        """
+        resolution = self.get_screen_resolution(screen_number)
+        if streaming or buffer is not None:
+            return Frame(
+                screen_number,
+                resolution["width"],
+                resolution["height"],
+                self._console_call(
+                    self._get_display,
+                    self._stream_screenshot,
+                    screen_number,
+                    resolution["width"],
+                    resolution["height"],
+                    buffer,
+                ),
+            )
+
+        image_data = self._console_call(
+            self._get_display,
+            self.service.IDisplay_takeScreenShotToArray,
+            screen_number,
+            resolution["width"],
+            resolution["height"],
+            "BGRA",
+        )
+        return Frame(
             screen_number,
             resolution["width"],
             resolution["height"],
+            memoryview(b64decode(image_data)),
+        )
+
+    def _stream_screenshot(self, display, screen_number, width, height, buffer):
+        return call_base64(
+            self.service,
+            "IDisplay_takeScreenShotToArray",
+            [
+                ("_this", display),
+                ("screenId", screen_number),
+                ("width", width),
+                ("height", height),
+                ("bitmapFormat", "BGRA"),
+            ],
+            buffer=buffer,
+            size=width * height * 4,
+        )
+
+    def take_thumbnail(
+        self, width=160, height=120, screen_number=0, image_format="PNG"
+    ):
+        """Return the screenshot downscaled by VirtualBox to fit width x height.
+
+        Aspect ratio of the screen is kept, only the thumbnail is
+        transferred.
+        """
+        resolution = self.get_screen_resolution(screen_number)
+        scale = min(
+            float(width) / resolution["width"], float(height) / resolution["height"]
+        )
+        image_data = self._console_call(
+            self._get_display,
+            self.service.IDisplay_takeScreenShotToArray,
+            screen_number,
+            max(1, int(resolution["width"] * scale)),
+            max(1, int(resolution["height"] * scale)),
             image_format,
         )
         return b64decode(image_data)
 
+    def take_screenshot_region(self, x, y, width, height, screen_number=0):
+        """Return a region of the screen as raw BGRA pixels.
+
+        Raw screenshot is cropped on the client side, only rows of the
+        region are base64 decoded.
+
+        Returns
+        -------
+        Frame
+            screen number, width, height and memoryview of region pixels
+        """
+        resolution = self.get_screen_resolution(screen_number)
+        if (
+            x < 0
+            or y < 0
+            or x + width > resolution["width"]
+            or y + height > resolution["height"]
+        ):
+            raise ValueError("Region is out of the screen")
+
+        image_data = self._console_call(
+            self._get_display,
+            self.service.IDisplay_takeScreenShotToArray,
+            screen_number,
+            resolution["width"],
+            resolution["height"],
+            "BGRA",
+        )
+        return crop_base64(
+            image_data, screen_number, resolution["width"], x, y, width, height
+        )
+
+    def take_screenshots_raw(self, screens=None):
+        """Return raw screenshots of all monitors captured in parallel.
+
+        Parameters
+        ----------
+        screens : list of int, optional
+            screen numbers, all monitors by default
+        """
+        if screens is None:
+            screens = range(self.monitor_count())
+
+        # Warm up cached handles once instead of in every thread
+        self._get_display()
+        with ThreadPoolExecutor(max_workers=max(1, len(screens))) as ex:
+            return list(ex.map(self.take_screenshot_raw, screens))
+
+    @retry_expired
+    def monitor_count(self):
+        """Returns number of virtual monitors"""
+        if version_older(self.vbox_version, "6.1.0"):
+            return self.service.IMachine_getMonitorCount(self.mid)
+
+        with self.manager.refs.scope() as refs:
+            adapter = refs.track(self.service.IMachine_getGraphicsAdapter(self.mid))
+            return self.service.IGraphicsAdapter_getMonitorCount(adapter)
+
+    def stream_screenshots(
+        self, screen_number=0, fps=5, image_format="PNG", dedupe=True, **kwargs
+    ):
+        """Returns ScreenshotStream iterating over screen frames.
+
+        Frames identical to the previous one are dropped when dedupe is set,
+        stream statistics are available with its stats() method.
+        See :class:`ScreenshotStream <remotevbox.screen.ScreenshotStream>`
+        for the rest of keyword arguments.
+        """
+        return ScreenshotStream(
+            self,
+            screen_number=screen_number,
+            fps=fps,
+            image_format=image_format,
+            dedupe=dedupe,
+            **kwargs
+        )
+
     def send_ctrl_alt_del(self):
         """Send Ctrl + Alt + Del to the machine."""
-        iconsole = self._get_console()
-        keyboard = self.service.IConsole_getKeyboard(iconsole)
-        self.service.IKeyboard_putCAD(keyboard)
+        self._console_call(self._get_keyboard, self.service.IKeyboard_putCAD)
 
     def put_scancodes(self, scancodes):
         """Send a list of keyboard scancodes to the machine.
@@ -460,9 +1278,9 @@ class IMachine(object):
 
         For most cases the USB HID interface is easier to use.
         """
-        iconsole = self._get_console()
-        keyboard = self.service.IConsole_getKeyboard(iconsole)
-        self.service.IKeyboard_putScancodes(keyboard, scancodes)
+        self._console_call(
+            self._get_keyboard, self.service.IKeyboard_putScancodes, scancodes
+        )
 
     def put_usagecode(self, code, page, release=False):
         """Send a USB HID usage code.
@@ -473,9 +1291,9 @@ class IMachine(object):
         Refer to the USB documentation for the codes, since this API has a
         very wide scope.
         """
-        iconsole = self._get_console()
-        keyboard = self.service.IConsole_getKeyboard(iconsole)
-        self.service.IKeyboard_putUsageCode(keyboard, code, page, release)
+        self._console_call(
+            self._get_keyboard, self.service.IKeyboard_putUsageCode, code, page, release
+        )
 
     def release_keys(self):
         """Release every key currently considered pressed.
@@ -484,9 +1302,7 @@ class IMachine(object):
         disconnected while a keystroke was being sent or some other keystroke
         was sent from another keyboard.
         """
-        iconsole = self._get_console()
-        keyboard = self.service.IConsole_getKeyboard(iconsole)
-        self.service.IKeyboard_releaseKeys(keyboard)
+        self._console_call(self._get_keyboard, self.service.IKeyboard_releaseKeys)
 
     def put_mouse_event(
         self,
@@ -525,9 +1341,15 @@ class IMachine(object):
             (0x01 * left_pressed) + (0x02 * right_pressed) + (0x03 * middle_pressed)
         )
 
-        iconsole = self._get_console()
-        mouse = self.service.IConsole_getMouse(iconsole)
-        self.service.IMouse_putMouseEvent(mouse, dx, dy, dz, dw, button_state)
+        self._console_call(
+            self._get_mouse,
+            self.service.IMouse_putMouseEvent,
+            dx,
+            dy,
+            dz,
+            dw,
+            button_state,
+        )
 
     def put_mouse_event_absolute(
         self,
@@ -569,15 +1391,21 @@ class IMachine(object):
             (0x01 * left_pressed) + (0x02 * right_pressed) + (0x03 * middle_pressed)
         )
 
-        iconsole = self._get_console()
-        mouse = self.service.IConsole_getMouse(iconsole)
-        self.service.IMouse_putMouseEventAbsolute(mouse, x, y, dz, dw, button_state)
+        self._console_call(
+            self._get_mouse,
+            self.service.IMouse_putMouseEventAbsolute,
+            x,
+            y,
+            dz,
+            dw,
+            button_state,
+        )
 
     def absolute_mouse_pointer_supported(self):
         """Return whether the guest OS supports absolute pointer positioning."""
-        iconsole = self._get_console()
-        mouse = self.service.IConsole_getMouse(iconsole)
-        return self.service.IMouse_getAbsoluteSupported(mouse)
+        return self._console_call(
+            self._get_mouse, self.service.IMouse_getAbsoluteSupported
+        )
 
     def send_single_key(self, key, duration=0.01, keymap="US"):
         """Helper to send a character using USB HID.
@@ -674,30 +1502,70 @@ class IMachine(object):
         for c in keys:
             self.send_single_key(c, duration=duration, keymap=keymap)
 
+    def send_keys(
+        self, keys, interval=0.0, keymap="US", batch_size=SCANCODE_BATCH_SIZE
+    ):
+        """Helper to send a string using batched keyboard scancodes.
 
-class IProgress(object):
-    """IProgress constructs object to deal with waiting"""
+        Unlike `send_character_string` the whole string is compiled into
+        PS/2 scancodes and delivered with a few IKeyboard_putScancodes
+        calls instead of several round trips per character.
 
-    def __init__(self, progress_id, service):
-        self.pid = progress_id
-        self.service = service
+        Parameters
+        ----------
+        keys : list of str or str
+            string to send, or list of key codes like 'a' or '<right shift>'
+        interval : float, optional
+            delay between keys in seconds, if 0 keys are sent in batches of
+            batch_size scancodes, default to 0
+        keymap : str, optional
+            keymap, currently only US is supported, default to 'US'
+        batch_size : int, optional
+            max scancodes per call when interval is 0
 
-    def wait(self, miliseconds=-1):
-        """Wait for infinite time by default"""
-        try:
-            self.service.IProgress_waitForCompletion(self.pid, miliseconds)
-        except zeep.exceptions.Fault as err:
-            raise ProgressTimeout("Progress wait failed: {}".format(err.message))
+        Raises
+        ------
+        NotImplementedError
+            If trying to use an unsupported keymap
+        ValueError
+            If a key is unknown
+        KeyboardQueueFull
+            If the guest stops taking scancodes
+        """
+        compiled = compile_keys(keys, keymap)
 
-        return self.status()
+        if interval:
+            for i, sequence in enumerate(compiled):
+                if i:
+                    sleep(interval)
+                self._put_scancodes_all(sequence)
+            return
+
+        scancodes = [code for sequence in compiled for code in sequence]
+        for i in range(0, len(scancodes), batch_size):
+            self._put_scancodes_all(scancodes[i : i + batch_size])
 
-    def status(self):
-        """Check status of the progress"""
-        status = self.service.IProgress_getResultCode(self.pid)
-        if status != 0:
-            return "Fail"
+    def _put_scancodes_all(self, scancodes):
+        """Resends scancodes the guest keyboard queue had no room for
 
-        return "Success"
+        Raises KeyboardQueueFull if the queue has taken none of them
+        SCANCODE_RETRIES times in a row"""
+        retries = 0
+        while scancodes:
+            stored = self._console_call(
+                self._get_keyboard, self.service.IKeyboard_putScancodes, scancodes
+            )
+            if stored is None or stored >= len(scancodes):
+                return
+            retries = 0 if stored else retries + 1
+            if retries > SCANCODE_RETRIES:
+                raise KeyboardQueueFull(
+                    "Guest keyboard queue is full, {} scancodes not sent".format(
+                        len(scancodes)
+                    )
+                )
+            scancodes = scancodes[stored:]
+            sleep(POLL_INTERVAL_MIN)
 
 
 class INetworkAdapter(object):
@@ -0,0 +1,203 @@
+"""
+Pool of pre-warmed linked clones for short-lived sandbox workloads
+"""
+
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+
+from .exceptions import ClonePoolEmpty, FindMachineError
+from .machine import IMachine
+
+CLEAN_SNAPSHOT = "remotevbox-pool-clean"
+
+# Number of latest timings and errors kept for stats
+STATS_WINDOW = 1000
+
+
+class ClonePool(object):
+    """ClonePool keeps linked clones of a golden snapshot running
+
+    Clones are created from snapshot_name of the source machine, get their
+    own clean snapshot and are launched in the background. acquire() hands
+    out a running clone, release() powers it off, restores the clean
+    snapshot and launches it again in the background. Clones left by an
+    earlier pool with the same names are reused. A clone failing to be
+    prepared is looked up and prepared again up to retries times.
+
+    :param vbox: IVirtualBox
+    :param source_name: name of the golden machine
+    :param snapshot_name: snapshot of the golden machine to clone
+    :param size: number of clones
+    :param name_format: clone names, formatted with source and index
+    :param workers: clones prepared at once, size by default
+    :param retries: attempts to prepare a failed clone again
+    """
+
+    def __init__(
+        self,
+        vbox,
+        source_name,
+        snapshot_name,
+        size=4,
+        name_format="{source}-pool-{index}",
+        mode=IMachine.HEADLESS,
+        workers=None,
+        retries=3,
+    ):
+        self.vbox = vbox
+        self.source_name = source_name
+        self.snapshot_name = snapshot_name
+        self.size = size
+        self.name_format = name_format
+        self.mode = mode
+        self.retries = retries
+        self.executor = ThreadPoolExecutor(max_workers=workers or size)
+
+        self.errors = deque(maxlen=STATS_WINDOW)
+        self._cond = threading.Condition()
+        self._ready = deque()
+        self._in_use = set()
+        self._preparing = 0
+        self._closed = False
+
+        self.acquired = 0
+        self.hits = 0
+        self.failures = 0
+        self._ready_times = deque(maxlen=STATS_WINDOW)
+        self._wait_times = deque(maxlen=STATS_WINDOW)
+
+    def start(self):
+        """Creates or reuses clones and prepares them in the background"""
+        for index in range(self.size):
+            self._submit(
+                self._create,
+                self.name_format.format(source=self.source_name, index=index),
+            )
+        return self
+
+    def _submit(self, prepare, arg, attempt=0):
+        # Submitted under the lock, close() shuts the executor down after
+        with self._cond:
+            if self._closed:
+                return
+            self._preparing += 1
+            self.executor.submit(self._prepare, prepare, arg, attempt)
+
+    def _prepare(self, prepare, arg, attempt):
+        start = monotonic()
+        try:
+            machine = prepare(arg)
+        except Exception as err:
+            with self._cond:
+                self._preparing -= 1
+                self.failures += 1
+                self.errors.append(err)
+                self._cond.notify_all()
+                if attempt < self.retries:
+                    # Refill with a fresh IMachine of the same clone
+                    name = arg.name if isinstance(arg, IMachine) else arg
+                    self._submit(self._create, name, attempt + 1)
+            if isinstance(arg, IMachine):
+                try:
+                    arg.close()
+                except Exception:
+                    pass
+            return
+
+        with self._cond:
+            self._preparing -= 1
+            self._ready_times.append(monotonic() - start)
+            self._ready.append(machine)
+            self._cond.notify_all()
+
+    def _create(self, name):
+        try:
+            machine = self.vbox.get_machine(name)
+        except FindMachineError:
+            source = self.vbox.get_machine(self.source_name)
+            source.linked_clone(name, self.snapshot_name)
+            machine = self.vbox.get_machine(name)
+            progress = machine.take_snapshot(CLEAN_SNAPSHOT)
+            with self.vbox.manager.refs.scope() as refs:
+                # Complete already, takeSnapshot returns snapshot id next to it
+                refs.track(getattr(progress, "returnval", progress))
+            machine.launch(self.mode)
+            return machine
+
+        return self._revert(machine)
+
+    def _revert(self, machine):
+        if machine.state() in (IMachine.RUNNING, IMachine.PAUSED, IMachine.STUCK):
+            machine.poweroff()
+        machine.restore(CLEAN_SNAPSHOT)
+        machine.launch(self.mode)
+        return machine
+
+    def acquire(self, timeout=None):
+        """Returns a running clone, waits for one if none is ready
+
+        Raises
+        ------
+        ClonePoolEmpty
+            If no clone became ready in time
+        """
+        start = monotonic()
+        with self._cond:
+            hit = bool(self._ready)
+            self._cond.wait_for(lambda: self._ready or self._closed, timeout)
+            if not self._ready:
+                if self._closed:
+                    raise ClonePoolEmpty("Pool is closed")
+                raise ClonePoolEmpty("No clone became ready in time")
+
+            machine = self._ready.popleft()
+            self._in_use.add(machine)
+            self.acquired += 1
+            if hit:
+                self.hits += 1
+            self._wait_times.append(monotonic() - start)
+
+        return machine
+
+    def release(self, machine):
+        """Returns clone to the pool, it is reverted in the background"""
+        with self._cond:
+            self._in_use.discard(machine)
+            self._submit(self._revert, machine)
+
+    def stats(self):
+        with self._cond:
+            ready_times = list(self._ready_times)
+            wait_times = list(self._wait_times)
+            return {
+                "size": self.size,
+                "ready": len(self._ready),
+                "in_use": len(self._in_use),
+                "preparing": self._preparing,
+                "acquired": self.acquired,
+                "hits": self.hits,
+                "hit_rate": float(self.hits) / self.acquired if self.acquired else 0.0,
+                "failures": self.failures,
+                "time_to_ready_avg": (
+                    sum(ready_times) / len(ready_times) if ready_times else 0.0
+                ),
+                "time_to_ready_max": max(ready_times) if ready_times else 0.0,
+                "acquire_wait_avg": (
+                    sum(wait_times) / len(wait_times) if wait_times else 0.0
+                ),
+            }
+
+    def close(self, wait=True):
+        """Stops refilling, ready and in use clones are left running"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.executor.shutdown(wait)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
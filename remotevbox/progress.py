@@ -0,0 +1,212 @@
+"""
+IProgress binding and shared progress poller
+"""
+
+import threading
+from time import monotonic
+
+import zeep.exceptions
+
+from .exceptions import ProgressCancelError, ProgressTimeout
+
+
+class IProgress(object):
+    """IProgress constructs object to deal with waiting"""
+
+    def __init__(self, progress_id, service):
+        self.pid = progress_id
+        self.service = service
+        self.result = None
+        self.callback_error = None
+        self._done = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def wait(self, miliseconds=-1):
+        """Wait for infinite time by default"""
+        try:
+            self.service.IProgress_waitForCompletion(self.pid, miliseconds)
+        except zeep.exceptions.Fault as err:
+            raise ProgressTimeout("Progress wait failed: {}".format(err.message))
+
+        return self.status()
+
+    def status(self):
+        """Check status of the progress"""
+        status = self.service.IProgress_getResultCode(self.pid)
+        if status != 0:
+            return "Fail"
+
+        return "Success"
+
+    def completed(self):
+        """Returns whether the operation has completed"""
+        return self.service.IProgress_getCompleted(self.pid)
+
+    def percent(self):
+        """Returns overall completion percentage"""
+        return self.service.IProgress_getPercent(self.pid)
+
+    def operation(self):
+        """Returns number of the current sub-operation"""
+        return self.service.IProgress_getOperation(self.pid)
+
+    def operation_description(self):
+        """Returns description of the current sub-operation"""
+        return self.service.IProgress_getOperationDescription(self.pid)
+
+    def eta(self):
+        """Returns estimated seconds to completion, -1 if unknown"""
+        return self.service.IProgress_getTimeRemaining(self.pid)
+
+    def info(self):
+        """Returns dict with percent, operation description and eta"""
+        return {
+            "percent": self.percent(),
+            "operation": self.operation_description(),
+            "eta": self.eta(),
+        }
+
+    def cancel(self):
+        """Cancels the operation if it is cancelable"""
+        try:
+            self.service.IProgress_cancel(self.pid)
+        except zeep.exceptions.Fault as err:
+            raise ProgressCancelError("Cancel failed: {}".format(err.message))
+
+    def done(self):
+        """Returns whether a poller has seen the operation completed"""
+        return self._done.is_set()
+
+    def add_done_callback(self, callback, poller=None):
+        """Calls callback(progress) from the poller thread on completion
+
+        Progress is tracked by the shared default poller unless another one
+        is given. An exception raised by callback is kept in callback_error"""
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                callback = None
+
+        if callback is not None:
+            callback(self)
+        else:
+            (poller or default_poller()).add(self)
+
+    def _set_done(self, result):
+        with self._lock:
+            self.result = result
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as err:
+                # Other callbacks and the poller thread must keep going
+                self.callback_error = err
+
+
+class ProgressPoller(object):
+    """ProgressPoller tracks many IProgress objects from a single thread
+
+    Every interval seconds it checks completion of tracked progresses and
+    completes them, so waiting doesn't hold a thread and a connection per
+    operation.
+    """
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self._cond = threading.Condition()
+        self._progresses = []
+        self._thread = None
+
+    def add(self, progress):
+        with self._cond:
+            if progress not in self._progresses and not progress.done():
+                self._progresses.append(progress)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="remotevbox-progress"
+                )
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    if not self._progresses:
+                        self._thread = None
+                        return
+                    progresses = list(self._progresses)
+
+                for progress in progresses:
+                    try:
+                        if not progress.completed():
+                            continue
+                        result = progress.status()
+                    except Exception:
+                        # Faults as well as transport errors, e.g. ConnectionError
+                        result = "Fail"
+
+                    progress._set_done(result)
+                    with self._cond:
+                        self._progresses.remove(progress)
+                        self._cond.notify_all()
+
+                with self._cond:
+                    if self._progresses:
+                        self._cond.wait(self.interval)
+        finally:
+            with self._cond:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+                self._cond.notify_all()
+
+    def wait(self, progresses, timeout=None, return_when_all=True):
+        """Blocks until all or any of progresses are done
+
+        Returns (done, pending) tuple of lists"""
+        if not progresses:
+            return [], []
+
+        for progress in progresses:
+            self.add(progress)
+
+        deadline = None if timeout is None else monotonic() + timeout
+        check = all if return_when_all else any
+        with self._cond:
+            while not check(progress.done() for progress in progresses):
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+        done = [progress for progress in progresses if progress.done()]
+        pending = [progress for progress in progresses if not progress.done()]
+        return done, pending
+
+
+_default_poller = None
+_default_poller_lock = threading.Lock()
+
+
+def default_poller():
+    """Returns process-wide ProgressPoller"""
+    global _default_poller
+    with _default_poller_lock:
+        if _default_poller is None:
+            _default_poller = ProgressPoller()
+        return _default_poller
+
+
+def wait_all(progresses, timeout=None, poller=None):
+    """Waits until every progress is done, returns (done, pending)"""
+    return (poller or default_poller()).wait(progresses, timeout, True)
+
+
+def wait_any(progresses, timeout=None, poller=None):
+    """Waits until any progress is done, returns (done, pending)"""
+    return (poller or default_poller()).wait(progresses, timeout, False)
@@ -0,0 +1,42 @@
+"""
+Service proxy binding operations on first use
+"""
+
+import itertools
+
+from zeep.proxy import OperationProxy, ServiceProxy
+
+
+class LazyServiceProxy(ServiceProxy):
+    """LazyServiceProxy creates OperationProxy objects on first access
+
+    zeep's ServiceProxy wraps every operation of the binding up front,
+    VirtualBox has thousands of them while a client uses a few dozen.
+    """
+
+    def __init__(self, client, binding, **binding_options):
+        self._client = client
+        self._binding_options = binding_options
+        self._binding = binding
+        self._operations = {}
+
+    def __getitem__(self, key):
+        try:
+            return self._operations[key]
+        except KeyError:
+            pass
+
+        if key not in self._binding.all():
+            raise AttributeError("Service has no operation %r" % key)
+        return self._operations.setdefault(key, OperationProxy(self, key))
+
+    def _bind_all(self):
+        for name in self._binding.all():
+            self[name]
+
+    def __iter__(self):
+        self._bind_all()
+        return iter(self._operations.items())
+
+    def __dir__(self):
+        return list(itertools.chain(dir(super()), self._binding.all()))
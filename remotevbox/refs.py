@@ -0,0 +1,139 @@
+"""
+Tracking and release of managed object references
+
+vboxwebsrv keeps every object a client got a reference to until it is
+released with IManagedObjectRef_release or the websession is logged off.
+RefTracker counts holders of every reference, the same object is returned
+with the same reference by vboxwebsrv, and releases it on the server when
+the last holder lets it go.
+"""
+
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import zeep.exceptions
+
+
+class RefTracker(object):
+    """RefTracker releases managed object references no longer in use
+
+    References are released explicitly with release() or when a scope()
+    they were tracked in exits. Holders like IMachine register their
+    references for release on garbage collection if release_on_gc is set.
+
+    :param service: zeep service proxy
+    :param release_on_gc: release references held by collected objects
+    """
+
+    def __init__(self, service, release_on_gc=False):
+        self.service = service
+        self.release_on_gc = release_on_gc
+        self._lock = threading.Lock()
+        self._holders = {}
+        self._local = threading.local()
+        # References of collected owners, released on the next track()
+        self._deferred = deque()
+
+        self.tracked = 0
+        self.released = 0
+        self.peak = 0
+
+    def track(self, ref, scoped=True):
+        """Registers a holder of ref, returns ref
+
+        The reference is added to the innermost scope() of the thread
+        unless scoped is false. Falsy refs (null objects) are ignored."""
+        if not ref:
+            return ref
+
+        self.flush()
+        with self._lock:
+            self._holders[ref] = self._holders.get(ref, 0) + 1
+            self.tracked += 1
+            self.peak = max(self.peak, len(self._holders))
+
+        scopes = getattr(self._local, "scopes", None) if scoped else None
+        if scopes:
+            scopes[-1].append(ref)
+
+        return ref
+
+    def release(self, ref):
+        """Drops a holder of ref, releases it on the server after the last"""
+        if not ref:
+            return
+
+        with self._lock:
+            holders = self._holders.get(ref)
+            if holders is None:
+                return
+            if holders > 1:
+                self._holders[ref] = holders - 1
+                return
+            del self._holders[ref]
+            self.released += 1
+
+        try:
+            self.service.IManagedObjectRef_release(ref)
+        except zeep.exceptions.Fault:
+            # Already gone, e.g. the object was deleted on the server
+            pass
+
+    def release_all(self, refs):
+        for ref in refs:
+            self.release(ref)
+
+    def defer(self, ref):
+        """Queues ref for release, safe to call from garbage collection"""
+        self._deferred.append(ref)
+
+    def defer_all(self, refs):
+        """Queues refs for release, used as garbage collection finalizer"""
+        self._deferred.extend(refs)
+
+    def flush(self):
+        """Releases references deferred by garbage collection"""
+        while True:
+            try:
+                ref = self._deferred.popleft()
+            except IndexError:
+                return
+            self.release(ref)
+
+    @contextmanager
+    def scope(self):
+        """Releases references tracked in the block when it exits
+
+        Scopes are per thread and can be nested."""
+        scopes = getattr(self._local, "scopes", None)
+        if scopes is None:
+            scopes = self._local.scopes = []
+
+        refs = []
+        scopes.append(refs)
+        try:
+            yield self
+        finally:
+            scopes.pop()
+            self.release_all(refs)
+
+    def forget(self):
+        """Drops all references without requests, used after logoff"""
+        with self._lock:
+            self._holders.clear()
+        self._deferred.clear()
+
+    def live(self):
+        """Returns number of references held on the server, the leak counter"""
+        with self._lock:
+            return len(self._holders)
+
+    def stats(self):
+        return {
+            "live": self.live(),
+            "peak": self.peak,
+            "tracked": self.tracked,
+            "released": self.released,
+            "deferred": len(self._deferred),
+        }
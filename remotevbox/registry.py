@@ -0,0 +1,69 @@
+"""
+Process-wide registry of zeep clients and service proxies
+"""
+
+import os
+import threading
+
+
+class ServiceRegistry(object):
+    """ServiceRegistry hands out one client and service proxy per endpoint
+
+    Entries are shared by every IVirtualBox connected to the same location,
+    so the type registry is parsed and held once per process. After a fork
+    the child keeps parsed clients but gets fresh transports, HTTP sessions
+    are never shared between processes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._entries = {}
+
+    def _check_fork(self):
+        """Renews transports if called in a forked child process"""
+        if self._pid == os.getpid():
+            return
+
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        for client, _, transport_factory in self._entries.values():
+            client.transport = transport_factory()
+
+    def get(self, key, factory, transport_factory):
+        """Returns (client, service) tuple for the key
+
+        :param key: endpoint key, usually location
+        :param factory: callable building (client, service) from a transport
+        :param transport_factory: callable building a new transport
+        """
+        self._check_fork()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                client, service = factory(transport_factory())
+                entry = (client, service, transport_factory)
+                self._entries[key] = entry
+
+        return entry[0], entry[1]
+
+    def discard(self, key):
+        """Drops the entry, next get() builds a new client"""
+        self._check_fork()
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drops all entries"""
+        self._check_fork()
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+
+default_registry = ServiceRegistry()
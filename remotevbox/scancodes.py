@@ -0,0 +1,217 @@
+"""
+Mapping between USB HID usage codes and PS/2 set 1 scancodes, used to
+compile key sequences for IKeyboard_putScancodes
+
+Release (break) code of a key is its make code with the high bit set,
+extended keys are prefixed by 0xE0 in both cases.
+"""
+
+from .us_layout import MAPPING
+
+EXTENDED = 0xE0
+BREAK = 0x80
+
+USB_HID_TO_SCANCODE = {
+    # letters
+    0x04: 0x1E,
+    0x05: 0x30,
+    0x06: 0x2E,
+    0x07: 0x20,
+    0x08: 0x12,
+    0x09: 0x21,
+    0x0A: 0x22,
+    0x0B: 0x23,
+    0x0C: 0x17,
+    0x0D: 0x24,
+    0x0E: 0x25,
+    0x0F: 0x26,
+    0x10: 0x32,
+    0x11: 0x31,
+    0x12: 0x18,
+    0x13: 0x19,
+    0x14: 0x10,
+    0x15: 0x13,
+    0x16: 0x1F,
+    0x17: 0x14,
+    0x18: 0x16,
+    0x19: 0x2F,
+    0x1A: 0x11,
+    0x1B: 0x2D,
+    0x1C: 0x15,
+    0x1D: 0x2C,
+    # digits
+    0x1E: 0x02,
+    0x1F: 0x03,
+    0x20: 0x04,
+    0x21: 0x05,
+    0x22: 0x06,
+    0x23: 0x07,
+    0x24: 0x08,
+    0x25: 0x09,
+    0x26: 0x0A,
+    0x27: 0x0B,
+    # control and punctuation
+    0x28: 0x1C,
+    0x29: 0x01,
+    0x2A: 0x0E,
+    0x2B: 0x0F,
+    0x2C: 0x39,
+    0x2D: 0x0C,
+    0x2E: 0x0D,
+    0x2F: 0x1A,
+    0x30: 0x1B,
+    0x31: 0x2B,
+    0x32: 0x2B,
+    0x33: 0x27,
+    0x34: 0x28,
+    0x35: 0x29,
+    0x36: 0x33,
+    0x37: 0x34,
+    0x38: 0x35,
+    0x39: 0x3A,
+    # function keys
+    0x3A: 0x3B,
+    0x3B: 0x3C,
+    0x3C: 0x3D,
+    0x3D: 0x3E,
+    0x3E: 0x3F,
+    0x3F: 0x40,
+    0x40: 0x41,
+    0x41: 0x42,
+    0x42: 0x43,
+    0x43: 0x44,
+    0x44: 0x57,
+    0x45: 0x58,
+    # navigation
+    0x47: 0x46,
+    0x49: (EXTENDED, 0x52),
+    0x4A: (EXTENDED, 0x47),
+    0x4B: (EXTENDED, 0x49),
+    0x4C: (EXTENDED, 0x53),
+    0x4D: (EXTENDED, 0x4F),
+    0x4E: (EXTENDED, 0x51),
+    0x4F: (EXTENDED, 0x4D),
+    0x50: (EXTENDED, 0x4B),
+    0x51: (EXTENDED, 0x50),
+    0x52: (EXTENDED, 0x48),
+    # numpad
+    0x53: 0x45,
+    0x54: (EXTENDED, 0x35),
+    0x55: 0x37,
+    0x56: 0x4A,
+    0x57: 0x4E,
+    0x58: (EXTENDED, 0x1C),
+    0x59: 0x4F,
+    0x5A: 0x50,
+    0x5B: 0x51,
+    0x5C: 0x4B,
+    0x5D: 0x4C,
+    0x5E: 0x4D,
+    0x5F: 0x47,
+    0x60: 0x48,
+    0x61: 0x49,
+    0x62: 0x52,
+    0x63: 0x53,
+    0x64: 0x56,
+    0x65: (EXTENDED, 0x5D),
+    0x66: (EXTENDED, 0x5E),
+    0x67: 0x59,
+    # more function keys
+    0x68: 0x64,
+    0x69: 0x65,
+    0x6A: 0x66,
+    0x6B: 0x67,
+    0x6C: 0x68,
+    0x6D: 0x69,
+    0x6E: 0x6A,
+    0x6F: 0x6B,
+    0x70: 0x6C,
+    0x71: 0x6D,
+    0x72: 0x6E,
+    0x73: 0x76,
+    # media
+    0x7F: (EXTENDED, 0x20),
+    0x80: (EXTENDED, 0x30),
+    0x81: (EXTENDED, 0x2E),
+    # modifiers
+    0xE0: 0x1D,
+    0xE1: 0x2A,
+    0xE2: 0x38,
+    0xE3: (EXTENDED, 0x5B),
+    0xE4: (EXTENDED, 0x1D),
+    0xE5: 0x36,
+    0xE6: (EXTENDED, 0x38),
+    0xE7: (EXTENDED, 0x5C),
+}
+
+# Keys sending multi-byte sequences which don't follow the make/break rule
+SPECIAL_SEQUENCES = {
+    # print screen
+    0x46: ([0xE0, 0x2A, 0xE0, 0x37], [0xE0, 0xB7, 0xE0, 0xAA]),
+    # pause has no break sequence
+    0x48: ([0xE1, 0x1D, 0x45, 0xE1, 0x9D, 0xC5], []),
+}
+
+SHIFT_USB_HID_CODE = 0xE1
+
+
+def press(code):
+    """Returns make scancodes of a USB HID usage code"""
+    if code in SPECIAL_SEQUENCES:
+        return list(SPECIAL_SEQUENCES[code][0])
+
+    scancode = USB_HID_TO_SCANCODE[code]
+    if isinstance(scancode, tuple):
+        return [scancode[0], scancode[1]]
+    return [scancode]
+
+
+def release(code):
+    """Returns break scancodes of a USB HID usage code"""
+    if code in SPECIAL_SEQUENCES:
+        return list(SPECIAL_SEQUENCES[code][1])
+
+    scancode = USB_HID_TO_SCANCODE[code]
+    if isinstance(scancode, tuple):
+        return [scancode[0], scancode[1] | BREAK]
+    return [scancode | BREAK]
+
+
+def compile_keys(keys, keymap="US"):
+    """Compiles a string or list of keys into per key scancode lists
+
+    Every key is pressed and released, with Shift around it when needed.
+
+    Parameters
+    ----------
+    keys : list of str or str
+        string to send, or list of key codes like 'a' or '<right shift>'
+    keymap : str, optional
+        keymap, currently only US is supported, default to 'US'
+
+    Raises
+    ------
+    NotImplementedError
+        If trying to use an unsupported keymap
+    ValueError
+        If a key is unknown or has no scancode
+    """
+    if keymap != "US":
+        raise NotImplementedError("Only US layout is supported for now")
+
+    compiled = []
+    for key in keys:
+        if key not in MAPPING:
+            raise ValueError("Unknown key:" + key)
+        code, use_shift = MAPPING[key]
+        if code not in USB_HID_TO_SCANCODE and code not in SPECIAL_SEQUENCES:
+            raise ValueError("No scancode for key:" + key)
+
+        sequence = press(code) + release(code)
+        if use_shift:
+            sequence = (
+                press(SHIFT_USB_HID_CODE) + sequence + release(SHIFT_USB_HID_CODE)
+            )
+        compiled.append(sequence)
+
+    return compiled
@@ -0,0 +1,285 @@
+"""
+Continuous screenshot streaming and client-side frame encoding
+"""
+
+import io
+import struct
+import zlib
+from array import array
+from base64 import b64decode
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from time import monotonic, sleep
+
+import zeep.exceptions
+
+# data is BGRA pixels, 4 bytes per pixel, rows top to bottom
+Frame = namedtuple("Frame", ["screen_number", "width", "height", "data"])
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def bgra_to_rgb(data):
+    """Returns RGB bytearray of BGRA pixels"""
+    data = memoryview(data)
+    rgb = bytearray(len(data) // 4 * 3)
+    rgb[0::3] = data[2::4]
+    rgb[1::3] = data[1::4]
+    rgb[2::3] = data[0::4]
+    return rgb
+
+
+def crop_base64(image_data, screen_number, frame_width, x, y, width, height):
+    """Returns Frame with a region of base64 encoded BGRA pixels
+
+    Only the base64 span covering the region rows is decoded"""
+    start = y * frame_width * 4
+    end = (y + height) * frame_width * 4
+    # 3 bytes are encoded by 4 characters, align span to whole groups
+    skip = start % 3
+    rows = b64decode(image_data[start // 3 * 4 : (end + 2) // 3 * 4])
+    rows = memoryview(rows)[skip : skip + end - start]
+
+    stride = frame_width * 4
+    region = bytearray()
+    for row in range(height):
+        offset = row * stride + x * 4
+        region += rows[offset : offset + width * 4]
+
+    return Frame(screen_number, width, height, memoryview(region))
+
+
+def _png_chunk(tag, data):
+    return (
+        struct.pack(">I", len(data))
+        + tag
+        + data
+        + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+    )
+
+
+def encode_png(frame, level=6):
+    """Returns frame encoded as RGB PNG"""
+    rgb = bgra_to_rgb(frame.data)
+    stride = frame.width * 3
+    scanlines = bytearray()
+    for y in range(frame.height):
+        scanlines.append(0)  # no filter
+        scanlines += rgb[y * stride : (y + 1) * stride]
+
+    header = struct.pack(">IIBBBBB", frame.width, frame.height, 8, 2, 0, 0, 0)
+    return (
+        PNG_SIGNATURE
+        + _png_chunk(b"IHDR", header)
+        + _png_chunk(b"IDAT", zlib.compress(bytes(scanlines), level))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def encode_jpeg(frame, quality=85):
+    """Returns frame encoded as JPEG, requires Pillow"""
+    try:
+        from PIL import Image
+    except ImportError:
+        raise ImportError("JPEG encoding requires Pillow: pip install Pillow")
+
+    image = Image.frombytes(
+        "RGB", (frame.width, frame.height), bytes(bgra_to_rgb(frame.data))
+    )
+    with io.BytesIO() as output:
+        image.save(output, format="JPEG", quality=quality)
+        return output.getvalue()
+
+
+def downscale(frame, width, height):
+    """Returns frame resized to width x height with nearest neighbour"""
+    pixels = memoryview(frame.data).cast("I")
+    xs = [x * frame.width // width for x in range(width)]
+    scaled = array("I")
+    for y in range(height):
+        row = pixels[(y * frame.height // height) * frame.width :]
+        scaled.extend(row[x] for x in xs)
+
+    return Frame(frame.screen_number, width, height, memoryview(scaled).cast("B"))
+
+
+def encode_frame(frame, image_format="PNG", size=None, quality=85):
+    """Optionally downscales frame to size and encodes it to PNG or JPEG"""
+    if size is not None and size != (frame.width, frame.height):
+        frame = downscale(frame, size[0], size[1])
+
+    if image_format == "PNG":
+        return encode_png(frame)
+    if image_format == "JPEG":
+        return encode_jpeg(frame, quality)
+
+    raise ValueError("Unsupported image format: {}".format(image_format))
+
+
+class FrameEncoder(object):
+    """FrameEncoder encodes raw frames in a worker pool
+
+    zlib and Pillow release the GIL so threads are used by default, set
+    processes to move encoding to separate processes instead.
+    """
+
+    def __init__(self, workers=4, processes=False):
+        if processes:
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.processes = processes
+
+    def submit(self, frame, image_format="PNG", size=None, quality=85):
+        """Returns Future with encoded image bytes"""
+        if self.processes:
+            # memoryview can't be pickled
+            frame = frame._replace(data=bytes(frame.data))
+        return self.executor.submit(encode_frame, frame, image_format, size, quality)
+
+    def map(self, frames, image_format="PNG", size=None, quality=85):
+        futures = [self.submit(f, image_format, size, quality) for f in frames]
+        return [future.result() for future in futures]
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+
+class ScreenshotStream(object):
+    """ScreenshotStream iterates over screen frames of a running machine
+
+    Display handle and screen resolution are reused between frames,
+    resolution is refreshed every resolution_interval seconds and after
+    a failed capture. Frames identical to the previous one are dropped.
+
+    :param machine: IMachine with a locked session
+    :param fps: target frame rate
+    :param dedupe: drop frames identical to the previous one
+    :param max_frames: stop after yielding that many frames
+    :param duration: stop after that many seconds
+    """
+
+    def __init__(
+        self,
+        machine,
+        screen_number=0,
+        fps=5,
+        image_format="PNG",
+        dedupe=True,
+        max_frames=None,
+        duration=None,
+        resolution_interval=5.0,
+    ):
+        self.machine = machine
+        self.screen_number = screen_number
+        self.fps = fps
+        self.image_format = image_format
+        self.dedupe = dedupe
+        self.max_frames = max_frames
+        self.duration = duration
+        self.resolution_interval = resolution_interval
+
+        self.frames = 0
+        self.dropped = 0
+        self.bytes = 0
+        self.started = None
+        self.finished = None
+        self._stopped = False
+        self._resolution = None
+        self._resolution_time = 0
+
+    def _get_resolution(self):
+        now = monotonic()
+        if (
+            self._resolution is None
+            or now - self._resolution_time > self.resolution_interval
+        ):
+            self._resolution = self.machine.get_screen_resolution(self.screen_number)
+            self._resolution_time = now
+
+        return self._resolution
+
+    def _capture(self):
+        """Returns base64 encoded frame"""
+        resolution = self._get_resolution()
+        try:
+            return self.machine._console_call(
+                self.machine._get_display,
+                self.machine.service.IDisplay_takeScreenShotToArray,
+                self.screen_number,
+                resolution["width"],
+                resolution["height"],
+                self.image_format,
+            )
+        except zeep.exceptions.Fault:
+            # Screen could have been resized
+            self._resolution = None
+            raise
+
+    def __iter__(self):
+        self.started = monotonic()
+        interval = 1.0 / self.fps if self.fps else 0
+        last = None
+
+        try:
+            while not self._stopped:
+                frame_start = monotonic()
+                if self.duration is not None:
+                    if frame_start - self.started >= self.duration:
+                        break
+
+                image_data = self._capture()
+                # str hash is cached and needs no copy of a large payload
+                fingerprint = (len(image_data), hash(image_data))
+                if self.dedupe and fingerprint == last:
+                    self.dropped += 1
+                else:
+                    last = fingerprint
+                    frame = b64decode(image_data)
+                    self.frames += 1
+                    self.bytes += len(frame)
+                    yield frame
+
+                    if self.max_frames is not None and self.frames >= self.max_frames:
+                        break
+
+                remaining = interval - (monotonic() - frame_start)
+                if remaining > 0:
+                    sleep(remaining)
+        finally:
+            self.finished = monotonic()
+
+    def stop(self):
+        """Stops iteration after the current frame"""
+        self._stopped = True
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or monotonic()) - self.started
+
+    def achieved_fps(self):
+        """Returns captured frames per second, dropped duplicates included"""
+        elapsed = self.elapsed()
+        return (self.frames + self.dropped) / elapsed if elapsed else 0.0
+
+    def bytes_per_second(self):
+        """Returns decoded bytes of yielded frames per second"""
+        elapsed = self.elapsed()
+        return self.bytes / elapsed if elapsed else 0.0
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "bytes": self.bytes,
+            "elapsed": self.elapsed(),
+            "fps": self.achieved_fps(),
+            "bytes_per_second": self.bytes_per_second(),
+        }
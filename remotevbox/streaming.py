@@ -0,0 +1,255 @@
+"""
+Incremental parsing of large SOAP responses
+
+zeep builds a full lxml tree of every response and then decodes base64
+content from a Python string, which keeps several copies of a screenshot
+in memory at once. Functions here post the request with a streamed
+response instead and decode returnval while it is read from the socket.
+
+Posting relies on private attributes of the zeep service proxy, if they
+are missing the operation is called through zeep as usual.
+"""
+
+import binascii
+import re
+from xml.sax.saxutils import escape
+
+import zeep.exceptions
+from lxml import etree
+
+VBOX_NAMESPACE = "http://www.virtualbox.org/"
+
+ENVELOPE = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<soap-env:Envelope xmlns:soap-env="http://schemas.xmlsoap.org/soap/envelope/">'
+    "<soap-env:Body>"
+    '<vbox:{operation} xmlns:vbox="' + VBOX_NAMESPACE + '">{params}</vbox:{operation}>'
+    "</soap-env:Body>"
+    "</soap-env:Envelope>"
+)
+
+HEADERS = {"Content-Type": "text/xml; charset=utf-8", "SOAPAction": '""'}
+
+CHUNK_SIZE = 64 * 1024
+
+RETURNVAL_TAG = re.compile(rb"<(?:[\w.-]+:)?returnval(?:\s[^>]*?)?(/?)>")
+FAULT_TAG = re.compile(rb"<(?:[\w.-]+:)?Fault[\s>]")
+WHITESPACE = b" \t\r\n"
+
+
+def _render_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return escape(str(value))
+
+
+def render_envelope(operation, params):
+    """Returns request envelope bytes for operation
+
+    params is a list of (name, value) pairs, list values are rendered as
+    repeated elements"""
+    rendered = []
+    for name, value in params:
+        values = value if isinstance(value, (list, tuple)) else [value]
+        for item in values:
+            rendered.append("<{0}>{1}</{0}>".format(name, _render_value(item)))
+
+    return ENVELOPE.format(operation=operation, params="".join(rendered)).encode(
+        "utf-8"
+    )
+
+
+def parse_fault(content):
+    """Raises zeep Fault from a SOAP fault document"""
+    try:
+        doc = etree.fromstring(content)
+    except etree.XMLSyntaxError:
+        raise zeep.exceptions.TransportError(
+            "Server returned unexpected response", content=content
+        )
+
+    fault = doc.find(".//{http://schemas.xmlsoap.org/soap/envelope/}Fault")
+    if fault is None:
+        raise zeep.exceptions.TransportError(
+            "Server returned unexpected response", content=content
+        )
+
+    raise zeep.exceptions.Fault(
+        message=fault.findtext("faultstring"), code=fault.findtext("faultcode")
+    )
+
+
+class Base64Sink(object):
+    """Base64Sink decodes base64 text fed in arbitrary pieces into a buffer
+
+    Decoding is done in groups of 4 characters, so only a tail of less
+    than 4 characters is carried between pieces.
+
+    :param buffer: writable buffer to decode into, grown as needed if it
+        is a bytearray
+    """
+
+    def __init__(self, buffer=None):
+        self.buffer = bytearray() if buffer is None else buffer
+        self.size = 0
+        self._tail = b""
+
+    def feed(self, data):
+        data = self._tail + data.translate(None, WHITESPACE)
+        aligned = len(data) - len(data) % 4
+        self._tail = data[aligned:]
+        if aligned:
+            self._write(binascii.a2b_base64(data[:aligned]))
+
+    def _write(self, decoded):
+        end = self.size + len(decoded)
+        if end > len(self.buffer) and not isinstance(self.buffer, bytearray):
+            raise ValueError("Buffer is too small for the response")
+        self.buffer[self.size : end] = decoded
+        self.size = end
+
+    def close(self):
+        """Returns memoryview of the decoded bytes"""
+        if self._tail:
+            raise ValueError("Truncated base64 data")
+        return memoryview(self.buffer)[: self.size]
+
+
+def streamable(service):
+    """Returns whether post() can reach the transport and address of service"""
+    try:
+        service._client.transport.session
+        service._binding_options["address"]
+    except (AttributeError, KeyError, TypeError):
+        return False
+    return True
+
+
+def call(service, operation, params):
+    """Calls operation through zeep, params is a list of (name, value) pairs"""
+    return getattr(service, operation)(*[value for _, value in params])
+
+
+def post(service, operation, params):
+    """Posts operation through the service transport, returns streamed response"""
+    transport = service._client.transport
+    return transport.session.post(
+        service._binding_options["address"],
+        data=render_envelope(operation, params),
+        headers=HEADERS,
+        timeout=transport.operation_timeout,
+        stream=True,
+    )
+
+
+def call_base64(service, operation, params, buffer=None, size=None):
+    """Calls operation returning base64Binary and decodes it into buffer
+
+    Parameters
+    ----------
+    buffer : bytearray or memoryview, optional
+        buffer to decode into, allocated when not given
+    size : int, optional
+        expected size of decoded data used to preallocate the buffer
+
+    Returns
+    -------
+    memoryview
+        decoded bytes, a view of the buffer
+
+    Raises
+    ------
+    zeep.exceptions.Fault
+        If VirtualBox returned a SOAP fault
+    """
+    if buffer is None:
+        buffer = bytearray(size or 0)
+
+    if not streamable(service):
+        sink = Base64Sink(buffer)
+        data = call(service, operation, params)
+        if data:
+            sink.feed(data.encode("ascii") if isinstance(data, str) else data)
+        return sink.close()
+
+    response = post(service, operation, params)
+    try:
+        if response.status_code != 200:
+            parse_fault(response.content)
+
+        sink = Base64Sink(buffer)
+        head = b""
+        fault = done = False
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if done:
+                continue
+            if head is not None:
+                head += chunk
+                if fault:
+                    continue
+                match = RETURNVAL_TAG.search(head)
+                if match is None:
+                    fault = FAULT_TAG.search(head) is not None
+                    continue
+                if match.group(1):
+                    # empty element
+                    head, done = None, True
+                    continue
+                chunk, head = head[match.end() :], None
+
+            end = chunk.find(b"<")
+            if end != -1:
+                chunk = chunk[:end]
+                done = True
+            sink.feed(chunk)
+
+        if fault:
+            parse_fault(head)
+        if head is not None:
+            raise zeep.exceptions.TransportError(
+                "Response has no returnval", content=head
+            )
+    finally:
+        response.close()
+
+    return sink.close()
+
+
+def iter_returnvals(service, operation, params):
+    """Calls operation returning an array and yields its items as text
+
+    Response is parsed incrementally, elements are dropped once yielded.
+
+    Raises
+    ------
+    zeep.exceptions.Fault
+        If VirtualBox returned a SOAP fault
+    """
+    if not streamable(service):
+        for item in call(service, operation, params) or []:
+            yield item
+        return
+
+    response = post(service, operation, params)
+    try:
+        if response.status_code != 200:
+            parse_fault(response.content)
+
+        parser = etree.XMLPullParser(events=("end",))
+        for chunk in response.iter_content(CHUNK_SIZE):
+            parser.feed(chunk)
+            for _, element in parser.read_events():
+                name = etree.QName(element).localname
+                if name == "returnval":
+                    yield element.text or ""
+                    element.clear()
+                    while element.getprevious() is not None:
+                        del element.getparent()[0]
+                elif name == "Fault":
+                    raise zeep.exceptions.Fault(
+                        message=element.findtext("faultstring"),
+                        code=element.findtext("faultcode"),
+                    )
+        parser.close()
+    finally:
+        response.close()
@@ -0,0 +1,168 @@
+"""
+Tunable HTTP transport for SOAP calls
+"""
+
+import os
+import socket
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from zeep.transports import Transport
+
+
+class TransportConfig(object):
+    """TransportConfig describes HTTP connection pooling and timeouts
+
+    :param pool_connections: number of per host pools to keep
+    :param pool_maxsize: connections kept per host, size it to the number
+                         of threads issuing calls concurrently
+    :param pool_block: block when the pool is exhausted instead of opening
+                       throwaway connections
+    :param keep_alive: reuse connections and enable TCP keepalive probes
+    :param tcp_nodelay: disable Nagle's algorithm, SOAP calls are small
+                        request/response pairs
+    :param connect_timeout: seconds to wait for a connection, None is forever
+    :param read_timeout: seconds to wait for a response, None is forever
+    :param load_timeout: seconds to wait for WSDL and XSD documents
+    """
+
+    def __init__(
+        self,
+        pool_connections=10,
+        pool_maxsize=10,
+        pool_block=False,
+        keep_alive=True,
+        tcp_nodelay=True,
+        connect_timeout=None,
+        read_timeout=None,
+        load_timeout=300,
+    ):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.tcp_nodelay = tcp_nodelay
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.load_timeout = load_timeout
+
+    def key(self):
+        """Returns hashable representation of the configuration"""
+        return tuple(sorted(vars(self).items()))
+
+    def operation_timeout(self):
+        """Returns timeout suitable for requests"""
+        if self.connect_timeout is None and self.read_timeout is None:
+            return None
+
+        return (self.connect_timeout, self.read_timeout)
+
+    def socket_options(self):
+        options = [
+            option
+            for option in HTTPConnection.default_socket_options
+            if option[:2] != (socket.IPPROTO_TCP, socket.TCP_NODELAY)
+        ]
+        options.append((socket.IPPROTO_TCP, socket.TCP_NODELAY, int(self.tcp_nodelay)))
+        if self.keep_alive:
+            options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+
+        return options
+
+
+class PoolingAdapter(HTTPAdapter):
+    """HTTPAdapter applying socket options and counting requests"""
+
+    def __init__(self, config):
+        self.transport_config = config
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        super(PoolingAdapter, self).__init__(
+            pool_connections=config.pool_connections,
+            pool_maxsize=config.pool_maxsize,
+            pool_block=config.pool_block,
+        )
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        pool_kwargs.setdefault("socket_options", self.transport_config.socket_options())
+        super(PoolingAdapter, self).init_poolmanager(
+            connections, maxsize, block, **pool_kwargs
+        )
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: self._counting_pool(pool_cls)
+            for scheme, pool_cls in self.poolmanager.pool_classes_by_scheme.items()
+        }
+
+    def _counting_pool(self, pool_cls):
+        """Returns pool class counting established connections"""
+        adapter = self
+
+        class CountingConnection(pool_cls.ConnectionCls):
+            def connect(self):
+                with adapter._lock:
+                    adapter.connections += 1
+                return super(CountingConnection, self).connect()
+
+        return type(
+            pool_cls.__name__, (pool_cls,), {"ConnectionCls": CountingConnection}
+        )
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            self.requests += 1
+        return super(PoolingAdapter, self).send(request, **kwargs)
+
+    def stats(self):
+        """Returns requests and connections counters"""
+        return {
+            "requests": self.requests,
+            "connections": self.connections,
+            "reused": max(self.requests - self.connections, 0),
+        }
+
+
+class PoolingTransport(Transport):
+    """zeep Transport built from TransportConfig
+
+    A forked child process gets a new HTTP session on first use, pooled
+    connections of the parent are never shared."""
+
+    def __init__(self, config=None, cache=None):
+        self.config = config or TransportConfig()
+        self._pid = os.getpid()
+
+        super(PoolingTransport, self).__init__(
+            cache=cache,
+            timeout=self.config.load_timeout,
+            operation_timeout=self.config.operation_timeout(),
+            session=self._new_session(),
+        )
+        self._close_session = True
+
+    def _new_session(self):
+        self.adapter = PoolingAdapter(self.config)
+        session = requests.Session()
+        session.mount("http://", self.adapter)
+        session.mount("https://", self.adapter)
+        if not self.config.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    @property
+    def session(self):
+        """requests.Session of the current process"""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._session = self._new_session()
+        return self._session
+
+    @session.setter
+    def session(self, session):
+        self._session = session
+
+    def stats(self):
+        """Returns connection reuse statistics"""
+        return self.adapter.stats()
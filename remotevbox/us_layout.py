@@ -120,7 +120,7 @@ MAPPING = {
     ">": (0x37, True),
     "/": (0x38, False),
     "?": (0x38, True),
-    "<caps lock>": (0x38, False),
+    "<caps lock>": (0x39, False),
     # Function keys
     "<f1>": (0x3A, False),
     "<f2>": (0x3B, False),
@@ -199,7 +199,7 @@ MAPPING = {
     "<volume up>": (0x80, False),
     "<volume down>": (0x81, False),
     # more numpad
-    "<numpad ,>": (0x81, False),
+    "<numpad ,>": (0x85, False),
     "<numpad (>": (0xB6, False),
     "<numpad )>": (0xB7, False),
     # control keys
@@ -2,33 +2,114 @@
 IVirtualBox binding
 """
 
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
 import requests.exceptions
 import zeep
 
+from . import streaming
+from .events import EventListener
+from .fastpath import FastService
+from .fleet import Fleet
 from .machine import IMachine
-from .websession_manager import IWebsessionManager
+from .proxy import LazyServiceProxy
+from .registry import default_registry
+from .transport import PoolingTransport, TransportConfig
+from .websession_manager import IWebsessionManager, retry_expired
 from .exceptions import FindMachineError, ListMachinesError, WebServiceConnectionError
 
 VBOX_SOAP_BINDING = "{http://www.virtualbox.org/}vboxBinding"
 
+MachineRecord = namedtuple(
+    "MachineRecord",
+    ["mid", "name", "id", "state", "session_state", "os_type", "snapshot_count"],
+)
+
+HostInfo = namedtuple("HostInfo", ["cpus", "memory_size", "memory_available"])
+
 
 class IVirtualBox(object):
-    def __init__(self, location, user="", password=""):
+    def __init__(
+        self,
+        location,
+        user="",
+        password="",
+        cache=None,
+        registry=None,
+        transport=None,
+        fast_path=False,
+        release_on_gc=False,
+        keepalive=None,
+    ):
 
         if not location.endswith("/"):
             location = location + "/"
 
         self.location = location
-        self.client = self.get_client(location + "?wsdl")
-        self.service = self.client.create_service(VBOX_SOAP_BINDING, self.location)
-        self.manager = IWebsessionManager(self.service, user, password)
+        self.cache = cache
+        self.transport_config = transport or TransportConfig()
+        # An empty registry is falsy, it defines __len__
+        self.registry = default_registry if registry is None else registry
+        self.fast_path = fast_path
+        self.client, self.service = self.get_service()
+        self.manager = IWebsessionManager(
+            self.service, user, password, release_on_gc=release_on_gc
+        )
 
-        self.handle = self.manager.handle
         self.version = self.get_version()
+        self.events = None
+
+        if self.cache is not None and not self.cache.validate(location, self.version):
+            # Cached definition belongs to another VirtualBox version
+            self.registry.discard(self._registry_key())
+            self.client, self.service = self.get_service()
+            self.manager.service = self.service
+            self.manager.refs.service = self.service
+
+        if keepalive:
+            self.manager.start_keepalive(keepalive)
+
+    @property
+    def handle(self):
+        # Replaced when the manager logs on again
+        return self.manager.handle
+
+    def get_service(self):
+        """Returns shared (client, service) tuple for the location
+
+        Service is wrapped in FastService when fast_path is set"""
+        client, service = self.registry.get(
+            self._registry_key(), self._create_service, self.get_transport
+        )
+        if self.fast_path:
+            service = FastService(service)
+        return client, service
+
+    def _registry_key(self):
+        return (self.location, self.transport_config.key())
+
+    def _create_service(self, transport):
+        client = self.get_client(self.location + "?wsdl", transport)
+        return client, LazyServiceProxy(
+            client, client.wsdl.bindings[VBOX_SOAP_BINDING], address=self.location
+        )
+
+    def get_transport(self):
+        return PoolingTransport(self.transport_config, cache=self.cache)
 
-    def get_client(self, location):
+    def transport_stats(self):
+        """Returns HTTP requests and connection reuse counters"""
+        return self.client.transport.stats()
+
+    def get_client(self, location, transport=None):
         try:
-            client = zeep.Client(location)
+            # Raw full screen screenshots are over the 10 MB text node limit
+            client = zeep.Client(
+                location,
+                transport=transport or self.get_transport(),
+                settings=zeep.Settings(xml_huge_tree=True),
+            )
             return client
 
         except requests.exceptions.ConnectionError:
@@ -39,6 +120,7 @@ class IVirtualBox(object):
     def get_session_manager(self):
         return self.manager
 
+    @retry_expired
     def list_machines(self):
         """Lists all machines available"""
         machines = []
@@ -56,11 +138,100 @@ class IVirtualBox(object):
 
         return machines
 
+    def iter_machine_ids(self):
+        """Yields managed object ids of all machines
+
+        The response is parsed incrementally instead of being built into a
+        tree, which keeps memory flat for hosts with many machines"""
+        try:
+            for mid in streaming.iter_returnvals(
+                self.service, "IVirtualBox_getMachines", [("_this", self.handle)]
+            ):
+                yield mid
+        except zeep.exceptions.Fault as err:
+            raise ListMachinesError(err)
+
+    @retry_expired
+    def inventory(self, workers=8):
+        """Returns list of MachineRecord for every accessible machine
+
+        Attributes are fetched concurrently by up to workers threads.
+        Machines with limited object functionality are skipped like in
+        list_machines"""
+        mids = self.service.IVirtualBox_getMachines(self.handle) or []
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(mids)))) as ex:
+            records = ex.map(self._machine_record, mids)
+            return [record for record in records if record is not None]
+
+    @retry_expired
+    def machine_states(self):
+        """Returns list of states of all machines in two round trips"""
+        try:
+            mids = self.service.IVirtualBox_getMachines(self.handle) or []
+            if not mids:
+                return []
+            return list(self.service.IVirtualBox_getMachineStates(self.handle, mids))
+        except zeep.exceptions.Fault as err:
+            raise ListMachinesError(
+                "Machine states query failed: {}".format(err.message)
+            )
+
+    def _machine_record(self, mid):
+        try:
+            return MachineRecord(
+                mid,
+                self.service.IMachine_getName(mid),
+                self.service.IMachine_getId(mid),
+                self.service.IMachine_getState(mid),
+                self.service.IMachine_getSessionState(mid),
+                self.service.IMachine_getOSTypeId(mid),
+                self.service.IMachine_getSnapshotCount(mid),
+            )
+        except zeep.exceptions.Fault as err:
+            if "The object functionality is limited" in str(err):
+                return None
+
+            raise ListMachinesError(err)
+
+    @retry_expired
     def get_machine(self, name):
         """Returns IMachine"""
         mid = self.find_machine(name)
-        return IMachine(self.service, self.manager, mid, vbox_version=self.version)
+        return IMachine(
+            self.service,
+            self.manager,
+            mid,
+            vbox_version=self.version,
+            events=self.events,
+            name=name,
+        )
+
+    def get_machines(self, names, workers=8):
+        """Returns list of IMachine for names, looked up concurrently
+
+        Sessions are not retrieved until a machine needs one, so every
+        machine costs a single round trip.
 
+        Raises
+        ------
+        FindMachineError
+            If any of machines could not be found
+        """
+        names = list(names)
+        if not names:
+            return []
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(names)))) as ex:
+            return list(ex.map(self.get_machine, names))
+
+    def get_fleet(self, names, concurrency=8):
+        """Returns :class:`Fleet <remotevbox.fleet.Fleet>` of machines by names
+
+        :param concurrency: maximum number of machines handled at once
+        """
+        return Fleet(self.get_machines(names), concurrency)
+
+    @retry_expired
     def find_machine(self, name):
         """Returns virtual machine identificator by it's name"""
         try:
@@ -80,10 +251,52 @@ class IVirtualBox(object):
         #                 self.handle)
         pass
 
+    @retry_expired
+    def get_event_listener(self, types=None):
+        """Returns new :class:`EventListener <remotevbox.events.EventListener>`
+
+        :param types: list of VBoxEventType names, state, session and
+                      snapshot changes by default
+        """
+        return EventListener(self.service, self.handle, types)
+
+    def watch(self):
+        """Starts shared background event listener
+
+        Machines returned by get_machine() afterwards serve state() from
+        the listener states cache instead of a round trip"""
+        if self.events is None or not self.events.running():
+            self.events = self.get_event_listener()
+            self.events.start()
+
+        return self.events
+
+    @retry_expired
+    def host_info(self):
+        """Returns HostInfo with processor count and memory sizes in MB"""
+        host = self.service.IVirtualBox_getHost(self.handle)
+        return HostInfo(
+            self.service.IHost_getProcessorCount(host),
+            self.service.IHost_getMemorySize(host),
+            self.service.IHost_getMemoryAvailable(host),
+        )
+
+    def ref_stats(self):
+        """Returns managed object reference counters, live is the number of
+        references machines still hold on the server"""
+        return self.manager.refs.stats()
+
+    def logon_stats(self):
+        """Returns keepalive and re-logon counters and latencies"""
+        return self.manager.logon_stats()
+
+    @retry_expired
     def get_version(self):
         """Returns string with a VirtualBox version"""
         return self.service.IVirtualBox_getVersion(self.handle)
 
     def disconnect(self):
         """Disconnects"""
+        if self.events is not None:
+            self.events.stop()
         self.manager.logoff()
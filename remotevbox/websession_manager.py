@@ -2,19 +2,115 @@
 IWebsession_Manager binding
 """
 
+import threading
+from collections import deque
+from functools import wraps
+from time import monotonic
+
 import zeep.exceptions
 
 from .exceptions import WrongCredentialsError
+from .refs import RefTracker
+
+# vboxwebsrv fault for references of an expired or unknown websession
+STALE_REFERENCE = "Invalid managed object reference"
+
+# Fault of a handle outliving its object, e.g. the console of a stopped VM
+OBJECT_NOT_READY = "The object is not ready"
+
+
+def is_stale(err):
+    """Returns whether zeep Fault err is about a stale managed object"""
+    return STALE_REFERENCE in (err.message or "")
+
+
+def is_invalid_object(err):
+    """Returns whether zeep Fault err is about a stale or dead handle"""
+    return is_stale(err) or OBJECT_NOT_READY in (err.message or "")
+
+
+def is_expired(err):
+    """Returns whether err, or the Fault it was raised from, is about a
+    stale managed object"""
+    for cause in (err, err.__cause__, err.__context__):
+        if isinstance(cause, zeep.exceptions.Fault) and is_stale(cause):
+            return True
+    return False
+
+
+_calls = threading.local()
+
+
+def retry_expired(method):
+    """Calls IVirtualBox or IMachine method once more if it has failed
+    because the websession expired, after the manager logged on again
+
+    Only the outermost of nested calls is repeated, from the start, so it
+    reads every reference anew. Nothing is repeated if the websession is
+    alive, the stale reference was of a single object then."""
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if getattr(_calls, "nested", False):
+            return method(self, *args, **kwargs)
+
+        generation = self.manager.generation
+        _calls.nested = True
+        try:
+            try:
+                return method(self, *args, **kwargs)
+            except Exception as err:
+                if not is_expired(err) or not self.manager.check(generation):
+                    raise
+            return method(self, *args, **kwargs)
+        finally:
+            _calls.nested = False
+
+    return wrapper
 
 
 class IWebsessionManager(object):
     """
     IWebsessionManager retrieves handle and current session
+
+    Managed object references got by machines are tracked in refs, set
+    release_on_gc to release them when a machine is garbage collected.
+
+    Credentials are kept to log on again when vboxwebsrv expires the
+    websession or restarts, machines got before look themselves up again
+    on their next use. Calls failing on an expired websession log on
+    again and are repeated, see retry_expired().
     """
 
-    def __init__(self, service, user, password):
+    def __init__(
+        self, service, user, password, max_idle_sessions=8, release_on_gc=False
+    ):
         self.service = service
+        self.user = user
+        self.password = password
         self.handle = self.login(user, password)
+        self.max_idle_sessions = max_idle_sessions
+        self.refs = RefTracker(service, release_on_gc)
+
+        # Incremented on every re-logon, machines compare it to their own
+        self.generation = 0
+        self._logon_lock = threading.Lock()
+        self._keepalive = None
+        self._stop = threading.Event()
+        self._logon_stats = dict.fromkeys(
+            ["relogons", "keepalives", "keepalive_failures"], 0
+        )
+        self._logon_stats.update(
+            dict.fromkeys(["last_latency", "max_latency", "total_latency"], 0.0)
+        )
+
+        self._lock = threading.Lock()
+        self._idle = []
+        # Sessions of collected machines, returned on the next lease
+        self._deferred = deque()
+        self._stats = dict.fromkeys(
+            ["created", "leased", "reused", "returned", "unlocked", "released"], 0
+        )
 
         if self.handle:
             self.session = self.get_session(self.handle)
@@ -23,6 +119,74 @@ class IWebsessionManager(object):
         """Retrieves current SessionObject"""
         return self.service.IWebsessionManager_getSessionObject(handle)
 
+    def lease_session(self):
+        """Returns an unlocked ISession from the pool or a new one"""
+        self._return_deferred()
+        with self._lock:
+            self._stats["leased"] += 1
+            if self._idle:
+                self._stats["reused"] += 1
+                return self._idle.pop()
+            self._stats["created"] += 1
+
+        return self.get_session(self.handle)
+
+    def return_session(self, session):
+        """Puts leased session back to the pool
+
+        Session still locking a machine is unlocked first, sessions which
+        could not be unlocked or don't fit in the pool are released"""
+        with self._lock:
+            self._stats["returned"] += 1
+
+        try:
+            if self.service.ISession_getState(session) != "Unlocked":
+                self.service.ISession_unlockMachine(session)
+                with self._lock:
+                    self._stats["unlocked"] += 1
+            reusable = self.service.ISession_getState(session) == "Unlocked"
+        except zeep.exceptions.Fault:
+            reusable = False
+
+        with self._lock:
+            if reusable and len(self._idle) < self.max_idle_sessions:
+                self._idle.append(session)
+                return
+            self._stats["released"] += 1
+
+        try:
+            self.service.IManagedObjectRef_release(session)
+        except zeep.exceptions.Fault:
+            pass
+
+    def defer_return(self, session):
+        """Queues session to be returned on the next lease
+
+        Safe to call from garbage collection, no request is made"""
+        self._deferred.append(session)
+
+    def _return_deferred(self):
+        while True:
+            try:
+                session = self._deferred.popleft()
+            except IndexError:
+                return
+            self.return_session(session)
+
+    def discard_session(self, session):
+        """Drops a leased session of an expired websession, no request is made"""
+        with self._lock:
+            self._stats["returned"] += 1
+
+    def session_stats(self):
+        """Returns session pool counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["idle"] = len(self._idle)
+        stats["deferred"] = len(self._deferred)
+        stats["in_use"] = stats["leased"] - stats["returned"] - stats["deferred"]
+        return stats
+
     def login(self, user, password):
         """Use IWebsessionManager to login and exit if credentials are false
 
@@ -35,6 +199,104 @@ class IWebsessionManager(object):
         except zeep.exceptions.Fault:
             raise WrongCredentialsError("Wrong credentials supplied")
 
+    def check(self, generation=None):
+        """Pings the websession and logs on again if it has expired
+
+        Returns whether a new websession was made, or if generation is
+        given, whether one was made since then. Transport errors are
+        raised, the server is down and there is nothing to log on to."""
+        if generation is not None and generation != self.generation:
+            return True
+
+        handle = self.handle
+        try:
+            self.service.IVirtualBox_getVersion(handle)
+            return False
+        except zeep.exceptions.Fault as err:
+            if not is_stale(err):
+                raise
+
+        self.relogon(handle)
+        return True
+
+    def relogon(self, handle=None):
+        """Logs on again, returns the new handle
+
+        Pooled sessions and tracked references belong to the old websession
+        and are dropped. Machines notice the new generation and look
+        themselves up again on their next use, a machine gone meanwhile
+        fails its own calls only. Nothing is done if handle is given and
+        was replaced already, e.g. by another thread."""
+        with self._logon_lock:
+            if handle is not None and handle != self.handle:
+                return self.handle
+
+            start = monotonic()
+            self.handle = self.login(self.user, self.password)
+            with self._lock:
+                self._idle = []
+            self._deferred.clear()
+            self.refs.forget()
+            self.session = self.get_session(self.handle)
+            self.generation += 1
+
+        latency = monotonic() - start
+        with self._lock:
+            stats = self._logon_stats
+            stats["relogons"] += 1
+            stats["last_latency"] = latency
+            stats["max_latency"] = max(stats["max_latency"], latency)
+            stats["total_latency"] += latency
+
+        return self.handle
+
+    def start_keepalive(self, interval=60.0):
+        """Starts a daemon thread pinging the websession every interval seconds
+
+        Keep it below vboxwebsrv idle timeout (--timeout, 300 seconds by
+        default), an expired websession is logged on again on the next
+        ping."""
+        if self._keepalive is not None and self._keepalive.is_alive():
+            return
+
+        self._stop.clear()
+        self._keepalive = threading.Thread(
+            target=self._run_keepalive,
+            args=(interval,),
+            name="remotevbox-keepalive",
+            daemon=True,
+        )
+        self._keepalive.start()
+
+    def stop_keepalive(self):
+        self._stop.set()
+        if self._keepalive is not None:
+            if self._keepalive is not threading.current_thread():
+                self._keepalive.join()
+            self._keepalive = None
+
+    def _run_keepalive(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.check()
+            except Exception:
+                # Server is unreachable or refused the logon, try next time
+                with self._lock:
+                    self._logon_stats["keepalive_failures"] += 1
+                continue
+
+            with self._lock:
+                self._logon_stats["keepalives"] += 1
+
+    def logon_stats(self):
+        """Returns keepalive and re-logon counters, latencies are in seconds"""
+        with self._lock:
+            stats = dict(self._logon_stats)
+        stats["keepalive"] = self._keepalive is not None
+        return stats
+
     def logoff(self):
         """Logs off and destroy all managed object references"""
+        self.stop_keepalive()
         self.service.IWebsessionManager_logoff(self.handle)
+        self.refs.forget()
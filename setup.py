@@ -14,7 +14,8 @@ setup(
     license="LICENSE",
     description="Simple client library to work with VirtualBox remotely",
     long_description=open("README.rst").read(),
-    install_requires=["zeep >= 2.4.0", "semver >= 2.9.0"],
+    install_requires=["zeep >= 3.0.0", "semver >= 2.9.0"],
+    extras_require={"aio": ["zeep >= 4.0.0", "httpx"]},
     keywords="virtualbox soap remote",
     python_requires=">=3.6",
 )
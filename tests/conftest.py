@@ -0,0 +1,48 @@
+from contextlib import suppress
+
+import pytest
+
+from remotevbox.registry import ServiceRegistry
+from remotevbox.vbox import IVirtualBox
+
+from .stub import State, serve
+
+
+@pytest.fixture
+def server(request):
+    """Returns (server, state, url) of a running stand-in server
+
+    State arguments can be given by indirect parametrization"""
+    server, state, url = serve(State(**getattr(request, "param", {})))
+    yield server, state, url
+    server.stop()
+
+
+@pytest.fixture
+def stub(server):
+    """Returns (state, url) of a running stand-in server"""
+    return server[1:]
+
+
+@pytest.fixture
+def vbox(request, stub):
+    """Returns IVirtualBox connected to the stand-in server
+
+    IVirtualBox options can be given by indirect parametrization"""
+    state, url = stub
+    options = getattr(request, "param", {})
+    vbox = IVirtualBox(url, "user", "password", registry=ServiceRegistry(), **options)
+    yield vbox
+    # The server may have been stopped by the test
+    with suppress(Exception):
+        vbox.disconnect()
+
+
+@pytest.fixture
+def running(stub, vbox):
+    """Returns (state, vbox, machine) of a running vm1 with a locked session"""
+    state, url = stub
+    state.machines["m-vm1"]["state"] = "Running"
+    machine = vbox.get_machine("vm1")
+    machine.lock()
+    return state, vbox, machine
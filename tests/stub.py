@@ -0,0 +1,740 @@
+"""
+Stand-in vboxwebsrv for tests and benchmarks
+
+It serves a generated WSDL covering the operations remotevbox uses and
+keeps a small in-memory model of machines, sessions and managed object
+references. Calls are counted per operation in State.calls, bytes of SOAP
+responses in State.sent.
+"""
+
+import base64
+import itertools
+import socket
+import threading
+import time
+from array import array
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from lxml import etree
+
+NS = "http://www.virtualbox.org/"
+SOAP_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+
+S = "xsd:string"
+I = "xsd:int"
+B = "xsd:boolean"
+U = "xsd:unsignedInt"
+
+# operation: (parameters, return type or list of out parameters, array return)
+# parameters are (name, type) or (name, type, True) for arrays
+OPERATIONS = {}
+
+
+def operation(name, params=(), returns=None, array=False):
+    OPERATIONS[name] = (list(params), returns, array)
+
+
+operation("IWebsessionManager_logon", [("username", S), ("password", S)], S)
+operation("IWebsessionManager_logoff", [("refIVirtualBox", S)])
+operation("IWebsessionManager_getSessionObject", [("refIVirtualBox", S)], S)
+operation("IManagedObjectRef_release", [("_this", S)])
+operation("IVirtualBox_getVersion", [("_this", S)], S)
+operation("IVirtualBox_getMachines", [("_this", S)], S, True)
+operation(
+    "IVirtualBox_getMachineStates", [("_this", S), ("machines", S, True)], S, True
+)
+operation("IVirtualBox_findMachine", [("_this", S), ("nameOrId", S)], S)
+operation("IVirtualBox_getEventSource", [("_this", S)], S)
+operation("IVirtualBox_getHost", [("_this", S)], S)
+operation(
+    "IVirtualBox_createMachine",
+    [
+        ("_this", S),
+        ("settingsFile", S),
+        ("name", S),
+        ("groups", S, True),
+        ("osTypeId", S),
+        ("flags", S),
+    ],
+    S,
+)
+operation("IVirtualBox_registerMachine", [("_this", S), ("machine", S)])
+operation("IHost_getProcessorCount", [("_this", S)], U)
+operation("IHost_getMemorySize", [("_this", S)], U)
+operation("IHost_getMemoryAvailable", [("_this", S)], U)
+for attribute, kind in [
+    ("Name", S),
+    ("Id", S),
+    ("State", S),
+    ("SessionState", S),
+    ("OSTypeId", S),
+    ("SnapshotCount", U),
+    ("CurrentSnapshot", S),
+    ("GraphicsAdapter", S),
+    ("MonitorCount", U),
+]:
+    operation("IMachine_get" + attribute, [("_this", S)], kind)
+operation(
+    "IMachine_launchVMProcess",
+    [("_this", S), ("session", S), ("name", S), ("environmentChanges", S, True)],
+    S,
+)
+operation("IMachine_lockMachine", [("_this", S), ("session", S), ("lockType", S)])
+operation("IMachine_findSnapshot", [("_this", S), ("nameOrId", S)], S)
+operation("IMachine_restoreSnapshot", [("_this", S), ("snapshot", S)], S)
+operation("IMachine_saveState", [("_this", S)], S)
+operation("IMachine_setExtraData", [("_this", S), ("key", S), ("value", S)])
+operation("IMachine_getExtraData", [("_this", S), ("key", S)], S)
+operation(
+    "IMachine_takeSnapshot",
+    [("_this", S), ("name", S), ("description", S), ("pause", B)],
+    S,
+)
+operation(
+    "IMachine_cloneTo",
+    [("_this", S), ("target", S), ("mode", S), ("options", S, True)],
+    S,
+)
+operation("IMachine_saveSettings", [("_this", S)])
+operation("IMachine_discardSavedState", [("_this", S), ("fRemoveFile", B)])
+operation("IGraphicsAdapter_getMonitorCount", [("_this", S)], U)
+operation("ISnapshot_getMachine", [("_this", S)], S)
+operation("ISession_getState", [("_this", S)], S)
+operation("ISession_getConsole", [("_this", S)], S)
+operation("ISession_getMachine", [("_this", S)], S)
+operation("ISession_unlockMachine", [("_this", S)])
+operation("IConsole_getKeyboard", [("_this", S)], S)
+operation("IConsole_getMouse", [("_this", S)], S)
+operation("IConsole_getDisplay", [("_this", S)], S)
+operation("IConsole_powerDown", [("_this", S)], S)
+operation("IConsole_pause", [("_this", S)])
+operation(
+    "IKeyboard_putUsageCode",
+    [("_this", S), ("usageCode", I), ("usagePage", I), ("keyRelease", B)],
+)
+operation("IKeyboard_putScancode", [("_this", S), ("scancode", I)])
+operation("IKeyboard_putScancodes", [("_this", S), ("scancodes", I, True)], U)
+operation("IKeyboard_releaseKeys", [("_this", S)])
+operation(
+    "IMouse_putMouseEvent",
+    [("_this", S), ("dx", I), ("dy", I), ("dz", I), ("dw", I), ("buttonState", I)],
+)
+operation(
+    "IMouse_putMouseEventAbsolute",
+    [("_this", S), ("x", I), ("y", I), ("dz", I), ("dw", I), ("buttonState", I)],
+)
+operation(
+    "IDisplay_getScreenResolution",
+    [("_this", S), ("screenId", U)],
+    [
+        ("width", U),
+        ("height", U),
+        ("bitsPerPixel", U),
+        ("xOrigin", I),
+        ("yOrigin", I),
+        ("guestMonitorStatus", S),
+    ],
+)
+operation(
+    "IDisplay_takeScreenShotToArray",
+    [("_this", S), ("screenId", U), ("width", U), ("height", U), ("bitmapFormat", S)],
+    S,
+)
+operation("IProgress_waitForCompletion", [("_this", S), ("timeout", I)])
+operation("IProgress_getResultCode", [("_this", S)], I)
+operation("IProgress_getCompleted", [("_this", S)], B)
+operation("IProgress_getPercent", [("_this", S)], U)
+operation("IProgress_getOperationDescription", [("_this", S)], S)
+operation("IProgress_getOperation", [("_this", S)], U)
+operation("IProgress_getTimeRemaining", [("_this", S)], I)
+operation("IProgress_getCanceled", [("_this", S)], B)
+operation("IProgress_cancel", [("_this", S)])
+operation("IEventSource_createListener", [("_this", S)], S)
+operation(
+    "IEventSource_registerListener",
+    [("_this", S), ("listener", S), ("interesting", S, True), ("active", B)],
+)
+operation("IEventSource_unregisterListener", [("_this", S), ("listener", S)])
+operation("IEventSource_getEvent", [("_this", S), ("listener", S), ("timeout", I)], S)
+operation("IEventSource_eventProcessed", [("_this", S), ("listener", S), ("event", S)])
+operation("IEvent_getType", [("_this", S)], S)
+operation("IMachineEvent_getMachineId", [("_this", S)], S)
+operation("IMachineStateChangedEvent_getState", [("_this", S)], S)
+operation("ISessionStateChangedEvent_getState", [("_this", S)], S)
+operation("ISnapshotEvent_getSnapshotId", [("_this", S)], S)
+
+
+def wsdl(extra_operations=0):
+    """Returns WSDL text describing OPERATIONS
+
+    extra_operations dummy operations are added to get closer to the size
+    of vboxwebsrv WSDL, which has a few thousand of them"""
+    operations = dict(OPERATIONS)
+    for index in range(extra_operations):
+        operations["IDummy_operation%d" % index] = ([("_this", S), ("value", S)], S, 0)
+
+    elements, messages, port_type, binding = [], [], [], []
+    for name, (params, returns, array) in operations.items():
+        sequence = "".join(
+            '<xsd:element name="%s" type="%s"%s/>'
+            % (
+                param[0],
+                param[1],
+                ' minOccurs="0" maxOccurs="unbounded"' if len(param) > 2 else "",
+            )
+            for param in params
+        )
+        if isinstance(returns, list):
+            response = "".join(
+                '<xsd:element name="%s" type="%s"/>' % out for out in returns
+            )
+        elif returns:
+            response = '<xsd:element name="returnval" type="%s"%s/>' % (
+                returns,
+                ' minOccurs="0" maxOccurs="unbounded"' if array else "",
+            )
+        else:
+            response = ""
+
+        for element, children in ((name, sequence), (name + "Response", response)):
+            elements.append(
+                '<xsd:element name="%s"><xsd:complexType><xsd:sequence>%s'
+                "</xsd:sequence></xsd:complexType></xsd:element>" % (element, children)
+            )
+        messages.append(
+            '<message name="{0}RequestMsg"><part name="parameters" element="vbox:{0}"/>'
+            '</message><message name="{0}ResultMsg"><part name="parameters" '
+            'element="vbox:{0}Response"/></message>'.format(name)
+        )
+        port_type.append(
+            '<operation name="{0}"><input message="vbox:{0}RequestMsg"/>'
+            '<output message="vbox:{0}ResultMsg"/></operation>'.format(name)
+        )
+        binding.append(
+            '<operation name="%s"><soap:operation soapAction=""/><input>'
+            '<soap:body use="literal"/></input><output><soap:body use="literal"/>'
+            "</output></operation>" % name
+        )
+
+    return (
+        '<?xml version="1.0"?><definitions name="vbox" targetNamespace="{ns}" '
+        'xmlns:vbox="{ns}" xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+        'xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/" '
+        'xmlns="http://schemas.xmlsoap.org/wsdl/"><types><xsd:schema '
+        'targetNamespace="{ns}" elementFormDefault="qualified">{elements}'
+        "</xsd:schema></types>{messages}"
+        '<portType name="vboxPortType">{port_type}</portType>'
+        '<binding name="vboxBinding" type="vbox:vboxPortType">'
+        '<soap:binding style="document" '
+        'transport="http://schemas.xmlsoap.org/soap/http"/>{binding}</binding>'
+        '<service name="vboxService"><port name="vboxServicePort" '
+        'binding="vbox:vboxBinding"><soap:address location="http://localhost:18083/"/>'
+        "</port></service></definitions>"
+    ).format(
+        ns=NS,
+        elements="".join(elements),
+        messages="".join(messages),
+        port_type="".join(port_type),
+        binding="".join(binding),
+    )
+
+
+class Fault(Exception):
+    """Returned to the client as SOAP Fault"""
+
+
+# Machine states with a console
+RUNNING_STATES = ("Running", "Paused", "Stuck")
+
+
+class State(object):
+    """In-memory model of a VirtualBox host
+
+    Machine references are "m-<name>" and are never released by the
+    server, every other object gets a fresh reference which is kept in
+    refs until released or the websession expires.
+
+    faults maps operation names to a fault message raised on every call,
+    or to a list of messages raised once each.
+    """
+
+    def __init__(self, machines=("vm1", "vm2"), state="PoweredOff"):
+        self.lock = threading.RLock()
+        self.calls = Counter()
+        self.ids = itertools.count()
+        self.refs = set()
+        self.released = []
+        self.dead = set()
+        self.machines = {}
+        self.sessions = {}
+        # Machines of console and console device references
+        self.consoles = {}
+        # Snapshot progresses by session, done once waited on
+        self.snapshotting = {}
+        self.failed = set()
+        self.scancodes = []
+        # (machine, usage code, released) sent through IKeyboard_putUsageCode
+        self.usagecodes = []
+        # Scancodes the guest keyboard queue takes per call, None is all
+        self.keyboard_room = None
+        self.events = []
+        self.event_data = {}
+        self.faults = {}
+        self.sent = 0
+        self.handle = None
+        self.delay = 0
+        self.width, self.height = 640, 480
+        # Screen contents of successive PNG captures, the last one stays
+        self.screens = [b""]
+        self.version = "6.1.30"
+        for name in machines:
+            self.add_machine(name, state)
+
+    def add_machine(self, name, state="PoweredOff"):
+        self.machines["m-" + name] = {
+            "name": name,
+            "id": "uuid-" + name,
+            "state": state,
+            "session": "Unlocked",
+            "os": "Windows10_64",
+            "snapshots": 1,
+        }
+        return "m-" + name
+
+    def ref(self, prefix):
+        ref = "%s-%d" % (prefix, next(self.ids))
+        self.refs.add(ref)
+        return ref
+
+    def expire(self):
+        """Drops the websession like vboxwebsrv idle timeout does"""
+        with self.lock:
+            self.dead |= self.refs | set(self.sessions)
+            self.refs = set()
+            for mid in self.sessions.values():
+                self.machines[mid]["session"] = "Unlocked"
+            self.sessions = {}
+
+    def push_event(self, event_type, machine=None, value=None):
+        """Queues an event for IEventSource_getEvent"""
+        with self.lock:
+            ref = self.ref("event")
+            self.event_data[ref] = (event_type, machine, value)
+            self.events.append(ref)
+        return ref
+
+    def _machine(self, ref):
+        """Returns machine of a machine or session machine reference"""
+        if ref in self.machines:
+            return self.machines[ref]
+        if ref and ref.startswith("mut-"):
+            return self.machines[ref[4:].rsplit("#", 1)[0]]
+        return None
+
+    def handle_operation(self, name, args):
+        with self.lock:
+            self.calls[name] += 1
+            fault = self.faults.get(name)
+            if isinstance(fault, list):
+                # Raised once each, then calls succeed again
+                fault = fault.pop(0) if fault else None
+        if self.delay:
+            time.sleep(self.delay)
+        if fault is not None:
+            raise Fault(fault)
+
+        for value in args.values():
+            if isinstance(value, str) and value in self.dead:
+                raise Fault('Invalid managed object reference "%s"' % value)
+
+        with self.lock:
+            return self._handle(name, args)
+
+    def _handle(self, name, args):
+        this = args.get("_this")
+        machine = self._machine(this)
+
+        if name == "IWebsessionManager_logon":
+            self.handle = self.ref("vbox")
+            return self.handle
+        if name == "IWebsessionManager_logoff":
+            return None
+        if name == "IWebsessionManager_getSessionObject":
+            return self.ref("session")
+        if name == "IManagedObjectRef_release":
+            if this in self.machines:
+                # Recorded, a client must not release shared machine refs
+                self.released.append(this)
+                return None
+            if this not in self.refs:
+                raise Fault('Invalid managed object reference "%s"' % this)
+            self.refs.discard(this)
+            self.released.append(this)
+            return None
+        if name == "IVirtualBox_getVersion":
+            return self.version
+        if name == "IVirtualBox_getMachines":
+            return list(self.machines)
+        if name == "IVirtualBox_getMachineStates":
+            machines = args.get("machines") or []
+            if not isinstance(machines, list):
+                machines = [machines]
+            return [self.machines[mid]["state"] for mid in machines]
+        if name == "IVirtualBox_findMachine":
+            for mid, found in self.machines.items():
+                if args["nameOrId"] in (found["name"], found["id"]):
+                    return mid
+            raise Fault(
+                "Could not find a registered machine named '%s'" % args["nameOrId"]
+            )
+        if name == "IVirtualBox_createMachine":
+            return self.add_machine(args["name"])
+        if name == "IVirtualBox_getHost":
+            return "host"
+        if name == "IHost_getProcessorCount":
+            return 8
+        if name == "IHost_getMemorySize":
+            return 16384
+        if name == "IHost_getMemoryAvailable":
+            return 8192
+
+        if name.startswith("IMachine_get"):
+            key = {
+                "Name": "name",
+                "Id": "id",
+                "State": "state",
+                "SessionState": "session",
+                "OSTypeId": "os",
+                "SnapshotCount": "snapshots",
+            }.get(name[12:])
+            if key:
+                return machine[key]
+            if name == "IMachine_getExtraData":
+                return "value"
+            if name == "IMachine_getCurrentSnapshot":
+                return self.ref("snapshot")
+            if name == "IMachine_getGraphicsAdapter":
+                return self.ref("adapter")
+            if name == "IMachine_getMonitorCount":
+                return 2
+        if name == "IGraphicsAdapter_getMonitorCount":
+            return 2
+        if name == "IMachine_findSnapshot":
+            return self.ref("snapshot")
+        if name == "ISnapshot_getMachine":
+            return "m-%s-snapshot" % this
+        if name == "IMachine_cloneTo":
+            return self.ref("progress")
+
+        if name == "IMachine_lockMachine":
+            if args["session"] in self.sessions:
+                raise Fault("The given session is busy")
+            self.sessions[args["session"]] = this
+            machine["session"] = "Locked"
+            return None
+        if name == "ISession_getState":
+            return "Locked" if this in self.sessions else "Unlocked"
+        if name == "ISession_getMachine":
+            if this not in self.sessions:
+                raise Fault("The session is not locked (session state: Unlocked)")
+            return "mut-%s#%d" % (self.sessions[this], next(self.ids))
+        if name == "ISession_getConsole":
+            if this not in self.sessions:
+                raise Fault("The session is not locked (session state: Unlocked)")
+            mid = self.sessions[this]
+            if self.machines[mid]["state"] in RUNNING_STATES:
+                console = self.ref("console")
+                self.consoles[console] = mid
+                return console
+            return None
+        if name == "ISession_unlockMachine":
+            mid = self.sessions.pop(this, None)
+            if mid is None:
+                raise Fault("The session is not locked (session state: Unlocked)")
+            progress = self.snapshotting.pop(this, None)
+            if progress is not None:
+                # Snapshot taken by the session is aborted with it
+                self.machines[mid]["snapshots"] -= 1
+                self.failed.add(progress)
+            self.machines[mid]["session"] = "Unlocked"
+            return None
+
+        if name == "IMachine_launchVMProcess":
+            if machine["state"] in RUNNING_STATES:
+                raise Fault("The machine is already running")
+            machine["state"] = "Running"
+            machine["session"] = "Locked"
+            self.sessions[args["session"]] = this
+            return self.ref("progress")
+        if name == "IMachine_restoreSnapshot":
+            if machine["state"] in RUNNING_STATES:
+                raise Fault("Cannot delete the current state of the running machine")
+            machine["state"] = "PoweredOff"
+            return self.ref("progress")
+        if name == "IMachine_saveState":
+            machine["state"] = "Saved"
+            return self.ref("progress")
+        if name == "IMachine_takeSnapshot":
+            machine["snapshots"] += 1
+            progress = self.ref("progress")
+            for session, mid in self.sessions.items():
+                if self.machines[mid] is machine:
+                    self.snapshotting[session] = progress
+            return progress
+        if name == "IMachine_discardSavedState":
+            machine["state"] = "PoweredOff"
+            return None
+        if name == "IConsole_powerDown":
+            mid = self.consoles[this]
+            self.machines[mid]["state"] = "PoweredOff"
+            self.machines[mid]["session"] = "Unlocked"
+            # Sessions of the machine go away with its process
+            for session, locked in list(self.sessions.items()):
+                if locked == mid:
+                    del self.sessions[session]
+            return self.ref("progress")
+        if name.startswith("IConsole_get"):
+            device = self.ref(name[12:].lower())
+            self.consoles[device] = self.consoles.get(this)
+            return device
+
+        if name == "IKeyboard_putScancodes":
+            stored = args["scancodes"][: self.keyboard_room]
+            self.scancodes.extend(stored)
+            return len(stored)
+        if name == "IKeyboard_putUsageCode":
+            self.usagecodes.append(
+                (
+                    self.consoles.get(this),
+                    int(args["usageCode"]),
+                    args["keyRelease"] == "true",
+                )
+            )
+            return None
+        if name == "IKeyboard_putScancode":
+            self.scancodes.append(args["scancode"])
+            return None
+        if name == "IDisplay_getScreenResolution":
+            return {
+                "width": self.width,
+                "height": self.height,
+                "bitsPerPixel": 32,
+                "xOrigin": 0,
+                "yOrigin": 0,
+                "guestMonitorStatus": "Enabled",
+            }
+        if name == "IDisplay_takeScreenShotToArray":
+            return self._screenshot(
+                int(args["width"]), int(args["height"]), args["bitmapFormat"]
+            )
+
+        if name in ("IProgress_waitForCompletion", "IProgress_getCompleted"):
+            for session, progress in list(self.snapshotting.items()):
+                if progress == this:
+                    del self.snapshotting[session]
+            return name == "IProgress_getCompleted" or None
+        if name == "IProgress_getResultCode":
+            return 1 if this in self.failed else 0
+        if name == "IProgress_getPercent":
+            return 100
+        if name in ("IProgress_getTimeRemaining", "IProgress_getOperation"):
+            return 0
+        if name == "IProgress_getOperationDescription":
+            return "done"
+        if name == "IProgress_getCanceled":
+            return False
+
+        if name == "IVirtualBox_getEventSource":
+            return self.ref("source")
+        if name == "IEventSource_createListener":
+            return self.ref("listener")
+        if name == "IEventSource_getEvent":
+            if self.events:
+                return self.events.pop(0)
+            self.lock.release()
+            try:
+                time.sleep(min(int(args["timeout"]), 100) / 1000.0)
+            finally:
+                self.lock.acquire()
+            return self.events.pop(0) if self.events else None
+        if name == "IEvent_getType":
+            return self.event_data[this][0]
+        if name == "IMachineEvent_getMachineId":
+            event_type, machine_name, value = self.event_data[this]
+            if machine_name is None:
+                raise Fault("No such interface supported")
+            return "uuid-" + machine_name
+        if name in (
+            "IMachineStateChangedEvent_getState",
+            "ISessionStateChangedEvent_getState",
+            "ISnapshotEvent_getSnapshotId",
+        ):
+            return self.event_data[this][2]
+
+        return None
+
+    def _screenshot(self, width, height, image_format):
+        if image_format == "PNG":
+            screen = self.screens.pop(0) if len(self.screens) > 1 else self.screens[0]
+            # About the size of a compressed desktop screenshot
+            data = b"\x89PNG" + screen + bytes(width * height // 2)
+        else:
+            # Every pixel holds its own index so misplaced bytes show up
+            data = array("I", range(width * height)).tobytes()
+        return base64.b64encode(data).decode()
+
+
+def render(value):
+    if value is None:
+        return ""
+    if isinstance(value, dict):
+        return "".join("<%s>%s</%s>" % (key, v, key) for key, v in value.items())
+    if isinstance(value, list):
+        return "".join(render_returnval(v) for v in value)
+    return render_returnval(value)
+
+
+def render_returnval(value):
+    if isinstance(value, bool):
+        value = "true" if value else "false"
+    return "<returnval>%s</returnval>" % value
+
+
+RESPONSE = (
+    '<?xml version="1.0"?><SOAP-ENV:Envelope xmlns:SOAP-ENV="%s" '
+    'xmlns:vbox="%s"><SOAP-ENV:Body><vbox:{0}Response>{1}</vbox:{0}Response>'
+    "</SOAP-ENV:Body></SOAP-ENV:Envelope>" % (SOAP_NS, NS)
+)
+
+FAULT = (
+    '<?xml version="1.0"?><SOAP-ENV:Envelope xmlns:SOAP-ENV="%s"><SOAP-ENV:Body>'
+    "<SOAP-ENV:Fault><faultcode>SOAP-ENV:Client</faultcode>"
+    "<faultstring>{0}</faultstring></SOAP-ENV:Fault></SOAP-ENV:Body>"
+    "</SOAP-ENV:Envelope>" % SOAP_NS
+)
+
+
+def make_handler(state, wsdl_text):
+    wsdl_body = wsdl_text.encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with state.lock:
+                state.calls["GET"] += 1
+            self.respond(200, wsdl_body)
+
+        def do_POST(self):
+            data = self.rfile.read(int(self.headers["Content-Length"]))
+            request = etree.fromstring(data).find("{%s}Body" % SOAP_NS)[0]
+            name = etree.QName(request).localname
+            args = {}
+            for child in request:
+                key = etree.QName(child).localname
+                if key in args:
+                    if not isinstance(args[key], list):
+                        args[key] = [args[key]]
+                    args[key].append(child.text)
+                else:
+                    args[key] = child.text
+            if name == "IKeyboard_putScancodes" and not isinstance(
+                args.get("scancodes"), list
+            ):
+                args["scancodes"] = [args["scancodes"]] if "scancodes" in args else []
+
+            try:
+                body = RESPONSE.format(name, render(state.handle_operation(name, args)))
+                code = 200
+            except Exception as err:
+                body = FAULT.format(err)
+                code = 500
+            body = body.encode()
+            with state.lock:
+                state.sent += len(body)
+            self.respond(code, body)
+
+        def respond(self, code, body):
+            self.send_response(code)
+            self.send_header("Content-Type", "text/xml")
+            self.send_header("Content-Length", str(len(body)))
+            if self.headers.get("Connection", "").lower() == "close":
+                self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connections = set()
+        self.connections_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self.connections_lock:
+            self.connections.add(request)
+        super().process_request(request, client_address)
+
+    def shutdown_request(self, request):
+        with self.connections_lock:
+            self.connections.discard(request)
+        super().shutdown_request(request)
+
+    def stop(self):
+        """Stops serving and closes the socket, clients get refused
+
+        Kept-alive connections are closed too, like a dead host would"""
+        self.shutdown()
+        self.server_close()
+        with self.connections_lock:
+            connections, self.connections = self.connections, set()
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+# Number of operations of VirtualBox 6.1 vboxwebsrv WSDL, roughly
+VBOX_OPERATIONS = 2500
+
+
+def serve(state=None, extra_operations=0):
+    """Starts a stand-in server in a daemon thread
+
+    Returns (server, state, url)"""
+    state = state or State()
+    server = Server(("127.0.0.1", 0), make_handler(state, wsdl(extra_operations)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, "http://127.0.0.1:%d" % server.server_address[1]
+
+
+def run(argv=None):
+    """Serves until interrupted, prints the url, machines are running"""
+    import sys
+
+    argv = sys.argv[1:] if argv is None else argv
+    server, state, url = serve(State(state="Running"))
+    if argv:
+        state.width, state.height = int(argv[0]), int(argv[1])
+    print(url, flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    run()
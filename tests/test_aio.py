@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from remotevbox import aio
+from remotevbox.exceptions import FindMachineError, WrongMachineState
+from remotevbox.machine import SHIFT_USB_HID_CODE
+from remotevbox.us_layout import MAPPING
+
+
+def usagecodes(text):
+    """Returns (usage code, released) sent for text one key at a time"""
+    sent = []
+    for key in text:
+        code, use_shift = MAPPING[key]
+        keys = [SHIFT_USB_HID_CODE, code] if use_shift else [code]
+        sent += [(code, False) for code in keys]
+        sent += [(code, True) for code in reversed(keys)]
+    return sent
+
+
+def test_connect(stub):
+    state, url = stub
+
+    async def main():
+        vbox = await aio.connect(url, "user", "password")
+        try:
+            return vbox.version, await vbox.list_machines()
+        finally:
+            await vbox.disconnect()
+
+    assert asyncio.run(main()) == ("6.1.30", ["vm1", "vm2"])
+    assert state.calls["IWebsessionManager_logon"] == 1
+    assert state.calls["IWebsessionManager_logoff"] == 1
+
+
+def test_get_machine(stub):
+    state, url = stub
+
+    async def main():
+        vbox = await aio.connect(url, "user", "password")
+        try:
+            machine = await vbox.get_machine("vm2")
+            with pytest.raises(FindMachineError):
+                await vbox.get_machine("vm3")
+            return machine.mid, machine.session, await machine.state()
+        finally:
+            await vbox.disconnect()
+
+    mid, session, machine_state = asyncio.run(main())
+
+    assert (mid, machine_state) == ("m-vm2", "PoweredOff")
+    assert session.startswith("session-")
+
+
+def test_launch_poweroff_restore(stub):
+    state, url = stub
+
+    async def main():
+        vbox = await aio.connect(url, "user", "password")
+        try:
+            machine = await vbox.get_machine("vm1")
+            await machine.launch()
+            states = [await machine.state()]
+            # Launching a running machine does nothing
+            await machine.launch()
+            with pytest.raises(WrongMachineState):
+                await machine.restore()
+            await machine.poweroff()
+            states.append(await machine.state())
+            await machine.restore()
+            states.append(await machine.state())
+            with pytest.raises(WrongMachineState):
+                await machine.poweroff()
+            return states
+        finally:
+            await vbox.disconnect()
+
+    assert asyncio.run(main()) == ["Running", "PoweredOff", "PoweredOff"]
+    assert state.calls["IMachine_launchVMProcess"] == 1
+    assert state.calls["IConsole_powerDown"] == 1
+    assert state.calls["IMachine_restoreSnapshot"] == 1
+    assert state.machines["m-vm1"]["session"] == "Unlocked"
+    assert not state.sessions
+
+
+def test_concurrent_input(stub):
+    state, url = stub
+    texts = {"vm1": "Hello, World!", "vm2": "ls -la /tmp"}
+
+    async def main():
+        vbox = await aio.connect(url, "user", "password", max_connections=4)
+        try:
+            machines = await asyncio.gather(*[vbox.get_machine(n) for n in texts])
+            await asyncio.gather(*[machine.launch() for machine in machines])
+            await asyncio.gather(
+                *[
+                    machine.send_character_string(texts[name], duration=0)
+                    for name, machine in zip(texts, machines)
+                ],
+                *[machines[0].put_scancodes([0x1E, 0x9E]) for _ in range(10)]
+            )
+        finally:
+            await vbox.disconnect()
+
+    asyncio.run(main())
+
+    for name, text in texts.items():
+        sent = [sent[1:] for sent in state.usagecodes if sent[0] == "m-" + name]
+        assert sent == usagecodes(text)
+    assert len(state.scancodes) == 20
@@ -0,0 +1,84 @@
+import pytest
+
+from remotevbox.cluster import CircuitBreaker, Cluster
+from remotevbox.registry import ServiceRegistry
+
+from .stub import State, serve
+
+
+@pytest.fixture
+def hosts():
+    """Returns list of (server, state, url) of three hosts"""
+    hosts = [
+        serve(State(machines=("base", "a1", "a2"), state="Running")),
+        serve(State(machines=("base", "b1"))),
+        serve(State(machines=("c1",))),
+    ]
+    yield hosts
+    for server, state, url in hosts:
+        server.stop()
+
+
+@pytest.fixture
+def cluster(hosts):
+    cluster = Cluster(
+        [url for server, state, url in hosts],
+        "user",
+        "password",
+        failure_threshold=1,
+        registry=ServiceRegistry(),
+    )
+    yield cluster
+    cluster.disconnect()
+
+
+def test_machines_are_routed_to_their_host(hosts, cluster):
+    names = sorted(machine.record.name for machine in cluster.inventory())
+
+    assert names == ["a1", "a2", "b1", "base", "base", "c1"]
+    assert cluster.locate("b1") == cluster.hosts[1].location
+    assert cluster.get_machine("c1").name == "c1"
+    assert hosts[2][1].calls["IVirtualBox_findMachine"] >= 1
+    assert hosts[0][1].calls["IVirtualBox_findMachine"] == 0
+
+
+def test_failed_host_is_taken_out_of_rotation(hosts, cluster):
+    cluster.inventory()
+    hosts[2][0].stop()
+
+    names = sorted(machine.record.name for machine in cluster.inventory())
+
+    assert names == ["a1", "a2", "b1", "base", "base"]
+    assert cluster.stats()[cluster.hosts[2].location]["state"] == CircuitBreaker.OPEN
+    assert cluster.hosts[2].vbox is None
+    assert [host.location for host in cluster.available_hosts()] == [
+        host.location for host in cluster.hosts[:2]
+    ]
+
+
+def test_loads_read_machine_states_only(hosts, cluster):
+    loads = {load.host: load.running for load in cluster.loads()}
+
+    assert loads == {
+        cluster.hosts[0].location: 3,
+        cluster.hosts[1].location: 0,
+        cluster.hosts[2].location: 0,
+    }
+    for server, state, url in hosts:
+        assert state.calls["IVirtualBox_getMachineStates"] == 1
+        assert state.calls["IMachine_getState"] == 0
+    assert cluster.pick_host() != cluster.hosts[0].location
+
+
+def test_host_error_does_not_fail_aggregate(cluster):
+    def version(vbox):
+        if vbox.location.rstrip("/") == cluster.hosts[1].location:
+            raise ValueError("broken")
+        return vbox.get_version()
+
+    results = cluster._map(version)
+
+    assert [host.location for host, result in results] == [
+        cluster.hosts[0].location,
+        cluster.hosts[2].location,
+    ]
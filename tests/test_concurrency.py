@@ -0,0 +1,79 @@
+import threading
+from collections import Counter
+
+import zeep
+
+from remotevbox.exceptions import WrongLockState, WrongMachineState
+
+ROUNDS = 10
+
+# Raised to callers racing a power down or re-logon of the machine
+EXPECTED = (WrongMachineState, WrongLockState, zeep.exceptions.Fault)
+
+
+def test_parallel_input_capture_and_lifecycle(running):
+    state, vbox, machine = running
+    errors = Counter()
+    done = threading.Event()
+
+    def repeat(func):
+        def run():
+            while not done.is_set():
+                try:
+                    func()
+                except Exception as err:
+                    errors[type(err)] += 1
+
+        return run
+
+    def lifecycle():
+        try:
+            for i in range(ROUNDS):
+                machine.revert_and_start()
+                if i == ROUNDS // 2:
+                    state.expire()
+        finally:
+            done.set()
+
+    threads = [
+        threading.Thread(target=repeat(lambda: machine.send_keys("hello"))),
+        threading.Thread(target=repeat(lambda: machine.put_mouse_event(1, 1))),
+        threading.Thread(target=repeat(machine.take_screenshot_to_bytes)),
+        threading.Thread(target=repeat(machine.take_thumbnail)),
+    ]
+    for thread in threads:
+        thread.start()
+    lifecycle()
+    for thread in threads:
+        thread.join(10)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert all(issubclass(error, EXPECTED) for error in errors)
+    assert state.scancodes and state.calls["IMouse_putMouseEvent"]
+    assert state.machines["m-vm1"]["state"] == "Running"
+    assert vbox.manager.generation == 1
+
+
+def test_keepalive_is_not_blocked_by_lifecycle_call(running):
+    state, vbox, machine = running
+    busy, release = threading.Event(), threading.Event()
+
+    def hold():
+        # As a long revert_and_start or launch does
+        with machine._lock:
+            busy.set()
+            release.wait(10)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    busy.wait(10)
+    state.expire()
+
+    try:
+        assert vbox.manager.check()
+    finally:
+        release.set()
+        thread.join(10)
+
+    machine.put_scancodes([0x1E, 0x9E])
+    assert state.calls["IVirtualBox_findMachine"] == 2
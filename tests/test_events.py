@@ -0,0 +1,61 @@
+import threading
+import time
+
+import requests
+
+from remotevbox.events import MACHINE_STATE_CHANGED
+
+
+def test_machine_id_is_only_read_from_machine_events(stub, vbox):
+    state, url = stub
+    listener = vbox.get_event_listener([MACHINE_STATE_CHANGED, "OnExtraDataChanged"])
+    state.push_event("OnExtraDataChanged")
+    state.push_event(MACHINE_STATE_CHANGED, "vm1", "Running")
+
+    extra = listener.poll()
+    changed = listener.poll()
+    listener.stop()
+
+    assert extra.machine_id is None
+    assert changed.machine_id == "uuid-vm1"
+    assert state.calls["IMachineEvent_getMachineId"] == 1
+
+
+def test_callback_error_does_not_stop_dispatching(stub, vbox):
+    state, url = stub
+    listener = vbox.get_event_listener()
+    delivered = threading.Event()
+
+    def broken(event):
+        raise ValueError("broken subscriber")
+
+    listener.subscribe(broken)
+    listener.subscribe(lambda event: delivered.set())
+    listener.start()
+    state.push_event(MACHINE_STATE_CHANGED, "vm1", "Running")
+    state.push_event(MACHINE_STATE_CHANGED, "vm1", "PoweredOff")
+
+    assert delivered.wait(5)
+    assert listener.states.wait_for_all(["uuid-vm1"], ["PoweredOff"], 5) == [
+        "PoweredOff"
+    ]
+    assert listener.running()
+    assert isinstance(listener.callback_error, ValueError)
+    listener.stop()
+
+
+def test_waiters_wake_up_when_server_goes_away(server, vbox):
+    server, state, url = server
+    listener = vbox.get_event_listener()
+    listener.start()
+    threading.Timer(0.5, server.stop).start()
+    start = time.monotonic()
+
+    states = listener.states.wait_for_all(["uuid-vm1"], ["Running"], 8)
+
+    assert time.monotonic() - start < 5
+    assert states == [None]
+    assert listener.states.closed
+    assert isinstance(listener.error, requests.RequestException)
+    listener._thread.join(5)
+    assert not listener.running()
@@ -0,0 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+FAST = pytest.mark.parametrize("vbox", [{"fast_path": True}], indirect=True)
+
+
+@FAST
+def test_put_scancodes_is_dispatched_fast(running):
+    state, vbox, machine = running
+    keyboard = machine._get_keyboard()
+    calls = vbox.service.fast_calls
+
+    stored = vbox.service.IKeyboard_putScancodes(keyboard, [0x1E, 0x9E])
+
+    assert stored == 2
+    assert vbox.service.fast_calls - calls == 1
+    assert state.scancodes == ["30", "158"]
+
+
+@FAST
+def test_fast_calls_are_counted_across_threads(vbox):
+    mid = vbox.find_machine("vm1")
+    calls = vbox.service.fast_calls
+
+    def work(_):
+        for _ in range(50):
+            vbox.service.IMachine_getState(mid)
+
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        list(ex.map(work, range(8)))
+
+    assert vbox.service.fast_calls - calls == 400
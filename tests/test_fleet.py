@@ -0,0 +1,85 @@
+import pytest
+
+from remotevbox.exceptions import WrongMachineState
+from remotevbox.fleet import Fleet
+
+NAMES = ["vm1", "vm2", "vm3", "vm4"]
+FOUR = pytest.mark.parametrize("server", [{"machines": NAMES}], indirect=True)
+
+
+@FOUR
+def test_launch_and_poweroff(stub, vbox):
+    state, url = stub
+    fleet = vbox.get_fleet(NAMES)
+
+    launched = fleet.launch()
+    powered_off = fleet.poweroff()
+
+    for report, operation in [(launched, "launch"), (powered_off, "poweroff")]:
+        assert report.ok()
+        assert len(report) == 4
+        assert [result.machine for result in report] == fleet.machines
+        assert {result.operation for result in report} == {operation}
+    assert state.calls["IMachine_launchVMProcess"] == 4
+    assert state.calls["IConsole_powerDown"] == 4
+    assert {m["state"] for m in state.machines.values()} == {"PoweredOff"}
+
+
+@FOUR
+def test_failure_is_recorded_per_machine(stub, vbox):
+    state, url = stub
+    for name in NAMES[1:]:
+        state.machines["m-" + name]["state"] = "Running"
+    fleet = vbox.get_fleet(NAMES)
+
+    report = fleet.poweroff()
+
+    assert not report.ok()
+    (failed,) = report.failed()
+    assert failed.machine is fleet.machines[0]
+    assert isinstance(failed.error, WrongMachineState)
+    assert [result.machine for result in report.succeeded()] == fleet.machines[1:]
+    stats = report.stats()
+    assert (stats["machines"], stats["succeeded"], stats["failed"]) == (4, 3, 1)
+
+
+@FOUR
+def test_machines_are_handled_concurrently(stub, vbox):
+    state, url = stub
+    fleet = vbox.get_fleet(NAMES, concurrency=4)
+    state.delay = 0.05
+
+    stats = fleet.launch().stats()
+
+    assert stats["slowest"] <= stats["elapsed"]
+    assert stats["sequential"] > 2 * stats["elapsed"]
+
+
+@FOUR
+def test_run_callable_and_linked_clone(stub, vbox):
+    state, url = stub
+    fleet = vbox.get_fleet(NAMES)
+
+    def name(machine):
+        return machine.info("Name")
+
+    report = fleet.run(name)
+    clones = fleet.linked_clone("base", "{name}-{index}")
+
+    assert report.operation == "name"
+    assert [result.result for result in report] == NAMES
+    assert clones.ok()
+    # Created concurrently, in any order
+    assert sorted([m["name"] for m in state.machines.values()][4:]) == [
+        "vm1-0",
+        "vm2-1",
+        "vm3-2",
+        "vm4-3",
+    ]
+
+
+def test_empty_fleet():
+    report = Fleet([]).launch()
+
+    assert report.ok()
+    assert report.stats()["machines"] == 0
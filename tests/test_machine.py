@@ -0,0 +1,149 @@
+import pytest
+
+from remotevbox import machine as machine_module
+from remotevbox.exceptions import (
+    KeyboardQueueFull,
+    MachinePowerdownError,
+    MachineSnapshotError,
+)
+from remotevbox.scancodes import compile_keys
+
+
+def test_stale_console_is_retried(running):
+    state, vbox, machine = running
+    machine.put_scancodes([0x1E, 0x9E])
+    # Handles outlived their objects, the websession is still alive
+    stale = ("console", "keyboard")
+    state.dead |= {ref for ref in state.refs if ref.startswith(stale)}
+
+    machine.put_scancodes([0x1E, 0x9E])
+
+    assert state.calls["IKeyboard_putScancodes"] == 3
+    assert len(state.scancodes) == 4
+
+
+def test_other_faults_are_not_retried(running):
+    state, vbox, machine = running
+    machine.put_scancodes([0x1E, 0x9E])
+    state.faults["IConsole_powerDown"] = "Could not power off the machine"
+
+    with pytest.raises(MachinePowerdownError):
+        machine.poweroff()
+
+    assert state.calls["IConsole_powerDown"] == 1
+
+
+def test_full_hd_raw_screenshot(running):
+    state, vbox, machine = running
+    state.width, state.height = 1920, 1080
+
+    frame = machine.take_screenshot_raw()
+
+    assert len(frame.data) == 1920 * 1080 * 4
+
+
+def soap_calls(state):
+    """Returns number of calls other than reference releases"""
+    return sum(state.calls.values()) - state.calls["IManagedObjectRef_release"]
+
+
+def counted(state, *operations):
+    """Returns number of calls made by operations other than releases"""
+    state.calls.clear()
+    for operation in operations:
+        operation()
+    return soap_calls(state)
+
+
+def test_revert_and_start_running(running):
+    state, vbox, machine = running
+    # Leaves the machine running with the launch session locked, as found
+    sequential = counted(state, machine.poweroff, machine.restore, machine.launch)
+
+    combined = counted(state, machine.revert_and_start)
+
+    # getConsole, powerDown and its wait, getCurrentSnapshot, lockMachine
+    # with getMachine, restoreSnapshot and launch with their waits and
+    # result codes, unlockMachine. Every one of them is needed, so the cut
+    # falls short of 2x: 20 calls in a row, 13 combined.
+    assert (sequential, combined) == (20, 13)
+    assert sequential / combined > 1.5
+    assert state.calls["IConsole_powerDown"] == 1
+    assert state.calls["ISession_getState"] == 0
+    assert state.calls["IMachine_lockMachine"] == 1
+    assert state.calls["ISession_unlockMachine"] == 1
+    assert state.machines["m-vm1"]["state"] == "Running"
+
+
+def test_revert_and_start_powered_off(stub, vbox):
+    state, url = stub
+    machine = vbox.get_machine("vm1")
+    sequential = counted(state, machine.restore, machine.launch)
+    machine.poweroff()
+
+    combined = counted(state, machine.revert_and_start)
+
+    # No power down, nothing to save over restore() and launch()
+    assert combined <= sequential
+    assert state.calls["IConsole_powerDown"] == 0
+    assert state.calls["ISession_getState"] == 0
+    assert state.calls["ISession_unlockMachine"] == 1
+    assert state.machines["m-vm1"]["state"] == "Running"
+
+
+def test_revert_and_start_reports_restore_error(stub, vbox):
+    state, url = stub
+    machine = vbox.get_machine("vm1")
+    state.faults["IMachine_restoreSnapshot"] = "Snapshot is inaccessible"
+    state.faults["ISession_unlockMachine"] = "Unlock failed"
+
+    with pytest.raises(MachineSnapshotError, match="Snapshot is inaccessible"):
+        machine.revert_and_start()
+
+    assert state.calls["ISession_unlockMachine"] == 1
+    assert state.calls["IMachine_launchVMProcess"] == 0
+
+
+def test_revert_and_start_running_without_session(stub, vbox):
+    state, url = stub
+    state.machines["m-vm1"]["state"] = "Running"
+    machine = vbox.get_machine("vm1")
+
+    machine.revert_and_start()
+
+    assert state.calls["IMachine_lockMachine"] == 2
+    assert state.calls["ISession_getMachine"] == 2
+    assert state.machines["m-vm1"]["state"] == "Running"
+
+
+def test_take_snapshot_keeps_session_locked_until_taken(stub, vbox):
+    state, url = stub
+    machine = vbox.get_machine("vm1")
+
+    machine.take_snapshot("clean")
+
+    assert state.machines["m-vm1"]["snapshots"] == 2
+    assert not state.failed
+    assert state.machines["m-vm1"]["session"] == "Unlocked"
+
+
+def test_send_keys_resends_what_the_guest_queue_had_no_room_for(running):
+    state, vbox, machine = running
+    state.keyboard_room = 3
+
+    machine.send_keys("Hello")
+
+    assert [int(code) for code in state.scancodes] == [
+        code for sequence in compile_keys("Hello") for code in sequence
+    ]
+
+
+def test_send_keys_gives_up_on_a_full_guest_queue(running, monkeypatch):
+    state, vbox, machine = running
+    monkeypatch.setattr(machine_module, "SCANCODE_RETRIES", 3)
+    state.keyboard_room = 0
+
+    with pytest.raises(KeyboardQueueFull):
+        machine.send_keys("a")
+
+    assert state.calls["IKeyboard_putScancodes"] == 4
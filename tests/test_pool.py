@@ -0,0 +1,86 @@
+import threading
+
+from remotevbox import pool as pool_module
+from remotevbox.pool import ClonePool
+
+
+def wait_ready(pool, count, timeout=10):
+    """Polls until count clones are ready"""
+    event = threading.Event()
+    for _ in range(int(timeout / 0.01)):
+        if pool.stats()["ready"] >= count:
+            return True
+        event.wait(0.01)
+    return False
+
+
+def test_failed_revert_is_refilled(vbox, stub):
+    state, url = stub
+    state.add_machine("base")
+    pool = ClonePool(vbox, "base", "clean", size=2).start()
+    assert wait_ready(pool, 2)
+
+    machine = pool.acquire()
+    state.faults["IMachine_restoreSnapshot"] = ["Could not restore the snapshot"]
+    pool.release(machine)
+
+    assert wait_ready(pool, 2)
+    stats = pool.stats()
+    assert stats["failures"] == 1
+    assert stats["preparing"] == 0
+    assert "Could not restore" in str(pool.errors[0])
+    pool.close()
+
+
+def test_stats_are_bounded(vbox, stub, monkeypatch):
+    state, url = stub
+    state.add_machine("base")
+    monkeypatch.setattr(pool_module, "STATS_WINDOW", 5)
+    pool = ClonePool(vbox, "base", "clean", size=1).start()
+    assert wait_ready(pool, 1)
+
+    for _ in range(10):
+        pool.release(pool.acquire())
+        assert wait_ready(pool, 1)
+
+    assert len(pool._wait_times) == len(pool._ready_times) == 5
+    pool.close()
+
+
+def test_release_after_close_is_ignored(vbox, stub):
+    state, url = stub
+    state.add_machine("base")
+    pool = ClonePool(vbox, "base", "clean", size=1).start()
+    machine = pool.acquire(timeout=10)
+    pool.close()
+
+    pool.release(machine)
+
+    assert pool.stats()["preparing"] == 0
+
+
+def test_release_powers_down_its_clone_only(vbox, stub):
+    state, url = stub
+    state.add_machine("base")
+    pool = ClonePool(vbox, "base", "clean", size=2).start()
+    assert wait_ready(pool, 2)
+    first, second = pool.acquire(), pool.acquire()
+
+    pool.release(first)
+    assert wait_ready(pool, 1)
+
+    assert second.state() == "Running"
+    assert first.state() == "Running"
+    pool.close()
+
+
+def test_new_clone_gets_clean_snapshot(vbox, stub):
+    state, url = stub
+    state.add_machine("base")
+    pool = ClonePool(vbox, "base", "clean", size=1).start()
+    assert wait_ready(pool, 1)
+
+    assert not state.failed
+    clones = [m for m in state.machines.values() if m["name"].startswith("base-")]
+    assert [clone["snapshots"] for clone in clones] == [2]
+    pool.close()
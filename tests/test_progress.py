@@ -0,0 +1,52 @@
+from remotevbox.progress import IProgress, ProgressPoller
+
+
+class Service(object):
+    """Answers IProgress calls, raises ConnectionError for broken ids"""
+
+    def IProgress_getCompleted(self, pid):
+        if pid == "broken":
+            raise ConnectionError("connection reset")
+        return True
+
+    def IProgress_getResultCode(self, pid):
+        return 0
+
+
+def test_transport_error_fails_progress():
+    service = Service()
+    poller = ProgressPoller(interval=0.01)
+    broken = IProgress("broken", service)
+    ok = IProgress("ok", service)
+
+    done, pending = poller.wait([broken, ok], timeout=5)
+
+    assert pending == []
+    assert broken.result == "Fail"
+    assert ok.result == "Success"
+
+
+def test_callback_error_is_isolated():
+    service = Service()
+    poller = ProgressPoller(interval=0.01)
+    first, second = IProgress("first", service), IProgress("second", service)
+    seen = []
+
+    def broken(progress):
+        raise ValueError("broken callback")
+
+    first.add_done_callback(broken, poller)
+    first.add_done_callback(seen.append, poller)
+    second.add_done_callback(seen.append, poller)
+    done, pending = poller.wait([first, second], timeout=5)
+
+    assert pending == []
+    assert first in seen and second in seen
+    assert isinstance(first.callback_error, ValueError)
+
+
+def test_wait_for_nothing_returns_immediately():
+    poller = ProgressPoller()
+
+    assert poller.wait([], return_when_all=False) == ([], [])
+    assert poller.wait([]) == ([], [])
@@ -0,0 +1,43 @@
+import pytest
+
+from remotevbox.pool import ClonePool
+
+CYCLES = 20
+
+
+def cycle(vbox, state):
+    """Runs a round of operations holding references on a fresh IMachine"""
+    machine = vbox.get_machine("vm1")
+    machine.revert_and_start()
+    machine.put_scancodes([0x1E, 0x9E])
+    machine.take_screenshot_to_bytes()
+    machine.take_thumbnail()
+    machine.linked_clone("clone-%d" % len(state.machines), "base")
+    machine.close()
+
+
+@pytest.mark.parametrize("server", [{"state": "Running"}], indirect=True)
+def test_references_stay_bounded(stub, vbox):
+    """Server and tracked references don't grow over repeated cycles"""
+    state, url = stub
+    cycle(vbox, state)
+    server_refs, live = len(state.refs), vbox.manager.refs.live()
+
+    for _ in range(CYCLES):
+        cycle(vbox, state)
+
+    assert len(state.refs) <= server_refs
+    assert vbox.manager.refs.live() <= live
+    assert not [ref for ref in state.released if ref in state.machines]
+
+
+def test_pool_releases_clone_references(vbox, stub):
+    state, url = stub
+    state.add_machine("base")
+    pool = ClonePool(vbox, "base", "clean", size=2).start()
+    machines = [pool.acquire(timeout=10) for _ in range(2)]
+    pool.close()
+
+    assert not [ref for ref in state.refs if ref.startswith("progress")]
+    for machine in machines:
+        machine.close()
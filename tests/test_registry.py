@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from remotevbox.registry import ServiceRegistry, default_registry
+from remotevbox.vbox import IVirtualBox
+
+
+def test_empty_registry_is_used(stub):
+    state, url = stub
+    registry = ServiceRegistry()
+    default_entries = len(default_registry)
+
+    IVirtualBox(url, registry=registry)
+    IVirtualBox(url, registry=registry)
+
+    assert len(registry) == 1
+    assert len(default_registry) == default_entries
+    assert state.calls["GET"] == 1
+
+
+def test_registries_do_not_share_clients(stub):
+    state, url = stub
+    IVirtualBox(url, registry=ServiceRegistry())
+    IVirtualBox(url, registry=ServiceRegistry())
+
+    assert state.calls["GET"] == 2
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_child_does_not_reuse_parent_connections(stub):
+    state, url = stub
+    vbox = IVirtualBox(url, registry=ServiceRegistry())
+    vbox.get_version()
+    parent = vbox.client.transport.session
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            vbox.get_version()
+            session = vbox.client.transport.session
+            reused = session is parent or vbox.transport_stats()["connections"] != 1
+            os._exit(int(reused))
+        except BaseException:
+            os._exit(2)
+
+    assert os.waitpid(pid, 0)[1] == 0
+    assert vbox.client.transport.session is parent
+    assert vbox.transport_stats()["connections"] == 1
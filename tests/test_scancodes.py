@@ -0,0 +1,112 @@
+import pytest
+
+from remotevbox.scancodes import (
+    BREAK,
+    EXTENDED,
+    SPECIAL_SEQUENCES,
+    USB_HID_TO_SCANCODE,
+    compile_keys,
+    press,
+    release,
+)
+from remotevbox.us_layout import MAPPING
+
+SHIFT = [0x2A], [0xAA]
+
+
+@pytest.mark.parametrize(
+    "key, sequence",
+    [
+        ("a", [0x1E, 0x9E]),
+        ("z", [0x2C, 0xAC]),
+        ("1", [0x02, 0x82]),
+        ("0", [0x0B, 0x8B]),
+        (" ", [0x39, 0xB9]),
+        ("\n", [0x1C, 0x9C]),
+        ("<esc>", [0x01, 0x81]),
+        ("<caps lock>", [0x3A, 0xBA]),
+        ("<f1>", [0x3B, 0xBB]),
+        ("<f12>", [0x58, 0xD8]),
+        ("<left shift>", [0x2A, 0xAA]),
+        ("<right shift>", [0x36, 0xB6]),
+    ],
+)
+def test_make_and_break_codes(key, sequence):
+    assert compile_keys([key]) == [sequence]
+
+
+@pytest.mark.parametrize(
+    "key, sequence",
+    [
+        ("A", [0x1E, 0x9E]),
+        ("!", [0x02, 0x82]),
+        ("?", [0x35, 0xB5]),
+        ('"', [0x28, 0xA8]),
+        ("~", [0x29, 0xA9]),
+    ],
+)
+def test_shifted_keys_are_wrapped(key, sequence):
+    make, brk = SHIFT
+    assert compile_keys([key]) == [make + sequence + brk]
+
+
+@pytest.mark.parametrize(
+    "key, sequence",
+    [
+        ("<arrow up>", [0xE0, 0x48, 0xE0, 0xC8]),
+        ("<arrow left>", [0xE0, 0x4B, 0xE0, 0xCB]),
+        ("<del>", [0xE0, 0x53, 0xE0, 0xD3]),
+        ("<numpad enter>", [0xE0, 0x1C, 0xE0, 0x9C]),
+        ("<numpad />", [0xE0, 0x35, 0xE0, 0xB5]),
+        ("<right ctrl>", [0xE0, 0x1D, 0xE0, 0x9D]),
+        ("<right alt>", [0xE0, 0x38, 0xE0, 0xB8]),
+        ("<left meta>", [0xE0, 0x5B, 0xE0, 0xDB]),
+    ],
+)
+def test_extended_keys_are_prefixed(key, sequence):
+    assert compile_keys([key]) == [sequence]
+
+
+def test_special_sequences():
+    assert compile_keys(["<print screen>", "<pause>"]) == [
+        [0xE0, 0x2A, 0xE0, 0x37, 0xE0, 0xB7, 0xE0, 0xAA],
+        [0xE1, 0x1D, 0x45, 0xE1, 0x9D, 0xC5],
+    ]
+
+
+def test_string_is_compiled_per_character():
+    assert compile_keys("Hi\n") == [
+        [0x2A, 0x23, 0xA3, 0xAA],
+        [0x17, 0x97],
+        [0x1C, 0x9C],
+    ]
+
+
+def test_unknown_and_unmapped_keys():
+    with pytest.raises(ValueError, match="Unknown key"):
+        compile_keys(["<nope>"])
+    # Has a usage code, no PS/2 scancode
+    with pytest.raises(ValueError, match="No scancode"):
+        compile_keys(["<execute>"])
+    with pytest.raises(NotImplementedError):
+        compile_keys("a", keymap="DE")
+
+
+def test_break_is_make_with_high_bit():
+    for code, scancode in USB_HID_TO_SCANCODE.items():
+        make, brk = press(code), release(code)
+        assert all(byte < BREAK for byte in make if byte != EXTENDED)
+        assert brk[:-1] == make[:-1]
+        assert brk[-1] == make[-1] | BREAK
+
+
+def test_every_layout_key_compiles_or_is_rejected():
+    for key, (code, use_shift) in MAPPING.items():
+        if code in USB_HID_TO_SCANCODE or code in SPECIAL_SEQUENCES:
+            sequence = press(code) + release(code)
+            if use_shift:
+                sequence = SHIFT[0] + sequence + SHIFT[1]
+            assert compile_keys([key]) == [sequence]
+        else:
+            with pytest.raises(ValueError):
+                compile_keys([key])
@@ -0,0 +1,187 @@
+import struct
+import zlib
+from array import array
+from base64 import b64encode
+
+import pytest
+
+from remotevbox.screen import (
+    PNG_SIGNATURE,
+    Frame,
+    FrameEncoder,
+    bgra_to_rgb,
+    crop_base64,
+    downscale,
+    encode_frame,
+    encode_png,
+)
+
+
+def pixels(width, height):
+    """Returns BGRA bytes where every pixel holds its own index"""
+    return array("I", range(width * height)).tobytes()
+
+
+def region(data, frame_width, x, y, width, height):
+    """Returns BGRA bytes of a region sliced out of a full frame"""
+    stride = frame_width * 4
+    return b"".join(
+        data[row * stride + x * 4 : row * stride + (x + width) * 4]
+        for row in range(y, y + height)
+    )
+
+
+def read_png(png):
+    """Returns (width, height, RGB bytes) of an unfiltered RGB PNG"""
+    assert png.startswith(PNG_SIGNATURE)
+    chunks = {}
+    offset = len(PNG_SIGNATURE)
+    while offset < len(png):
+        (length,) = struct.unpack(">I", png[offset : offset + 4])
+        tag = png[offset + 4 : offset + 8]
+        data = png[offset + 8 : offset + 8 + length]
+        (crc,) = struct.unpack(">I", png[offset + 8 + length : offset + 12 + length])
+        assert crc == zlib.crc32(tag + data) & 0xFFFFFFFF
+        chunks[tag] = data
+        offset += 12 + length
+
+    assert list(chunks) == [b"IHDR", b"IDAT", b"IEND"]
+    width, height, depth, color, _, _, _ = struct.unpack(">IIBBBBB", chunks[b"IHDR"])
+    assert (depth, color) == (8, 2)
+    scanlines = zlib.decompress(chunks[b"IDAT"])
+    stride = width * 3 + 1
+    assert len(scanlines) == stride * height
+    assert all(scanlines[row * stride] == 0 for row in range(height))
+    rgb = b"".join(
+        scanlines[row * stride + 1 : (row + 1) * stride] for row in range(height)
+    )
+    return width, height, rgb
+
+
+# 37 pixels are 148 bytes a row, rows start at every offset within a
+# base64 group of 3 bytes
+WIDTH, HEIGHT = 37, 23
+
+
+@pytest.mark.parametrize(
+    "x, y, width, height",
+    [
+        (0, 0, WIDTH, HEIGHT),
+        (0, 0, 1, 1),
+        (WIDTH - 1, HEIGHT - 1, 1, 1),
+        (1, 1, 5, 3),
+        (3, 2, 10, 9),
+        (5, 7, 31, 16),
+        (0, 11, WIDTH, 1),
+        (36, 0, 1, HEIGHT),
+    ],
+)
+def test_crop_base64_matches_full_frame(x, y, width, height):
+    data = pixels(WIDTH, HEIGHT)
+
+    frame = crop_base64(b64encode(data).decode(), 1, WIDTH, x, y, width, height)
+
+    assert frame[:3] == (1, width, height)
+    assert bytes(frame.data) == region(data, WIDTH, x, y, width, height)
+
+
+def test_crop_base64_every_row_alignment():
+    data = pixels(WIDTH, HEIGHT)
+    image_data = b64encode(data).decode()
+
+    for y in range(HEIGHT):
+        for x in (0, 1, 2, 17):
+            for height in (1, 2, 3):
+                height = min(height, HEIGHT - y)
+                frame = crop_base64(image_data, 0, WIDTH, x, y, 4, height)
+                assert bytes(frame.data) == region(data, WIDTH, x, y, 4, height)
+
+
+@pytest.mark.parametrize(
+    "x, y, width, height",
+    [(0, 0, 640, 480), (1, 1, 3, 3), (333, 101, 97, 55), (639, 479, 1, 1)],
+)
+def test_screenshot_region_matches_raw_screenshot(running, x, y, width, height):
+    state, vbox, machine = running
+    full = bytes(machine.take_screenshot_raw().data)
+
+    frame = machine.take_screenshot_region(x, y, width, height)
+
+    assert (frame.width, frame.height) == (width, height)
+    assert bytes(frame.data) == region(full, 640, x, y, width, height)
+
+
+@pytest.mark.parametrize(
+    "x, y, width, height",
+    [(-1, 0, 1, 1), (0, -1, 1, 1), (600, 0, 41, 1), (0, 400, 1, 81)],
+)
+def test_screenshot_region_out_of_screen(running, x, y, width, height):
+    state, vbox, machine = running
+
+    with pytest.raises(ValueError):
+        machine.take_screenshot_region(x, y, width, height)
+
+
+def test_bgra_to_rgb():
+    assert bgra_to_rgb(b"\x01\x02\x03\xff\x0a\x0b\x0c\x00") == bytearray(
+        b"\x03\x02\x01\x0c\x0b\x0a"
+    )
+
+
+def test_encode_png_round_trips():
+    data = pixels(WIDTH, HEIGHT)
+
+    png = encode_png(Frame(0, WIDTH, HEIGHT, memoryview(data)))
+
+    assert read_png(png) == (WIDTH, HEIGHT, bytes(bgra_to_rgb(data)))
+
+
+def test_downscale_picks_nearest_pixels():
+    data = pixels(WIDTH, HEIGHT)
+    frame = Frame(2, WIDTH, HEIGHT, memoryview(data))
+
+    scaled = downscale(frame, 10, 7)
+
+    assert scaled[:3] == (2, 10, 7)
+    assert array("I", bytes(scaled.data)).tolist() == [
+        (y * HEIGHT // 7) * WIDTH + x * WIDTH // 10 for y in range(7) for x in range(10)
+    ]
+
+
+def test_downscale_halves_every_other_pixel():
+    data = pixels(8, 4)
+
+    scaled = downscale(Frame(0, 8, 4, memoryview(data)), 4, 2)
+
+    assert array("I", bytes(scaled.data)).tolist() == [0, 2, 4, 6, 16, 18, 20, 22]
+
+
+def test_encode_frame():
+    data = pixels(WIDTH, HEIGHT)
+    frame = Frame(0, WIDTH, HEIGHT, memoryview(data))
+    small = downscale(frame, 12, 8)
+
+    assert encode_frame(frame) == encode_png(frame)
+    assert encode_frame(frame, size=(WIDTH, HEIGHT)) == encode_png(frame)
+    assert read_png(encode_frame(frame, size=(12, 8))) == (
+        12,
+        8,
+        bytes(bgra_to_rgb(small.data)),
+    )
+    with pytest.raises(ValueError):
+        encode_frame(frame, "BMP")
+
+
+@pytest.mark.parametrize("processes", [False, True])
+def test_frame_encoder_matches_encode_frame(processes):
+    frames = [
+        Frame(0, width, height, memoryview(pixels(width, height)))
+        for width, height in [(WIDTH, HEIGHT), (1, 1), (64, 3)]
+    ]
+
+    with FrameEncoder(workers=2, processes=processes) as encoder:
+        encoded = encoder.map(frames, size=(16, 9))
+        single = encoder.submit(frames[0]).result()
+
+    assert encoded == [encode_frame(frame, size=(16, 9)) for frame in frames]
+    assert single == encode_png(frames[0])
@@ -0,0 +1,76 @@
+import pytest
+import zeep.exceptions
+
+SIZE = len(b"\x89PNG") + 640 * 480 // 2
+
+
+def test_identical_frames_are_dropped(running):
+    state, vbox, machine = running
+    state.screens = [b"a", b"a", b"b", b"b", b"b", b"c"]
+
+    stream = machine.stream_screenshots(fps=0, max_frames=3)
+    frames = list(stream)
+
+    assert [frame[4:5] for frame in frames] == [b"a", b"b", b"c"]
+    stats = stream.stats()
+    assert (stats["frames"], stats["dropped"]) == (3, 3)
+    assert stats["bytes"] == 3 * (SIZE + 1)
+    assert stats["elapsed"] > 0
+    assert stats["fps"] == pytest.approx(6 / stats["elapsed"])
+    assert stats["bytes_per_second"] == pytest.approx(stats["bytes"] / stats["elapsed"])
+    assert state.calls["IDisplay_takeScreenShotToArray"] == 6
+    # Resolution and display handle are reused between frames
+    assert state.calls["IDisplay_getScreenResolution"] == 1
+    assert state.calls["IConsole_getDisplay"] == 1
+
+
+def test_every_frame_without_dedupe(running):
+    state, vbox, machine = running
+
+    stream = machine.stream_screenshots(fps=0, dedupe=False, max_frames=4)
+
+    assert len(list(stream)) == 4
+    assert stream.stats()["dropped"] == 0
+
+
+def test_stop_and_duration(running):
+    state, vbox, machine = running
+
+    stream = machine.stream_screenshots(fps=20, dedupe=False)
+    for count, frame in enumerate(stream, 1):
+        if count == 2:
+            stream.stop()
+
+    assert stream.frames == 2
+
+    stream = machine.stream_screenshots(fps=20, dedupe=False, duration=0.3)
+    frames = len(list(stream))
+
+    # Paced at fps, stopped once the duration is over
+    assert 3 <= frames <= 7
+    assert stream.elapsed() == pytest.approx(0.3, abs=0.15)
+
+
+def test_resolution_is_refreshed_after_a_failed_capture(running):
+    state, vbox, machine = running
+    state.faults["IDisplay_takeScreenShotToArray"] = ["Screen resized"]
+    stream = machine.stream_screenshots(fps=0, max_frames=1)
+
+    with pytest.raises(zeep.exceptions.Fault):
+        list(stream)
+    state.width, state.height = 800, 600
+    frames = list(stream)
+
+    assert len(frames[0]) == len(b"\x89PNG") + 800 * 600 // 2
+    assert state.calls["IDisplay_getScreenResolution"] == 2
+
+
+def test_resolution_is_refreshed_every_interval(running):
+    state, vbox, machine = running
+    stream = machine.stream_screenshots(
+        fps=0, dedupe=False, max_frames=3, resolution_interval=0
+    )
+
+    list(stream)
+
+    assert state.calls["IDisplay_getScreenResolution"] == 3
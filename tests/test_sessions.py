@@ -0,0 +1,55 @@
+def test_closed_machines_reuse_sessions(stub, vbox):
+    state, url = stub
+
+    for _ in range(100):
+        machine = vbox.get_machine("vm1")
+        machine.lock()
+        machine.close()
+
+    stats = vbox.manager.session_stats()
+    assert stats["created"] == 1
+    assert stats["reused"] == 99
+    assert stats["unlocked"] == 100
+    assert (stats["idle"], stats["in_use"]) == (1, 0)
+    assert not state.sessions
+    # One for the manager, one leased
+    assert state.calls["IWebsessionManager_getSessionObject"] == 2
+
+
+def test_collected_machines_return_sessions(stub, vbox):
+    state, url = stub
+
+    for _ in range(100):
+        machine = vbox.get_machine("vm1")
+        machine.lock()
+        # Collected here, nothing else refers to it
+        del machine
+
+    stats = vbox.manager.session_stats()
+    # Each machine gets the session the one before it left behind
+    assert stats["created"] == 1
+    assert stats["deferred"] == 1
+    assert stats["in_use"] == 0
+    assert len(state.sessions) == 1
+    assert state.calls["IWebsessionManager_getSessionObject"] == 2
+
+    machine = vbox.get_machine("vm1")
+    machine.lock()
+    machine.close()
+
+    assert vbox.manager.session_stats()["deferred"] == 0
+    assert not state.sessions
+
+
+def test_sessions_over_the_idle_limit_are_released(stub, vbox):
+    state, url = stub
+    manager = vbox.manager
+
+    sessions = [manager.lease_session() for _ in range(manager.max_idle_sessions + 4)]
+    for session in sessions:
+        manager.return_session(session)
+
+    stats = manager.session_stats()
+    assert stats["created"] == len(sessions)
+    assert (stats["idle"], stats["released"]) == (manager.max_idle_sessions, 4)
+    assert state.released == sessions[-4:]
@@ -0,0 +1,57 @@
+from remotevbox import streaming
+
+
+class Plain(object):
+    """Service proxy without the zeep internals streaming posts through"""
+
+    def __init__(self, service):
+        self.service = service
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.service, name)
+
+
+def screenshot(service, display, size):
+    return streaming.call_base64(
+        service,
+        "IDisplay_takeScreenShotToArray",
+        [
+            ("_this", display),
+            ("screenId", 0),
+            ("width", 640),
+            ("height", 480),
+            ("bitmapFormat", "BGRA"),
+        ],
+        size=size,
+    )
+
+
+def test_falls_back_to_zeep_call(running):
+    state, vbox, machine = running
+    display = machine._get_display()
+    size = 640 * 480 * 4
+
+    assert streaming.streamable(vbox.service)
+    assert not streaming.streamable(Plain(vbox.service))
+    streamed = screenshot(vbox.service, display, size)
+    called = screenshot(Plain(vbox.service), display, size)
+
+    assert len(streamed) == size
+    assert streamed == called
+
+
+def test_iter_returnvals_falls_back_to_zeep_call(vbox):
+    params = [("_this", vbox.handle)]
+
+    streamed = list(
+        streaming.iter_returnvals(vbox.service, "IVirtualBox_getMachines", params)
+    )
+    called = list(
+        streaming.iter_returnvals(
+            Plain(vbox.service), "IVirtualBox_getMachines", params
+        )
+    )
+
+    assert streamed == called == ["m-vm1", "m-vm2"]
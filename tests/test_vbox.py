@@ -0,0 +1,79 @@
+from time import perf_counter
+
+import pytest
+
+from remotevbox.exceptions import FindMachineError, ListMachinesError
+from remotevbox.vbox import MachineRecord
+
+LIMITED = "The object functionality is limited"
+NAMES = ["vm%d" % i for i in range(8)]
+
+
+@pytest.mark.parametrize("server", [{"machines": ("vm1", "vm2", "vm3")}], indirect=True)
+def test_inventory(stub, vbox):
+    state, url = stub
+    state.machines["m-vm2"]["state"] = "Running"
+
+    records = vbox.inventory()
+
+    assert records == [
+        MachineRecord(mid, m["name"], m["id"], m["state"], "Unlocked", m["os"], 1)
+        for mid, m in state.machines.items()
+    ]
+
+
+@pytest.mark.parametrize("server", [{"machines": ("vm1", "vm2", "vm3")}], indirect=True)
+def test_inventory_skips_limited_machines(stub, vbox):
+    state, url = stub
+    # Raised once, for the first machine when fetched by a single worker
+    state.faults["IMachine_getName"] = [LIMITED]
+
+    assert [record.name for record in vbox.inventory(workers=1)] == ["vm2", "vm3"]
+
+    state.faults["IMachine_getSnapshotCount"] = [LIMITED]
+
+    assert len(vbox.inventory()) == 2
+    assert state.calls["IMachine_getSnapshotCount"] == 5
+
+
+def test_inventory_raises_other_faults(stub, vbox):
+    state, url = stub
+    state.faults["IMachine_getState"] = ["Access denied"]
+
+    with pytest.raises(ListMachinesError):
+        vbox.inventory()
+
+
+@pytest.mark.parametrize("server", [{"machines": NAMES}], indirect=True)
+def test_get_machines(stub, vbox):
+    state, url = stub
+
+    machines = vbox.get_machines(reversed(NAMES))
+
+    assert [machine.name for machine in machines] == NAMES[::-1]
+    assert [machine.mid for machine in machines] == ["m-" + n for n in NAMES[::-1]]
+    assert state.calls["IVirtualBox_findMachine"] == 8
+    # Only the manager has a session, machines lease theirs on first use
+    assert state.calls["IWebsessionManager_getSessionObject"] == 1
+    machines[0].lock()
+    assert state.calls["IWebsessionManager_getSessionObject"] == 2
+    assert not hasattr(machines[0], "__dict__")
+
+
+@pytest.mark.parametrize("server", [{"machines": NAMES}], indirect=True)
+def test_get_machines_looks_up_concurrently(stub, vbox):
+    state, url = stub
+    state.delay = 0.05
+
+    start = perf_counter()
+    vbox.get_machines(NAMES, workers=8)
+
+    assert perf_counter() - start < 4 * state.delay
+
+
+def test_get_machines_raises_for_missing_machine(stub, vbox):
+    state, url = stub
+
+    assert vbox.get_machines([]) == []
+    with pytest.raises(FindMachineError):
+        vbox.get_machines(["vm1", "vm3", "vm2"])
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+from remotevbox import machine as machine_module
+from remotevbox.events import MACHINE_STATE_CHANGED
+from remotevbox.exceptions import MachineStateTimeout
+from remotevbox.machine import wait_for_states
+
+
+def later(delay, func, *args):
+    timer = threading.Timer(delay, func, args)
+    timer.start()
+    return timer
+
+
+def set_state(state, name, value):
+    state.machines["m-" + name]["state"] = value
+
+
+def test_polling_reaches_state(stub, vbox):
+    state, url = stub
+    machine = vbox.get_machine("vm1")
+    later(0.3, set_state, state, "vm1", "Running")
+
+    result = machine.wait_for_state("Running", timeout=5)
+
+    assert result.reached and result.state == "Running"
+    assert 0.2 < result.elapsed < 5
+    assert state.calls["IMachine_getState"] > 1
+
+
+def test_polling_times_out(stub, vbox):
+    state, url = stub
+    machines = vbox.get_machines(["vm1", "vm2"])
+    set_state(state, "vm2", "Running")
+
+    results = wait_for_states(machines, "Running", timeout=0.3)
+
+    assert [result.reached for result in results] == [False, True]
+    assert results[0].state == "PoweredOff"
+    with pytest.raises(MachineStateTimeout):
+        machines[0].wait_for_state("Running", timeout=0.2)
+
+
+def test_events_reach_states(stub, vbox):
+    state, url = stub
+    vbox.watch()
+    machines = vbox.get_machines(["vm1", "vm2"])
+
+    def start_all():
+        for name in ("vm1", "vm2"):
+            set_state(state, name, "Running")
+            state.push_event(MACHINE_STATE_CHANGED, name, "Running")
+
+    later(0.3, start_all)
+    results = wait_for_states(machines, ["Running", "Paused"], timeout=5)
+
+    assert [result.state for result in results] == ["Running", "Running"]
+    # Seeded once, then served by events only
+    assert state.calls["IMachine_getState"] == 2
+
+
+def test_listener_dying_mid_wait_falls_back_to_polling(stub, vbox, monkeypatch):
+    state, url = stub
+    monkeypatch.setattr(machine_module, "LISTENER_CHECK_INTERVAL", 0.1)
+    listener = vbox.watch()
+    # A cache left open by the dead listener must not be waited on
+    monkeypatch.setattr(listener.states, "close", lambda: None)
+    machine = vbox.get_machine("vm1")
+
+    def die():
+        set_state(state, "vm1", "Running")
+        state.faults["IEventSource_getEvent"] = "Listener is gone"
+
+    later(0.3, die)
+    start = time.monotonic()
+    result = machine.wait_for_state("Running", timeout=8)
+
+    assert result.reached
+    assert time.monotonic() - start < 4
+    assert not listener.running()
+    assert not listener.states.closed
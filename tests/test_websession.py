@@ -0,0 +1,100 @@
+import pytest
+
+from remotevbox.exceptions import FindMachineError
+from remotevbox.machine import IMachine
+
+
+def test_relogon_does_not_touch_machines(stub, vbox):
+    state, url = stub
+    machines = [vbox.get_machine("vm1"), vbox.get_machine("vm2")]
+    state.expire()
+    state.calls.clear()
+
+    assert vbox.manager.check()
+
+    assert state.calls["IVirtualBox_findMachine"] == 0
+    assert [machine.state() for machine in machines] == ["PoweredOff"] * 2
+    assert state.calls["IVirtualBox_findMachine"] == 2
+
+
+def test_gone_machine_fails_its_own_calls_only(stub, vbox):
+    state, url = stub
+    gone, kept = vbox.get_machine("vm1"), vbox.get_machine("vm2")
+    del state.machines["m-vm1"]
+    state.expire()
+
+    assert vbox.manager.check()
+
+    assert kept.state() == "PoweredOff"
+    with pytest.raises(FindMachineError):
+        gone.state()
+    # Looked up again on the next use
+    state.add_machine("vm1")
+    assert gone.state() == "PoweredOff"
+
+
+def test_machine_without_name_is_not_looked_up(stub, vbox):
+    state, url = stub
+    machine = IMachine(vbox.service, vbox.manager, vbox.find_machine("vm1"))
+    state.expire()
+    vbox.manager.check()
+    state.calls.clear()
+
+    with pytest.raises(FindMachineError):
+        machine.state()
+
+    assert state.calls["IVirtualBox_findMachine"] == 0
+
+
+def test_running_machine_gets_console_back(running):
+    state, vbox, machine = running
+    machine.put_scancodes([0x1E, 0x9E])
+    state.expire()
+
+    machine.put_scancodes([0x1E, 0x9E])
+
+    assert len(state.scancodes) == 4
+    assert vbox.manager.generation == 1
+
+
+def test_calls_after_expiry_log_on_again(stub, vbox):
+    state, url = stub
+    machine = vbox.get_machine("vm1")
+    state.expire()
+
+    assert vbox.list_machines() == ["vm1", "vm2"]
+    assert vbox.manager.generation == 1
+    state.expire()
+    assert vbox.get_machine("vm2").state() == "PoweredOff"
+    state.expire()
+    machine.launch()
+
+    assert machine.state() == "Running"
+    assert vbox.manager.generation == 3
+    assert vbox.logon_stats()["relogons"] == 3
+
+
+def test_lifecycle_call_after_expiry_keeps_machine_locked(running):
+    state, vbox, machine = running
+    state.expire()
+
+    machine.lock()
+    machine.put_scancodes([0x1E, 0x9E])
+    state.expire()
+    machine.poweroff()
+
+    assert state.machines["m-vm1"]["state"] == "PoweredOff"
+    assert state.scancodes == ["30", "158"]
+    assert vbox.manager.generation == 2
+
+
+def test_single_stale_reference_is_not_retried(stub, vbox):
+    state, url = stub
+    machine = vbox.get_machine("vm1")
+    state.dead.add("m-vm1")
+
+    with pytest.raises(Exception, match="Invalid managed object reference"):
+        machine.state()
+
+    assert vbox.manager.generation == 0
+    assert state.calls["IMachine_getState"] == 1